@@ -3,106 +3,109 @@ import os
 import sys
 import time
 import signal
-import ollama
-from langchain_community.llms import Ollama
-from langchain.prompts import PromptTemplate
 import textwrap
+import llm_pool
+import response_cache
+import semantic_cache
+import model_warmup
+import model_catalog
+import metrics
+import conversation_store
+import coalesce
+from progress import ProgressReporter
+from conversation_memory import ConversationMemory
 
 # Constants
-DEFAULT_MODEL = 'gemma3:12b'
-MAX_RETRIES = 3
-RETRY_DELAY = 2  # seconds
-MAX_PROMPT_LENGTH = 4000
+from llm_pool import DEFAULT_MODEL, MAX_RETRIES, RETRY_DELAY, REQUEST_TIMEOUT, MAX_PROMPT_LENGTH  # Shared defaults
+CONVERSATION_TOKEN_BUDGET = 3000  # tokens of conversation history kept for follow-up questions
+STREAM_RESPONSES = True  # Print tokens as they arrive instead of waiting for the full response
 WRAPPER = textwrap.TextWrapper(width=80, break_long_words=False, replace_whitespace=False)
 
-# Handle Ctrl+C gracefully
+# Identical queries sent while one is being generated (e.g. from several threads) share its response
+_in_flight = coalesce.SingleFlight()
+
+# Handle Ctrl+C gracefully (installed only when run as a script, not when imported)
 def signal_handler(sig, frame):
     print('\nExiting the program. Goodbye!')
     sys.exit(0)
 
-signal.signal(signal.SIGINT, signal_handler)
-
 # Function to select a local LLM
-def select_llm(retries=0):
+def select_llm():
     """This function helps the user to select a local LLM available in Ollama."""
-    if retries >= MAX_RETRIES:
-        print(f'Failed to connect to Ollama after {MAX_RETRIES} attempts.')
-        print(f'Using default model: "{DEFAULT_MODEL}" (if Ollama starts working)')
-        return DEFAULT_MODEL
+    catalog = model_catalog.get_catalog()
+    attempts_left = MAX_RETRIES
     
-    try:
-        # Fetch available models in Ollama
-        response = ollama.list()
-        
-        # Extract model names from the ListResponse object
-        model_names = []
-        for model in response.models:
-            model_names.append(model.model)  # Use .model attribute to fetch the name
-        
-        if not model_names:
-            print('No local models were found in your Ollama installation.')
-            install_choice = input('Would you like to install the default model? (Y/N): ').lower()
-            
-            if install_choice.startswith('y'):
-                print(f'Please run "ollama pull {DEFAULT_MODEL}" in your terminal.')
-            
-            print(f'Using default model: "{DEFAULT_MODEL}"')
+    # Fetch available models (cached, with exponential backoff between connection attempts)
+    while True:
+        try:
+            models = catalog.get_models()
+            break
+        except ConnectionError:
+            attempts_left -= 1
+            print('Error: Could not connect to Ollama server.')
+            print('Make sure the Ollama server is running (run "ollama serve" in your terminal).')
+            if attempts_left <= 0:
+                print(f'Failed to connect to Ollama after {MAX_RETRIES} attempts.')
+                print(f'Using default model: "{DEFAULT_MODEL}" (if Ollama starts working)')
+                return DEFAULT_MODEL
+            retry = input(f'Retry connection? (Y/N, {attempts_left} attempts left): ').lower()
+            if not retry.startswith('y'):
+                print(f'Using default model: "{DEFAULT_MODEL}" (if Ollama starts working)')
+                return DEFAULT_MODEL
+            print('Retrying...')
+        except Exception as e:
+            print(f'Error connecting to Ollama: {e}')
+            print(f'Make sure your local Ollama server is running. Using default model: "{DEFAULT_MODEL}"')
             return DEFAULT_MODEL
+    
+    model_names = [info.name for info in models]
+    
+    if not model_names:
+        print('No local models were found in your Ollama installation.')
+        install_choice = input('Would you like to install the default model? (Y/N): ').lower()
         
-        # Check for environment variable to skip selection
-        env_model = os.environ.get('OLLAMA_DEFAULT_MODEL')
-        if env_model and env_model in model_names:
-            print(f'Using model from environment variable: "{env_model}"')
-            return env_model
-        
-        # Display available models
-        print('Available models:')
-        for idx, name in enumerate(model_names, 1):
-            print(f'{idx}. {name}')
+        if install_choice.startswith('y'):
+            print(f'Please run "ollama pull {DEFAULT_MODEL}" in your terminal.')
         
-        # Get user selection with validation
-        while True:
-            try:
-                selection = input('Enter the number of the model you want to use (or press Enter to use the default model): ')
-                
-                # Handle empty input (default)
-                if not selection.strip():
-                    # If DEFAULT_MODEL is available, use it; otherwise use first available model
-                    if DEFAULT_MODEL in model_names:
-                        print(f'Using default model: "{DEFAULT_MODEL}"')
-                        return DEFAULT_MODEL
-                    else:
-                        print(f'Using first available model: "{model_names[0]}"')
-                        return model_names[0]
-                
-                selection_idx = int(selection) - 1
-                
-                if 0 <= selection_idx < len(model_names):
-                    selected_model = model_names[selection_idx]
-                    print(f'Selected model: {selected_model}')
-                    return selected_model
-                else:
-                    print(f'Invalid selection. Please enter a number between 1 and {len(model_names)}.')
-            except ValueError:
-                print('Please enter a valid number or press Enter to use the default model.')
+        print(f'Using default model: "{DEFAULT_MODEL}"')
+        return DEFAULT_MODEL
     
-    except ConnectionRefusedError:
-        print('Error: Could not connect to Ollama server.')
-        print('Make sure the Ollama server is running (run "ollama serve" in your terminal).')
-        retry = input(f'Retry connection? (Y/N, {MAX_RETRIES-retries} attempts left): ').lower()
-        if retry.startswith('y'):
-            print(f'Retrying in {RETRY_DELAY} seconds...')
-            time.sleep(RETRY_DELAY)
-            return select_llm(retries + 1)
-        
-        else:
-            print(f'Using default model: "{DEFAULT_MODEL}" (if Ollama starts working)')
-            return DEFAULT_MODEL
+    # Check for environment variable to skip selection
+    env_model = os.environ.get('OLLAMA_DEFAULT_MODEL')
+    if env_model and env_model in model_names:
+        print(f'Using model from environment variable: "{env_model}"')
+        return env_model
     
-    except Exception as e:
-        print(f'Error connecting to Ollama: {e}')
-        print(f'Make sure your local Ollama server is running. Using default model: "{DEFAULT_MODEL}"')
-        return DEFAULT_MODEL
+    # Display available models with size, parameter count and quantization to help pick one
+    print('Available models:')
+    for idx, info in enumerate(models, 1):
+        print(f'{idx}. {model_catalog.describe_model(info)}')
+    
+    # Get user selection with validation
+    while True:
+        try:
+            selection = input('Enter the number of the model you want to use (or press Enter to use the default model): ')
+            
+            # Handle empty input (default)
+            if not selection.strip():
+                # If DEFAULT_MODEL is available, use it; otherwise use first available model
+                if DEFAULT_MODEL in model_names:
+                    print(f'Using default model: "{DEFAULT_MODEL}"')
+                    return DEFAULT_MODEL
+                else:
+                    print(f'Using first available model: "{model_names[0]}"')
+                    return model_names[0]
+            
+            selection_idx = int(selection) - 1
+            
+            if 0 <= selection_idx < len(model_names):
+                selected_model = model_names[selection_idx]
+                print(f'Selected model: {selected_model}')
+                return selected_model
+            else:
+                print(f'Invalid selection. Please enter a number between 1 and {len(model_names)}.')
+        except ValueError:
+            print('Please enter a valid number or press Enter to use the default model.')
 
 
 # Function to define the "role" of the LLM assistant
@@ -261,6 +264,8 @@ def build_prompt():
     
     if len(prompt) > MAX_PROMPT_LENGTH:
         print(f"Warning: Your prompt is very long ({len(prompt)} characters). This may affect performance.")
+        print("Tip: to ask about long documents, put them in a folder and run with --documents <folder>;")
+        print("only the parts relevant to each question are then sent to the model.")
         confirm = input("Continue with this prompt? (y/n): ").lower()
         if not confirm.startswith('y'):
             return build_prompt()
@@ -279,148 +284,277 @@ def build_prompt():
 
 
 # Function to send the langchain call to the LLM and provide a response
-def send_query(model_name, role, style, prompt_text):
+def send_query(model_name, role, style, prompt_text, stream=False, use_cache=True, memory=None, documents=None,
+               top_k=None):
     """
     This function sends the query to the LLM and retrieves the response.
     Added error handling, timeout control, and progress indication.
+    With stream=True the response is printed token by token as it arrives, and the
+    time-to-first-token and tokens/sec are reported. The full text is returned either way.
+    Responses are cached on disk; use_cache=False (or OLLAMA_NO_CACHE=1) bypasses the cache.
+    With OLLAMA_SEMANTIC_CACHE=1, questions similar enough to one answered before get that answer.
+    A query identical to one still being generated follows that generation instead of sending its own.
+    If a ConversationMemory is given, the question is sent as a follow-up in that conversation.
+    Such turns carry the conversation's own Ollama context, so they are sent through the shared client
+    by the memory itself: the chain pool and the coalescing of identical queries only apply when memory
+    is None (library and batch callers), not to the interactive loop in main().
+    If a document_index.DocumentIndex is given, the top_k chunks of it most relevant to the question
+    (default document_index.TOP_K) are sent along with the question.
     """
-    print('\nSending query to LLM, please wait...')
-    start_time = time.time()
-    
-    try:
-        # Show a simple progress indicator
-        progress_thread = None
-        try:
-            from threading import Thread
-            
-            def show_progress():
-                chars = ["-", "\\", "|", "/"]
-                i = 0
-                while True:
-                    sys.stdout.write(f"\rProcessing {chars[i]} ")
-                    sys.stdout.flush()
-                    i = (i + 1) % len(chars)
-                    time.sleep(0.2)
-                    if time.time() - start_time > 120:  # 2 minute timeout
-                        sys.stdout.write("\rProcessing is taking longer than expected... ")
-                        sys.stdout.flush()
-            
-            progress_thread = Thread(target=show_progress)
-            progress_thread.daemon = True
-            progress_thread.start()
-        except ImportError:
-            pass
+    # Every query is measured (cache lookup, warm-up wait, Ollama's timings) by the metrics layer
+    with metrics.track('advanced_ollama', model_name) as call:
+        print('\nSending query to LLM, please wait...')
+        start_time = time.time()
         
-        # Import the correct class
-        try:
-            from langchain_ollama import OllamaLLM
-        except ImportError:
-            print("Warning: langchain_ollama package not found. Falling back to legacy implementation.")
-            OllamaLLM = Ollama
+        # Answers to follow-up questions depend on the history, so only first turns are cached
+        if memory is not None and (memory.turns or memory.summary):
+            use_cache = False
         
-        # Initialize the Ollama model
-        try:
-            llm = OllamaLLM(model=model_name)
-        except Exception as e:
-            print(f"Error initializing model: {str(e)}")
-            print(f"Falling back to default model: '{DEFAULT_MODEL}'")
-            llm = OllamaLLM(model=DEFAULT_MODEL)
-        
-        # Handle "Normal" style by making it empty
-        style_instruction = f"Please provide a {style} answer." if style.lower() != "normal" else ""
+        # Retrieval mode: put only the indexed document chunks most relevant to the question in the prompt.
+        # The conversation history keeps the question alone, so excerpts are not repeated in later turns.
+        question = prompt_text
+        if documents is not None:
+            import document_index  # Deferred: only needed in retrieval mode
+            try:
+                chunks = documents.search(prompt_text, top_k or document_index.TOP_K)
+            except Exception as e:
+                print(f"Error searching the documents: {e}. Answering without them.")
+                chunks = []
+            call.labels['retrieved_chunks'] = len(chunks)
+            if chunks:
+                print(f"Using {len(chunks)} excerpts from: {', '.join(sorted({chunk.file for chunk in chunks}))}")
+            prompt_text = document_index.build_prompt(prompt_text, chunks)
         
-        # Build template based on whether role is provided
-        if role:
-            template = f"""You are a {role}.
-
-Question: {{question}}
-
-{style_instruction}"""
+        # Serve repeated questions from the response cache
+        cache = response_cache.get_cache()
+        rendered_prompt = llm_pool.render_prompt(role, style, prompt_text)
+        cached_response = cache.get(model_name, rendered_prompt, bypass=not use_cache)
+        if not use_cache or cache.bypass:
+            call.cache = 'bypass'
         else:
-            template = f"""Question: {{question}}
-
-{style_instruction}"""
+            call.cache = 'hit' if cached_response is not None else 'miss'
         
-        # Create the prompt template
-        prompt_template = PromptTemplate(
-            template=template,
-            input_variables=["question"]
-        )
+        # Questions asked before in other words are served from the semantic cache, if it is enabled
+        # (not in retrieval mode, where the answer also depends on the retrieved chunks)
+        semantic = semantic_cache.get_cache()
+        match = semantic_cache.MISS
+        use_semantic = semantic.enabled and documents is None
+        if call.cache == 'miss' and use_semantic:
+            lookup_start = time.time()
+            match = semantic.lookup(model_name, role, style, prompt_text)
+            call.semantic_s = time.time() - lookup_start
+            call.similarity = match.similarity
+            if match.response is not None:
+                cached_response = match.response
+                call.cache = 'semantic'
+        if cached_response is not None:
+            if stream:
+                print('\n=== LLM Response ===\n')
+                print(cached_response)
+                print('\n=== End Response ===\n')
+            if call.cache == 'semantic':
+                print(f"Response served from the answer to a similar question (similarity {match.similarity:.2f}) "
+                      f"in {time.time() - start_time:.2f} seconds.")
+            else:
+                print(f"Response served from cache in {time.time() - start_time:.2f} seconds.")
+            if memory is not None:
+                memory.record(question, cached_response)
+            return cached_response
         
-        # Try using modern pipe syntax, but fall back to old chain method if needed
-        try:
-            chain = prompt_template | llm
-            response = chain.invoke({"question": prompt_text})
-        except (AttributeError, TypeError):
-            # Fall back to LLMChain method for older versions
-            from langchain.chains import LLMChain
-            chain = LLMChain(llm=llm, prompt=prompt_template)
-            response = chain.run(question=prompt_text)
+        # If the model is still loading in the background, wait for it so the load time is reported
+        # separately from the (warm) response time
+        warmup = model_warmup.get_warmup(model_name)
+        if warmup is not None and not warmup.reported:
+            if not warmup.done.is_set():
+                print('Waiting for the model to finish loading...')
+            waited = warmup.wait()
+            warmup.reported = True
+            print(f"{warmup.describe()} Waited {waited:.2f} seconds for it before sending the query.")
+            start_time = time.time()  # Time the warm response on its own
         
-        # Stop progress indicator if it's running
-        if progress_thread:
-            sys.stdout.write("\r" + " " * 30 + "\r")  # Clear the progress line
-            sys.stdout.flush()
+        # Show a progress indicator with elapsed time and tokens received; it is always stopped below
+        progress = ProgressReporter(stop_on_first_token=stream, slow_after=REQUEST_TIMEOUT).start()
         
-        elapsed_time = time.time() - start_time
-        print(f"Response received in {elapsed_time:.2f} seconds.")
+        try:
+            if memory is not None:
+                # Conversation mode: send the Ollama context from the previous turn along with the question
+                token_stream = memory.stream(prompt_text, record_as=question)
+            else:
+                # Fetch a ready-to-run chain from the shared pool (built once per model/role/style)
+                chain_model = model_name
+                try:
+                    chain = llm_pool.get_chain(model_name, role, style)
+                except Exception as e:
+                    print(f"Error initializing model: {str(e)}")
+                    print(f"Falling back to default model: '{DEFAULT_MODEL}'")
+                    chain_model = DEFAULT_MODEL
+                    chain = llm_pool.get_chain(DEFAULT_MODEL, role, style)
+                # Keyed by the model that actually answers, so a fallback never shares another model's generation
+                token_stream, call.coalesced = _in_flight.stream((chain_model, rendered_prompt),
+                                                                 lambda: _chain_tokens(chain, prompt_text))
+            
+            # Streaming path: print each token as soon as the model produces it
+            if stream:
+                response = _stream_response(token_stream, start_time, progress)
+                if response:
+                    cache.put(model_name, rendered_prompt, response, bypass=not use_cache)
+                    semantic.put(model_name, role, style, prompt_text, response, match.embedding,
+                                 bypass=call.cache == 'bypass' or not use_semantic)
+                return response
+            
+            # Non-streaming path: still consume the stream so the progress line can count tokens
+            chunks = []
+            for chunk in token_stream:
+                chunks.append(chunk)
+                progress.on_token(chunk)
+            response = "".join(chunks)
+            
+            progress.stop()
+            elapsed_time = time.time() - start_time
+            print(f"Response received in {elapsed_time:.2f} seconds.")
+            
+            if response:
+                cache.put(model_name, rendered_prompt, response, bypass=not use_cache)
+                semantic.put(model_name, role, style, prompt_text, response, match.embedding,
+                             bypass=call.cache == 'bypass' or not use_semantic)
+            return response
         
-        return response
-    
-    except Exception as e:
-        # Stop progress indicator if it's running
-        if 'progress_thread' in locals() and progress_thread:
-            sys.stdout.write("\r" + " " * 30 + "\r")  # Clear the progress line
-            sys.stdout.flush()
+        except Exception as e:
+            # Stop progress indicator if it's running
+            progress.stop()
+            call.fail(e)
+            
+            error_msg = str(e)
+            if isinstance(e, ConnectionError):
+                # Raised by the shared client only once every configured server has failed; the message lists them
+                response = f"Error: {error_msg}. Please make sure Ollama is running by executing 'ollama serve' in a terminal."
+            elif "connection refused" in error_msg.lower():
+                response = "Error: Could not connect to Ollama server. Please make sure it's running by executing 'ollama serve' in a terminal."
+            elif "not found" in error_msg.lower() and model_name in error_msg:
+                response = f"Error: Model '{model_name}' not found. You may need to download it first with 'ollama pull {model_name}'."
+            elif "timeout" in error_msg.lower():
+                response = "Error: The request timed out. The model might be too large for your system or Ollama might be busy."
+            else:
+                response = f'Error getting response: {error_msg}\n\nPlease check if Ollama is running correctly.'
+            
+            # In streaming mode the caller does not print the response, so show the error here
+            if stream:
+                print('\n=== LLM Response ===\n')
+                print(response)
+                print('\n=== End Response ===\n')
+            
+            return response
         
-        error_msg = str(e)
-        if "connection refused" in error_msg.lower():
-            return "Error: Could not connect to Ollama server. Please make sure it's running by executing 'ollama serve' in a terminal."
-        elif "not found" in error_msg.lower() and model_name in error_msg:
-            return f"Error: Model '{model_name}' not found. You may need to download it first with 'ollama pull {model_name}'."
-        elif "timeout" in error_msg.lower():
-            return "Error: The request timed out. The model might be too large for your system or Ollama might be busy."
+        finally:
+            # Make sure the progress thread never outlives the query
+            progress.stop()
+
+
+# Function to stream the text of a chain's response
+def _chain_tokens(chain, prompt_text):
+    """Yields the response text of a pooled chain chunk by chunk."""
+    for chunk in chain.stream({"question": prompt_text}):
+        if isinstance(chunk, dict):
+            chunk = chunk.get("text", "")  # Legacy LLMChain yields dicts
+        yield chunk
+
+
+# Function to print a streamed response token by token and report streaming statistics
+def _stream_response(token_stream, start_time, progress):
+    """
+    Prints streamed response text to stdout and returns the full response text.
+    Reports time-to-first-token (TTFT) and generation speed in tokens/sec.
+    Ollama streams roughly one token per chunk, so chunks are counted as tokens.
+    """
+    chunks = []
+    
+    for chunk in token_stream:
+        if not chunk:
+            continue  # The final "done" message carries no text
+        if not chunks:
+            # First token: the progress reporter stops itself, so open the response block
+            progress.on_token(chunk)
+            print('\n=== LLM Response ===\n')
         else:
-            return f'Error getting response: {error_msg}\n\nPlease check if Ollama is running correctly.'
+            progress.on_token(chunk)
+        chunks.append(chunk)
+        sys.stdout.write(chunk)
+        sys.stdout.flush()
+    
+    # Make sure the progress indicator stops even if the model returned nothing
+    progress.stop()
+    end_time = time.time()
+    response = "".join(chunks)
+    
+    if not chunks:
+        print('\n=== LLM Response ===\n')
+    print('\n\n=== End Response ===\n')
+    
+    # Report latency and throughput next to the total response time
+    first_token_time = progress.first_token_time or end_time
+    elapsed_time = end_time - start_time
+    ttft = first_token_time - start_time
+    generation_time = end_time - first_token_time
+    tokens_per_sec = len(chunks) / generation_time if generation_time > 0 else 0.0
+    print(f"Response received in {elapsed_time:.2f} seconds "
+          f"(first token after {ttft:.2f} seconds, {len(chunks)} tokens at {tokens_per_sec:.1f} tokens/sec).")
+    
+    return response
 
 
-def save_conversation(prompt, response, model, role, style):
+def save_conversation(prompt, response, model, role, style, conversation_id=None):
     """
-    Offers to save the conversation to a file.
+    Offers to save the conversation to the conversation store.
+    Turns of one conversation share a conversation_id, so they can be read back together
+    (see "python conversation_store.py --help").
     """
     save = input("\nWould you like to save this conversation? (y/n): ").lower()
     if not save.startswith('y'):
         return
     
-    filename = input("Enter filename (default: ollama_conversation.txt): ").strip()
-    if not filename:
-        filename = "ollama_conversation.txt"
-    
-    mode = 'a' if os.path.exists(filename) else 'w'
-    
     try:
-        with open(filename, mode) as f:
-            f.write(f"{'=' * 80}\n")
-            f.write(f"Date: {time.strftime('%Y-%m-%d %H:%M:%S')}\n")
-            f.write(f"Model: {model}\n")
-            if role:
-                f.write(f"Role: {role}\n")
-            f.write(f"Style: {style}\n")
-            f.write(f"\nPROMPT:\n{prompt}\n\n")
-            f.write(f"RESPONSE:\n{response}\n\n")
-        print(f"Conversation saved to {filename}")
+        store = conversation_store.get_store()
+        store.append(model, role, style, prompt, response, conversation_id=conversation_id)
+        store.flush()  # Written (committed) before it is reported as saved
+        print(f"Conversation saved to {store.path}")
     except Exception as e:
         print(f"Error saving conversation: {e}")
 
 
-def main():
+def main(argv=None):
     """Main function to run the program with basic conversation loop."""
+    argv = sys.argv[1:] if argv is None else argv
+    
+    # Headless batch mode: python advanced_ollama.py --batch requests.jsonl [-o results.jsonl]
+    if argv and argv[0] == '--batch':
+        import batch_ollama
+        return batch_ollama.main(argv[1:])
+    
     print('Welcome to the Ollama local LLM Interface.\n')
     print('Press Ctrl+C at any time to exit the program.\n')
     
+    # Retrieval mode: python advanced_ollama.py --documents ./notes answers from the files in ./notes
+    documents = None
+    if argv and argv[0] == '--documents':
+        if len(argv) < 2 or not os.path.isdir(argv[1]):
+            print('Usage: python advanced_ollama.py --documents <directory of text files>')
+            return 1
+        import document_index
+        try:
+            documents = document_index.open_index(argv[1])
+        except Exception as e:
+            print(f'Error indexing documents: {e}')
+            print(f'Make sure the embedding model is available (ollama pull {document_index.EMBED_MODEL}).')
+            return 1
+        print()
+    
+    # Start fetching the model list while the welcome message is read
+    model_catalog.get_catalog().refresh_in_background()
+    
     try:
-        # Select model
+        # Select model and start loading it while the role and style are chosen
         model_name = select_llm()
+        model_warmup.start_warmup(model_name)
         
         # Define role
         role = define_role()
@@ -428,20 +562,26 @@ def main():
         # Define style
         style = define_response_style()
         
+        # Conversation history, so follow-up questions keep their context
+        memory = ConversationMemory(model_name, role, style, token_budget=CONVERSATION_TOKEN_BUDGET)
+        conversation_id = conversation_store.new_conversation_id()
+        
         # Conversation loop
         while True:
             # Build prompt
             prompt_text = build_prompt()
             
-            # Send query and print response
-            response = send_query(model_name, role, style, prompt_text)
+            # Send query and print response (streamed responses are printed as they arrive)
+            response = send_query(model_name, role, style, prompt_text, stream=STREAM_RESPONSES, memory=memory,
+                                  documents=documents)
             
-            print('\n=== LLM Response ===\n')
-            print(response)
-            print('\n=== End Response ===\n')
+            if not STREAM_RESPONSES:
+                print('\n=== LLM Response ===\n')
+                print(response)
+                print('\n=== End Response ===\n')
             
             # Offer to save the conversation
-            save_conversation(prompt_text, response, model_name, role, style)
+            save_conversation(prompt_text, response, model_name, role, style, conversation_id)
             
             # Ask if the user wants to continue
             continue_chat = input("\nAsk another question? (y/n): ").lower()
@@ -456,12 +596,17 @@ def main():
                 
                 if 'model' in change_what or 'all' in change_what:
                     model_name = select_llm()
+                    model_warmup.start_warmup(model_name)
                 
                 if 'role' in change_what or 'all' in change_what:
                     role = define_role()
                 
                 if 'style' in change_what or 'all' in change_what:
                     style = define_response_style()
+                
+                # The conversation context belongs to one model/role/style, so start a new one
+                memory = ConversationMemory(model_name, role, style, token_budget=CONVERSATION_TOKEN_BUDGET)
+                conversation_id = conversation_store.new_conversation_id()
     
     except Exception as e:
         print(f"\nAn unexpected error occurred: {e}")
@@ -472,4 +617,5 @@ def main():
 
 
 if __name__ == '__main__':
+    signal.signal(signal.SIGINT, signal_handler)
     sys.exit(main())
\ No newline at end of file
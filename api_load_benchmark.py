@@ -0,0 +1,151 @@
+# Load test for the HTTP service in api_server.py
+# Opens many concurrent clients against /chat, /v1/chat/completions or /summarize and reports
+# status codes, latency and time-to-first-token percentiles and overall request throughput, along
+# with the service's own counters (coalesced requests, rejections). A small set of prompts is
+# cycled through, so concurrent clients send repeated prompts the way real traffic does.
+# With --stub the fake Ollama server and the service both run in-process; --backends starts several
+# fake servers for the service to balance requests over.
+#
+#   python api_load_benchmark.py --stub --clients 300 --requests 3 --stream
+#   python api_load_benchmark.py --stub --backends 3 --clients 300
+#   python api_load_benchmark.py --url http://127.0.0.1:8000 --endpoint openai --clients 100
+
+# Import statements
+import argparse
+import asyncio
+import collections
+import json
+import os
+import sys
+import time
+import httpx
+from metrics import percentile
+
+# Constants
+DEFAULT_CLIENTS = 200
+DEFAULT_REQUESTS = 3  # requests per client, sent one after another
+DEFAULT_UNIQUE_PROMPTS = 20
+ENDPOINTS = {'chat': '/chat', 'openai': '/v1/chat/completions', 'summarize': '/summarize'}
+STUB_TOKEN_DELAY = 0.005
+STUB_RESPONSE_TOKENS = 20
+STUB_PARALLEL = 4
+
+
+# Function to build the request body for one prompt
+def build_body(endpoint, model_name, prompt, stream):
+    """Returns the JSON body for the endpoint. The response cache is bypassed so every request is generated."""
+    if endpoint == 'openai':
+        return {'model': model_name, 'messages': [{'role': 'user', 'content': prompt}], 'stream': stream}
+    if endpoint == 'summarize':
+        return {'text': f'{prompt} ' * 50, 'stream': stream, 'use_cache': False}
+    return {'model': model_name, 'prompt': prompt, 'role': 'teacher', 'style': 'Concise', 'stream': stream,
+            'use_cache': False}
+
+
+# Function to send one request and time it
+async def send_request(client, url, body, stream):
+    """Returns (status, latency in seconds, time to first token or None)."""
+    start_time = time.time()
+    first_token = None
+    try:
+        if not stream:
+            response = await client.post(url, json=body)
+            return response.status_code, time.time() - start_time, None
+        async with client.stream('POST', url, json=body) as response:
+            async for line in response.aiter_lines():
+                if first_token is None and line.startswith('data:'):
+                    first_token = time.time() - start_time
+            return response.status_code, time.time() - start_time, first_token
+    except httpx.HTTPError as e:
+        return type(e).__name__, time.time() - start_time, first_token
+
+
+# Function to run the whole load test
+async def run_load_test(base_url, endpoint, model_name, clients, requests, unique_prompts, stream):
+    """Runs clients concurrent clients of requests requests each and returns the summary dictionary."""
+    url = base_url.rstrip('/') + ENDPOINTS[endpoint]
+    prompts = [f'Question {i}: what is the capital of country number {i}?' for i in range(unique_prompts)]
+    results = []
+    limits = httpx.Limits(max_connections=clients, max_keepalive_connections=clients)
+
+    async with httpx.AsyncClient(limits=limits, timeout=None) as client:
+        async def run_client(index):
+            for i in range(requests):
+                prompt = prompts[(index + i * clients) % len(prompts)]
+                results.append(await send_request(client, url, build_body(endpoint, model_name, prompt, stream), stream))
+
+        start_time = time.time()
+        await asyncio.gather(*(run_client(index) for index in range(clients)))
+        elapsed = time.time() - start_time
+
+        try:
+            service_stats = (await client.get(base_url.rstrip('/') + '/health')).json()
+        except (httpx.HTTPError, ValueError):
+            service_stats = None
+
+    latencies = [latency for status, latency, _ in results if status == 200]
+    ttfts = [ttft for status, _, ttft in results if status == 200 and ttft is not None]
+
+    def rounded(value):
+        return round(value, 4) if value is not None else None
+    return {
+        'endpoint': endpoint, 'stream': stream, 'clients': clients, 'requests': len(results),
+        'statuses': dict(collections.Counter(str(status) for status, _, _ in results)),
+        'errors': sum(1 for status, _, _ in results if status != 200),
+        'elapsed_s': rounded(elapsed),
+        'requests_per_sec': rounded(len(latencies) / elapsed) if elapsed else None,
+        'latency_p50_s': rounded(percentile(latencies, 50)),
+        'latency_p95_s': rounded(percentile(latencies, 95)),
+        'latency_p99_s': rounded(percentile(latencies, 99)),
+        'ttft_p50_s': rounded(percentile(ttfts, 50)),
+        'ttft_p95_s': rounded(percentile(ttfts, 95)),
+        'service': service_stats,
+    }
+
+
+def main(argv=None):
+    """Command-line entry point."""
+    parser = argparse.ArgumentParser(description='Load test the Ollama HTTP service.')
+    parser.add_argument('--url', default='http://127.0.0.1:8000', help='Base URL of the running service')
+    parser.add_argument('--endpoint', choices=list(ENDPOINTS), default='chat')
+    parser.add_argument('-m', '--model', default=None, help='Model to request (default: the service default, or the stub model)')
+    parser.add_argument('-c', '--clients', type=int, default=DEFAULT_CLIENTS, help='Concurrent clients')
+    parser.add_argument('-n', '--requests', type=int, default=DEFAULT_REQUESTS, help='Requests per client')
+    parser.add_argument('-u', '--unique-prompts', type=int, default=DEFAULT_UNIQUE_PROMPTS,
+                        help='Distinct prompts cycled through by the clients')
+    parser.add_argument('--stream', action='store_true', help='Request server-sent event streams')
+    parser.add_argument('--stub', action='store_true', help='Run the fake Ollama server and the service in-process')
+    parser.add_argument('--backends', type=int, default=1, help='Fake Ollama servers to start with --stub')
+    args = parser.parse_args(argv)
+
+    base_url = args.url
+    model_name = args.model
+    stubs = []
+    service = None
+    if args.stub:
+        from fake_ollama_server import start_server as start_stub, DEFAULT_MODELS as STUB_MODELS
+        from summarizer import SUMMARY_MODEL
+        stubs = [start_stub(models=STUB_MODELS + [SUMMARY_MODEL], token_delay=STUB_TOKEN_DELAY,
+                            response_tokens=STUB_RESPONSE_TOKENS, max_parallel=STUB_PARALLEL)
+                 for _ in range(max(1, args.backends))]
+        hosts = ','.join(stub.url for stub in stubs)
+        os.environ['OLLAMA_HOSTS'] = hosts  # For the summarizer's shared client
+        import api_server
+        service = api_server.start_server(ollama_host=hosts, concurrency=STUB_PARALLEL * len(stubs))
+        base_url = service.url
+        model_name = model_name or STUB_MODELS[0]
+
+    try:
+        report = asyncio.run(run_load_test(base_url, args.endpoint, model_name, args.clients, args.requests,
+                                           args.unique_prompts, args.stream))
+    finally:
+        if service is not None:
+            service.shutdown()
+        for stub in stubs:
+            stub.shutdown()
+    print(json.dumps(report, indent=2))
+    return 0 if report['errors'] == 0 else 2
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,618 @@
+# Local HTTP service for the Ollama query pipeline
+# Gives other programs the role/style templating of the query scripts and the document summarizer
+# over HTTP, plus an OpenAI-compatible chat endpoint for existing client libraries:
+#   POST /chat                  {"prompt", "model", "role", "style", "options", "stream", "use_cache"}
+#   POST /summarize             {"text", "stream", "use_cache"}
+#   POST /v1/chat/completions   OpenAI chat completions, streaming and non-streaming
+#   GET  /v1/models, GET /health
+# With "stream": true the response is sent as server-sent events, one per token.
+#
+# The service is a single asyncio event loop, so hundreds of waiting or streaming clients are cheap.
+# All requests to Ollama share one pooled AsyncClient, and at most --concurrency of them run at once
+# (match OLLAMA_NUM_PARALLEL, times the number of servers if --ollama-host lists several to balance
+# requests over); the rest wait their turn, and new requests get HTTP 503 once
+# --max-pending are waiting. Identical requests that arrive while one of them is being generated
+# are coalesced: they follow the same generation instead of starting their own.
+#
+#   python api_server.py --port 8000
+#   curl -N localhost:8000/chat -d '{"prompt": "Why is the sky blue?", "role": "teacher", "stream": true}'
+
+# Import statements
+import argparse
+import asyncio
+import contextlib
+import functools
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+import llm_pool
+import metrics
+import response_cache
+import coalesce
+import backend_pool
+import summarizer
+from llm_pool import DEFAULT_MODEL, REQUEST_TIMEOUT
+
+# Constants
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8000
+BACKEND_CONCURRENCY = int(os.environ.get('OLLAMA_NUM_PARALLEL') or 4)  # requests sent to Ollama at once
+MAX_PENDING = 256  # generations waiting for Ollama before new requests are rejected with HTTP 503
+MAX_BODY_BYTES = 16 * 1024 * 1024  # largest accepted request body (documents for /summarize)
+MAX_HEADERS = 100
+KEEP_ALIVE_TIMEOUT = 30  # seconds an idle client connection is kept open
+SUMMARY_WORKERS = 2  # documents summarized at once; each sends up to MAX_PARALLEL_CHUNKS requests itself
+OPENAI_OPTIONS = {'temperature': 'temperature', 'top_p': 'top_p', 'max_tokens': 'num_predict', 'seed': 'seed',
+                  'stop': 'stop', 'presence_penalty': 'presence_penalty', 'frequency_penalty': 'frequency_penalty'}
+
+# A parsed HTTP request
+Request = namedtuple('Request', ['method', 'path', 'headers', 'body', 'keep_alive'])
+
+
+class HTTPError(Exception):
+    """An error response: raised while handling a request and sent back with its status code."""
+
+    def __init__(self, status, message, headers=None):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+        self.headers = headers or {}
+
+
+class LLMService:
+    """
+    Request handling for the HTTP service: routing, backend concurrency and request coalescing.
+
+    Args:
+        ollama_host (str): Ollama server URL, or several separated by commas
+            (default: OLLAMA_HOSTS, OLLAMA_HOST or the local server)
+        concurrency (int): Requests sent to Ollama at once
+        max_pending (int): Generations allowed to wait for a free slot before HTTP 503 is returned
+    """
+
+    def __init__(self, ollama_host=None, concurrency=BACKEND_CONCURRENCY, max_pending=MAX_PENDING):
+        self.ollama_host = ollama_host
+        self.concurrency = concurrency
+        self.max_pending = max_pending
+        self.client = None
+        self.server = None
+        self.loop = None
+        self._thread = None  # Event loop thread of a service started with start_server()
+        self.stats = {'requests': 0, 'generations': 0, 'coalesced': 0, 'cache_hits': 0, 'rejected': 0, 'errors': 0}
+        self._slots = asyncio.Semaphore(concurrency)
+        self._waiting = 0  # generations waiting for a slot
+        self.in_flight = coalesce.AsyncSingleFlight()  # request key -> generation shared by identical requests
+        self._executor = ThreadPoolExecutor(SUMMARY_WORKERS, thread_name_prefix='summarize')
+        self._routes = {
+            ('POST', '/chat'): self.chat,
+            ('POST', '/summarize'): self.summarize,
+            ('POST', '/v1/chat/completions'): self.chat_completions,
+            ('GET', '/v1/models'): self.list_models,
+            ('GET', '/health'): self.health,
+        }
+
+    @property
+    def url(self):
+        host, port = self.server.sockets[0].getsockname()[:2]
+        return f'http://{host}:{port}'
+
+    async def start(self, host=DEFAULT_HOST, port=DEFAULT_PORT):
+        """Creates the pooled Ollama client and starts listening. Returns the asyncio server."""
+        import httpx  # Installed with ollama, which uses it for its clients
+        # One keep-alive connection per backend slot, reused by every request
+        limits = httpx.Limits(max_connections=self.concurrency, max_keepalive_connections=self.concurrency)
+        pool = backend_pool.get_pool(backend_pool.parse_hosts(self.ollama_host))
+        self.client = metrics.instrument_client(backend_pool.AsyncPooledClient(pool, limits=limits))
+        self.loop = asyncio.get_running_loop()
+        self.server = await asyncio.start_server(self.handle_connection, host, port, backlog=1024)
+        return self.server
+
+    def shutdown(self):
+        """Stops a service started with start_server() from another thread."""
+        if self.loop is not None:
+            asyncio.run_coroutine_threadsafe(self.close(), self.loop).result()
+            self.loop.call_soon_threadsafe(self.loop.stop)
+        if self._thread is not None:
+            self._thread.join()  # Until the loop and its worker threads are closed
+
+    async def close(self):
+        """Stops listening, cancels open connections and generations, and closes the Ollama client."""
+        self.server.close()
+        tasks = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await self.client.aclose()  # The underlying httpx connection pools
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    # Connection handling
+
+    async def handle_connection(self, reader, writer):
+        """Serves the requests of one client connection until it is closed or idle for too long."""
+        try:
+            while True:
+                try:
+                    request = await asyncio.wait_for(_read_request(reader), KEEP_ALIVE_TIMEOUT)
+                except HTTPError as e:
+                    await _send_json(writer, e.status, {'error': e.message}, keep_alive=False)
+                    break
+                except (asyncio.TimeoutError, asyncio.IncompleteReadError):
+                    break
+                if request is None or not await self.dispatch(request, writer):
+                    break
+        except ConnectionError:
+            pass  # The client went away
+        except asyncio.CancelledError:
+            pass  # Shutting down; the stream callback would otherwise report every open connection
+        finally:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+    async def dispatch(self, request, writer):
+        """Runs the handler for a request. Returns True if the connection can be kept open."""
+        handler = self._routes.get((request.method, request.path))
+        try:
+            if handler is None:
+                known = any(path == request.path for _, path in self._routes)
+                raise HTTPError(405 if known else 404, f'{request.method} {request.path} is not supported')
+            payload = {}
+            if request.method == 'POST':
+                try:
+                    payload = json.loads(request.body or b'{}')
+                except ValueError:
+                    raise HTTPError(400, 'request body is not valid JSON')
+                if not isinstance(payload, dict):
+                    raise HTTPError(400, 'request body must be a JSON object')
+            self.stats['requests'] += 1
+            return await handler(payload, request, writer)
+        except HTTPError as e:
+            if e.status >= 500 and e.status != 503:  # Rejections are counted separately
+                self.stats['errors'] += 1
+            # OpenAI clients expect the error message inside an object
+            error = {'message': e.message, 'code': e.status} if request.path.startswith('/v1/') else e.message
+            await _send_json(writer, e.status, {'error': error}, keep_alive=request.keep_alive, headers=e.headers)
+            return request.keep_alive
+        except ConnectionError:
+            raise
+        except Exception as e:
+            self.stats['errors'] += 1
+            print(f'Error handling {request.method} {request.path}: {e}', file=sys.stderr)
+            await _send_json(writer, 500, {'error': 'internal error'}, keep_alive=False)
+            return False
+
+    # Endpoints
+
+    async def chat(self, payload, request, writer):
+        """POST /chat: one question with the role/style template of the query scripts."""
+        prompt = _required(payload, 'prompt')
+        model_name = _optional(payload, 'model') or DEFAULT_MODEL
+        role = _optional(payload, 'role') or None
+        style = _optional(payload, 'style') or 'Normal'
+        options = payload.get('options') or None
+        # Sampling options change the answer, so only default requests are served from the cache
+        use_cache = payload.get('use_cache', True) and not options
+        system, rendered = llm_pool.render_request(role, style, prompt)
+        # Intentionally keyed by the full rendered text, not the system/prompt split: it is the key send_query
+        # uses, so the service and the query scripts share entries
+        cache_prompt = llm_pool.render_prompt(role, style, prompt)
+
+        cache = response_cache.get_cache()
+        cached = await asyncio.to_thread(cache.get, model_name, cache_prompt, bypass=not use_cache)
+        # Reported in the metrics like send_query does, so hit rates cover the service too
+        cache_result = 'bypass' if not use_cache or cache.bypass else 'hit' if cached is not None else 'miss'
+        if cached is not None:
+            self.stats['cache_hits'] += 1
+            flight = coalesce.AsyncFlight()
+            flight.push(cached)
+            flight.finish()
+            coalesced = False
+        else:
+            request_args = {'prompt': rendered, 'system': system, 'options': options}
+            key = ('chat', model_name, json.dumps(request_args, sort_keys=True))
+            produce = functools.partial(self._generate, model_name, 'generate', request_args, 'chat',
+                                        cache_prompt if use_cache else None, cache_result)
+            flight, coalesced = self._join(key, produce)
+
+        def done(flight):
+            return {'model': model_name, 'response': flight.result, 'cached': cached is not None,
+                    'coalesced': coalesced, **_counts(flight.final)}
+        return await self._deliver(request, writer, flight, payload.get('stream', False),
+                                   lambda token: {'token': token}, done, tracked=(model_name, 'chat', coalesced),
+                                   cache_result=cache_result)
+
+    async def summarize(self, payload, request, writer):
+        """POST /summarize: a summary of the text, using the map-reduce summarizer for long documents."""
+        text = _required(payload, 'text')
+        use_cache = bool(payload.get('use_cache', True))
+        key = ('summarize', hashlib.sha256(text.encode('utf-8')).hexdigest(), use_cache)
+        flight, coalesced = self._join(key, functools.partial(self._summarize, text, use_cache))
+
+        def done(flight):
+            return {'summary': flight.result, 'coalesced': coalesced}
+        return await self._deliver(request, writer, flight, payload.get('stream', False),
+                                   lambda token: {'token': token}, done, tracked=(summarizer.SUMMARY_MODEL, 'summarize', coalesced))
+
+    async def chat_completions(self, payload, request, writer):
+        """POST /v1/chat/completions: the OpenAI chat API, answered with Ollama's chat endpoint."""
+        messages = payload.get('messages')
+        if not isinstance(messages, list) or not messages:
+            raise HTTPError(400, '"messages" must be a non-empty list')
+        try:
+            messages = [{'role': str(message['role']), 'content': str(message.get('content') or '')}
+                        for message in messages]
+        except (KeyError, TypeError, AttributeError):
+            raise HTTPError(400, 'every message needs a "role" and "content"')
+        model_name = _optional(payload, 'model') or DEFAULT_MODEL
+        options = {name: payload[field] for field, name in OPENAI_OPTIONS.items() if payload.get(field) is not None}
+        request_args = {'messages': messages, 'options': options or None}
+        key = ('chat_completions', model_name, json.dumps(request_args, sort_keys=True))
+        flight, coalesced = self._join(key, functools.partial(self._generate, model_name, 'chat', request_args,
+                                                              'chat_completions', None, None))
+
+        completion_id = f'chatcmpl-{uuid.uuid4().hex[:24]}'
+        created = int(time.time())
+        if not payload.get('stream'):
+            def done(flight):
+                counts = _counts(flight.final)
+                prompt_tokens = counts.get('prompt_eval_count') or 0
+                completion_tokens = counts.get('eval_count') or 0
+                return {
+                    'id': completion_id, 'object': 'chat.completion', 'created': created, 'model': model_name,
+                    'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': flight.result},
+                                 'finish_reason': _finish_reason(flight.final)}],
+                    'usage': {'prompt_tokens': prompt_tokens, 'completion_tokens': completion_tokens,
+                              'total_tokens': prompt_tokens + completion_tokens},
+                }
+            return await self._deliver(request, writer, flight, False, None, done,
+                                       tracked=(model_name, 'chat_completions', coalesced))
+
+        def chunk(delta, finish_reason=None):
+            return {'id': completion_id, 'object': 'chat.completion.chunk', 'created': created, 'model': model_name,
+                    'choices': [{'index': 0, 'delta': delta, 'finish_reason': finish_reason}]}
+        return await self._deliver(request, writer, flight, True,
+                                   lambda token: chunk({'role': 'assistant', 'content': token}),
+                                   lambda flight: chunk({}, _finish_reason(flight.final)), done_marker='[DONE]',
+                                   tracked=(model_name, 'chat_completions', coalesced))
+
+    async def list_models(self, payload, request, writer):
+        """GET /v1/models: the models available in Ollama, in the OpenAI list format."""
+        try:
+            response = await self.client.list()
+        except Exception as e:
+            raise _backend_error(e)
+        data = [{'id': model.model, 'object': 'model', 'created': 0, 'owned_by': 'ollama'} for model in response.models]
+        await _send_json(writer, 200, {'object': 'list', 'data': data}, keep_alive=request.keep_alive)
+        return request.keep_alive
+
+    async def health(self, payload, request, writer):
+        """GET /health: liveness plus the service's counters, current load and the state of each Ollama server."""
+        body = {'status': 'ok', 'in_flight': len(self.in_flight), 'waiting': self._waiting, **self.stats,
+                'backends': self.client.pool.status()}
+        await _send_json(writer, 200, body, keep_alive=request.keep_alive)
+        return request.keep_alive
+
+    # Generation and coalescing
+
+    def _join(self, key, produce):
+        """
+        Returns (flight, coalesced) for a request: the generation already in progress for the same key,
+        or a new one started with produce(flight).
+        """
+        if self.in_flight.get(key) is None:
+            # Generations beyond the running ones are waiting for a slot
+            if len(self.in_flight) >= self.concurrency + self.max_pending:
+                self.stats['rejected'] += 1
+                raise HTTPError(503, 'server busy, too many pending requests', headers={'Retry-After': '1'})
+            self.stats['generations'] += 1
+        flight, coalesced = self.in_flight.join(key, produce)
+        if coalesced:
+            self.stats['coalesced'] += 1
+        return flight, coalesced
+
+    async def _generate(self, model_name, method, request_args, endpoint, cache_prompt, cache_result, flight):
+        """
+        Streams one generate() or chat() request into the flight, waiting for a backend slot first.
+        cache_result is the outcome of the response cache lookup made for it, if there was one.
+        """
+        with metrics.track('api_server', model_name, queued_at=flight.created, endpoint=endpoint) as call:
+            call.coalesced = False
+            call.cache = cache_result
+            self._waiting += 1
+            try:
+                await self._slots.acquire()
+            except asyncio.CancelledError:
+                call.fail('cancelled', status='cancelled')
+                raise
+            finally:
+                self._waiting -= 1
+            try:
+                await self._stream(model_name, method, request_args, flight)
+            except asyncio.CancelledError:
+                call.fail('cancelled', status='cancelled')
+                raise
+            finally:
+                self._slots.release()
+        if cache_prompt is not None and flight.tokens:
+            await asyncio.to_thread(response_cache.get_cache().put, model_name, cache_prompt, ''.join(flight.tokens))
+
+    async def _stream(self, model_name, method, request_args, flight):
+        """
+        Pushes the text of each response part into the flight. REQUEST_TIMEOUT applies to the wait for
+        every part (the first one, then the gap between tokens), not to the whole response, so a long
+        answer keeps streaming as long as tokens keep coming.
+        """
+        parts = await getattr(self.client, method)(model=model_name, stream=True, keep_alive=llm_pool.KEEP_ALIVE,
+                                                   **request_args)
+        try:
+            while True:
+                try:
+                    part = await asyncio.wait_for(parts.__anext__(), REQUEST_TIMEOUT)
+                except StopAsyncIteration:
+                    break
+                text = part.response if method == 'generate' else part.message.content
+                if text:
+                    flight.push(text)
+                if part.done:
+                    flight.final = part
+        finally:
+            await parts.aclose()  # Ends the HTTP response if the stream timed out or was cancelled
+
+    async def _summarize(self, text, use_cache, flight):
+        """Runs the summarizer in a worker thread, streaming the tokens of the final summary into the flight."""
+        cancel_event = threading.Event()
+
+        def on_output(token):
+            self.loop.call_soon_threadsafe(flight.push, token)
+        try:
+            return await self.loop.run_in_executor(
+                self._executor, functools.partial(summarizer.summarize_text, text, on_output=on_output,
+                                                  cancel_event=cancel_event, use_cache=use_cache))
+        except asyncio.CancelledError:
+            cancel_event.set()  # Stops the worker thread at its next token
+            raise
+        except summarizer.SummaryCancelled:
+            raise HTTPError(499, 'cancelled')
+
+    async def _deliver(self, request, writer, flight, stream, on_token, on_done, tracked, done_marker=None,
+                       cache_result=None):
+        """
+        Sends a flight to one client: as a JSON body once it is done, or as server-sent events.
+        tracked is (model, endpoint, coalesced); requests served by another request's generation or
+        from the response cache (cache_result "hit") are recorded in the metrics here, as they never
+        reach Ollama themselves.
+        The generation is cancelled when the last client following it disconnects.
+        """
+        model_name, endpoint, coalesced = tracked
+        served = coalesced or cache_result == 'hit'
+        flight.subscribers += 1
+        try:
+            with metrics.track('api_server', model_name, endpoint=endpoint) if served else _untracked() as call:
+                if call is not None:
+                    call.coalesced = coalesced
+                    call.cache = cache_result
+                if not stream:
+                    try:
+                        await flight.wait()
+                    except Exception as e:
+                        raise _backend_error(e)
+                    await _send_json(writer, 200, on_done(flight), keep_alive=request.keep_alive)
+                    return request.keep_alive
+
+                await _start_events(writer)
+                try:
+                    async for token in flight.follow():
+                        await _send_event(writer, on_token(token))
+                    await _send_event(writer, on_done(flight))
+                except (ConnectionError, asyncio.CancelledError):
+                    raise
+                except Exception as e:
+                    error = _backend_error(e)
+                    if call is not None:
+                        call.fail(error.message)
+                    await _send_event(writer, {'error': error.message, 'code': error.status}, event='error')
+                if done_marker:
+                    await _send_event(writer, done_marker)
+                return False  # Event streams are delimited by closing the connection
+        finally:
+            flight.subscribers -= 1
+            if not flight.subscribers and not flight.done:
+                self.in_flight.abandon(flight)
+
+
+@contextlib.contextmanager
+def _untracked():
+    yield None
+
+
+# Function to read one HTTP/1.1 request from a connection
+async def _read_request(reader):
+    """Returns the next Request, or None when the client closed the connection."""
+    try:
+        line = await reader.readline()
+        if not line:
+            return None
+        parts = line.decode('latin-1').split()
+        if len(parts) != 3:
+            raise HTTPError(400, 'malformed request line')
+        method, target, version = parts
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+            if len(headers) > MAX_HEADERS:
+                raise HTTPError(431, 'too many headers')
+    except ValueError:
+        raise HTTPError(431, 'request line or header too long')
+
+    if 'chunked' in headers.get('transfer-encoding', '').lower():
+        raise HTTPError(411, 'chunked request bodies are not supported, send Content-Length')
+    try:
+        length = int(headers.get('content-length') or 0)
+    except ValueError:
+        raise HTTPError(400, 'invalid Content-Length')
+    if length > MAX_BODY_BYTES:
+        raise HTTPError(413, f'request body is larger than {MAX_BODY_BYTES} bytes')
+    body = await reader.readexactly(length) if length > 0 else b''
+
+    connection = headers.get('connection', '').lower()
+    keep_alive = connection != 'close' if version == 'HTTP/1.1' else connection == 'keep-alive'
+    return Request(method.upper(), target.split('?')[0], headers, body, keep_alive)
+
+
+async def _send_json(writer, status, payload, keep_alive=True, headers=None):
+    body = json.dumps(payload).encode('utf-8')
+    lines = [f'HTTP/1.1 {status} {_reason(status)}', 'Content-Type: application/json',
+             f'Content-Length: {len(body)}', f'Connection: {"keep-alive" if keep_alive else "close"}']
+    lines += [f'{name}: {value}' for name, value in (headers or {}).items()]
+    writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1') + body)
+    await writer.drain()
+
+
+async def _start_events(writer):
+    writer.write(b'HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\nCache-Control: no-cache\r\n'
+                 b'Connection: close\r\n\r\n')
+    await writer.drain()
+
+
+async def _send_event(writer, data, event=None):
+    text = data if isinstance(data, str) else json.dumps(data)
+    writer.write(((f'event: {event}\n' if event else '') + f'data: {text}\n\n').encode('utf-8'))
+    await writer.drain()  # Raises ConnectionError once the client has gone
+
+
+def _reason(status):
+    try:
+        return HTTPStatus(status).phrase
+    except ValueError:
+        return 'Client Closed Request' if status == 499 else 'Error'
+
+
+def _required(payload, field):
+    value = payload.get(field)
+    if not isinstance(value, str) or not value.strip():
+        raise HTTPError(400, f'"{field}" must be a non-empty string')
+    return value
+
+
+def _optional(payload, field):
+    """Returns an optional text field, or None if it is missing."""
+    value = payload.get(field)
+    if value is not None and not isinstance(value, str):
+        raise HTTPError(400, f'"{field}" must be a string')
+    return value
+
+
+def _counts(final):
+    """Ollama's token counts and durations from a final response part (durations in seconds)."""
+    if final is None:
+        return {}
+    counts = {'prompt_eval_count': final.prompt_eval_count, 'eval_count': final.eval_count}
+    if final.total_duration is not None:
+        counts['total_duration_s'] = round(final.total_duration / 1e9, 4)
+    return counts
+
+
+def _finish_reason(final):
+    return 'length' if final is not None and final.done_reason == 'length' else 'stop'
+
+
+def _backend_error(error):
+    """Converts an exception from the Ollama client into the HTTPError sent to the client."""
+    if isinstance(error, HTTPError):
+        return error
+    if isinstance(error, coalesce.FlightAbandoned):
+        return HTTPError(499, 'cancelled')
+    if isinstance(error, asyncio.TimeoutError):
+        return HTTPError(504, f'Ollama sent no tokens for {REQUEST_TIMEOUT} seconds')
+    status = getattr(error, 'status_code', None)
+    if status in (400, 404):
+        return HTTPError(status, getattr(error, 'error', None) or str(error))
+    if isinstance(error, backend_pool.BackendUnavailable):
+        return HTTPError(502, str(error))
+    if isinstance(error, ConnectionError) or type(error).__name__ in ('ConnectError', 'ConnectTimeout'):
+        return HTTPError(502, "Could not connect to Ollama server. Please make sure it's running.")
+    return HTTPError(502, f'Ollama error: {getattr(error, "error", None) or error}')
+
+
+# Function to run the service on a background thread
+def start_server(host=DEFAULT_HOST, port=0, **settings):
+    """Starts an LLMService on its own event loop in a daemon thread and returns it once it is listening."""
+    service = LLMService(**settings)
+    ready = threading.Event()
+    errors = []
+
+    def run():
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        try:
+            loop.run_until_complete(service.start(host, port))
+        except Exception as e:
+            errors.append(e)
+            return
+        finally:
+            ready.set()
+        try:
+            loop.run_forever()
+        finally:
+            loop.run_until_complete(loop.shutdown_default_executor())  # Threads of asyncio.to_thread()
+            loop.close()
+
+    service._thread = threading.Thread(target=run, daemon=True)
+    service._thread.start()
+    ready.wait()
+    if errors:
+        raise errors[0]
+    return service
+
+
+async def serve(host, port, **settings):
+    """Runs the service until cancelled."""
+    service = LLMService(**settings)
+    server = await service.start(host, port)
+    print(f'Ollama API service listening on {service.url} '
+          f'(backends: {", ".join(backend.name for backend in service.client.pool.backends)}, '
+          f'concurrency {service.concurrency})')
+    async with server:
+        await server.serve_forever()
+
+
+def main(argv=None):
+    """Command-line entry point."""
+    parser = argparse.ArgumentParser(description='Serve the Ollama query pipeline over HTTP.')
+    parser.add_argument('--host', default=DEFAULT_HOST)
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--ollama-host', default=None,
+                        help='Ollama server URL, or several separated by commas to balance requests over '
+                             '(default: OLLAMA_HOSTS, OLLAMA_HOST or the local server)')
+    parser.add_argument('--concurrency', type=int, default=BACKEND_CONCURRENCY,
+                        help='Requests sent to Ollama at once (default: OLLAMA_NUM_PARALLEL or 4)')
+    parser.add_argument('--max-pending', type=int, default=MAX_PENDING,
+                        help='Generations waiting for Ollama before requests are rejected with HTTP 503')
+    args = parser.parse_args(argv)
+
+    if args.ollama_host:
+        # The summarizer, response cache and model catalog use the shared clients, which read OLLAMA_HOSTS
+        os.environ['OLLAMA_HOSTS'] = args.ollama_host
+    try:
+        asyncio.run(serve(args.host, args.port, ollama_host=args.ollama_host, concurrency=args.concurrency,
+                          max_pending=args.max_pending))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,410 @@
+# Load balancing across several Ollama servers
+# Set OLLAMA_HOSTS to a comma-separated list of server URLs to spread the scripts' requests over them;
+# without it, OLLAMA_HOST (or the local server) is the only backend, as before.
+#
+# Each request goes to a healthy server, preferring one that already has the model in memory
+# (from its /api/ps, or because it just answered a request for it) and otherwise the one with the
+# fewest requests outstanding from this process. A server that cannot be reached, is busy (HTTP 503)
+# or does not have the model (HTTP 404) is skipped and the request is sent to the next one. Streams
+# only fail over before their first part, so no text is ever repeated. /api/ps on every server is
+# polled from a background thread, which also notices when a failed server comes back.
+
+# Import statements
+import os
+import threading
+import time
+import metrics
+
+# Constants
+HEALTH_INTERVAL = 15  # seconds between health checks of every server
+HEALTH_TIMEOUT = 2  # seconds before a health check counts as failed
+AFFINITY_SLACK = 2  # extra outstanding requests accepted on a server with the model loaded before loading it elsewhere
+FAILOVER_STATUS = (404, 503)  # model not on that server, or its request queue is full
+
+
+# Raised when no server could take a request
+class BackendUnavailable(ConnectionError):
+    """None of the Ollama servers could be reached; the message lists the error from each one"""
+
+
+class Backend:
+    """One Ollama server and what the pool knows about it."""
+
+    def __init__(self, url):
+        self.url = url  # None means OLLAMA_HOST or the local server
+        self.healthy = True  # Assumed until a health check or a request fails
+        self.loaded = set()  # Models in memory on the server
+        self.outstanding = 0  # Requests from this process that have not finished
+        self.requests = 0
+        self.failures = 0
+        self.last_error = None
+        self.checked_at = None
+
+    @property
+    def name(self):
+        return self.url or os.environ.get('OLLAMA_HOST') or 'default'
+
+    def status(self):
+        """Returns the backend's state as a dictionary, for diagnostics."""
+        return {'url': self.name, 'healthy': self.healthy, 'loaded': sorted(self.loaded),
+                'outstanding': self.outstanding, 'requests': self.requests, 'failures': self.failures,
+                'last_error': self.last_error}
+
+
+class BackendPool:
+    """
+    Routing state shared by every client of a set of Ollama servers: health, loaded models and
+    outstanding requests per server. The clients (PooledClient, AsyncPooledClient) send the requests.
+    """
+
+    def __init__(self, hosts=None, health_interval=HEALTH_INTERVAL):
+        self.backends = [Backend(host) for host in (hosts or [None])]
+        self.health_interval = health_interval
+        self._lock = threading.Lock()
+        self._health_clients = {}
+        self._health_thread = None
+        self._turn = 0  # Rotates the order of equally good servers
+
+    def choose(self, model_name, exclude=()):
+        """
+        Picks the server for the next request for model_name, skipping those in exclude, and counts the
+        request as outstanding on it. Returns None when every server has been excluded.
+        """
+        self.start_health_checks()
+        with self._lock:
+            candidates = [backend for backend in self.backends if backend not in exclude]
+            if not candidates:
+                return None
+            # If every server looks down, try them anyway: the health check may be out of date
+            candidates = [backend for backend in candidates if backend.healthy] or candidates
+            self._turn = (self._turn + 1) % len(candidates)
+            candidates = candidates[self._turn:] + candidates[:self._turn]
+
+            chosen = min(candidates, key=lambda backend: backend.outstanding)
+            warm = [backend for backend in candidates if model_name in backend.loaded]
+            if warm:
+                # Loading a model takes seconds, so a busier server that already has it usually wins
+                warmest = min(warm, key=lambda backend: backend.outstanding)
+                if warmest.outstanding <= chosen.outstanding + AFFINITY_SLACK:
+                    chosen = warmest
+            chosen.outstanding += 1
+            chosen.requests += 1
+            return chosen
+
+    def release(self, backend, model_name=None, error=None):
+        """Records the end of a request on a server, and what its outcome says about the server."""
+        with self._lock:
+            backend.outstanding -= 1
+            if error is None:
+                backend.healthy = True
+                if model_name:
+                    backend.loaded.add(model_name)
+                return
+            backend.failures += 1
+            backend.last_error = str(error) or type(error).__name__
+            if is_connection_error(error):
+                backend.healthy = False  # Skipped until a health check reaches it again
+            elif getattr(error, 'status_code', None) == 404:
+                backend.loaded.discard(model_name)
+
+    def check_health(self):
+        """Polls /api/ps on every server, updating its health and loaded models."""
+        for backend in self.backends:
+            try:
+                response = self._health_client(backend).ps()
+            except Exception as e:
+                with self._lock:
+                    backend.healthy = False
+                    backend.last_error = str(e) or type(e).__name__
+                    backend.checked_at = time.time()
+                continue
+            with self._lock:
+                backend.healthy = True
+                backend.loaded = {model.model for model in response.models}
+                backend.checked_at = time.time()
+
+    def start_health_checks(self):
+        """Starts the background health checks, if there is more than one server to choose from."""
+        if len(self.backends) < 2 or (self._health_thread is not None and self._health_thread.is_alive()):
+            return
+        with self._lock:
+            if self._health_thread is None or not self._health_thread.is_alive():
+                self._health_thread = threading.Thread(target=self._health_loop, daemon=True)
+                self._health_thread.start()
+
+    def status(self):
+        """Returns the state of every server."""
+        with self._lock:
+            return [backend.status() for backend in self.backends]
+
+    def _health_loop(self):
+        while True:
+            self.check_health()
+            time.sleep(self.health_interval)
+
+    def _health_client(self, backend):
+        if backend not in self._health_clients:
+            import ollama  # Deferred: importing ollama is slow and only needed once a request is made
+            self._health_clients[backend] = ollama.Client(host=backend.url, timeout=HEALTH_TIMEOUT)
+        return self._health_clients[backend]
+
+
+class PooledClient:
+    """
+    Stands in for ollama.Client, sending each request to a server chosen by the pool and failing over
+    to the others. Extra keyword arguments are passed to the ollama.Client of every server.
+    If cancelled is given, errors raised once it returns True are the caller's own doing (e.g. it closed
+    the connection to abort a request): they are raised as they are, without failing over or marking the server down.
+    """
+
+    def __init__(self, pool, cancelled=None, **client_args):
+        self.pool = pool
+        self.cancelled = cancelled  # Returns True once the caller aborted its requests on purpose
+        self.client_args = client_args
+        self._clients = {}
+        self._lock = threading.Lock()
+
+    def generate(self, model='', **kwargs):
+        return self._request('generate', model, kwargs)
+
+    def chat(self, model='', **kwargs):
+        return self._request('chat', model, kwargs)
+
+    def embed(self, model='', **kwargs):
+        return self._request('embed', model, kwargs)
+
+    def list(self):
+        """Returns the models of every reachable server (by name, first server first)."""
+        from ollama import ListResponse
+        return ListResponse(models=_merge(self._each('list')))
+
+    def ps(self):
+        """Returns the running models of every reachable server."""
+        from ollama import ProcessResponse
+        return ProcessResponse(models=_merge(self._each('ps')))
+
+    def close(self):
+        """Closes the connection pools of all servers."""
+        with self._lock:
+            for client in self._clients.values():
+                client._client.close()
+            self._clients.clear()
+
+    def _client(self, backend):
+        with self._lock:
+            if backend not in self._clients:
+                import ollama  # Deferred: importing ollama is slow and only needed once a request is made
+                self._clients[backend] = ollama.Client(host=backend.url, **self.client_args)
+            return self._clients[backend]
+
+    def _request(self, method, model_name, kwargs):
+        if kwargs.get('stream'):
+            return self._stream(method, model_name, kwargs)
+        errors = []
+        while True:
+            backend = _next_backend(self.pool, model_name, errors)
+            try:
+                result = getattr(self._client(backend), method)(model=model_name, **kwargs)
+            except Exception as e:
+                self._failed(backend, model_name, e, errors)
+                continue
+            self.pool.release(backend, model_name)
+            return result
+
+    def _stream(self, method, model_name, kwargs):
+        errors = []
+        while True:
+            backend = _next_backend(self.pool, model_name, errors)
+            started = False
+            try:
+                for part in getattr(self._client(backend), method)(model=model_name, **kwargs):
+                    started = True
+                    yield part
+            except Exception as e:
+                if started:
+                    self.pool.release(backend, model_name, e)
+                    raise  # Part of the response was already delivered
+                self._failed(backend, model_name, e, errors)
+                continue
+            except BaseException:
+                self.pool.release(backend, model_name)  # The caller stopped reading
+                raise
+            self.pool.release(backend, model_name)
+            return
+
+    def _failed(self, backend, model_name, error, errors):
+        """Records a failed attempt and re-raises the error unless another server should be tried."""
+        if self.cancelled is not None and self.cancelled():
+            self.pool.release(backend, model_name)
+            raise error
+        self.pool.release(backend, model_name, error)
+        _fail_over_or_raise(error, backend, errors)
+
+    def _each(self, method):
+        results = []
+        errors = []
+        for backend in self.pool.backends:
+            try:
+                results.append(getattr(self._client(backend), method)())
+            except Exception as e:
+                errors.append((backend, e))
+        if not results:
+            raise _unavailable(errors)
+        return results
+
+
+class AsyncPooledClient:
+    """The asyncio counterpart of PooledClient, standing in for ollama.AsyncClient."""
+
+    def __init__(self, pool, **client_args):
+        self.pool = pool
+        self.client_args = client_args
+        self._clients = {}
+
+    async def generate(self, model='', **kwargs):
+        return await self._request('generate', model, kwargs)
+
+    async def chat(self, model='', **kwargs):
+        return await self._request('chat', model, kwargs)
+
+    async def embed(self, model='', **kwargs):
+        return await self._request('embed', model, kwargs)
+
+    async def list(self):
+        """Returns the models of every reachable server (by name, first server first)."""
+        from ollama import ListResponse
+        return ListResponse(models=_merge(await self._each('list')))
+
+    async def ps(self):
+        """Returns the running models of every reachable server."""
+        from ollama import ProcessResponse
+        return ProcessResponse(models=_merge(await self._each('ps')))
+
+    async def aclose(self):
+        """Closes the connection pools of all servers."""
+        for client in self._clients.values():
+            await client._client.aclose()
+        self._clients.clear()
+
+    def _client(self, backend):
+        if backend not in self._clients:
+            import ollama  # Deferred: importing ollama is slow and only needed once a request is made
+            self._clients[backend] = ollama.AsyncClient(host=backend.url, **self.client_args)
+        return self._clients[backend]
+
+    async def _request(self, method, model_name, kwargs):
+        if kwargs.get('stream'):
+            return self._stream(method, model_name, kwargs)
+        errors = []
+        while True:
+            backend = _next_backend(self.pool, model_name, errors)
+            try:
+                result = await getattr(self._client(backend), method)(model=model_name, **kwargs)
+            except Exception as e:
+                self.pool.release(backend, model_name, e)
+                _fail_over_or_raise(e, backend, errors)
+                continue
+            self.pool.release(backend, model_name)
+            return result
+
+    async def _stream(self, method, model_name, kwargs):
+        errors = []
+        while True:
+            backend = _next_backend(self.pool, model_name, errors)
+            started = False
+            try:
+                async for part in await getattr(self._client(backend), method)(model=model_name, **kwargs):
+                    started = True
+                    yield part
+            except Exception as e:
+                self.pool.release(backend, model_name, e)
+                if started:
+                    raise  # Part of the response was already delivered
+                _fail_over_or_raise(e, backend, errors)
+                continue
+            except BaseException:
+                self.pool.release(backend, model_name)  # Cancelled, or the caller stopped reading
+                raise
+            self.pool.release(backend, model_name)
+            return
+
+    async def _each(self, method):
+        results = []
+        errors = []
+        for backend in self.pool.backends:
+            try:
+                results.append(await getattr(self._client(backend), method)())
+            except Exception as e:
+                errors.append((backend, e))
+        if not results:
+            raise _unavailable(errors)
+        return results
+
+
+# Function to tell whether an error means the server could not be reached
+def is_connection_error(error):
+    """True for errors raised before the server answered: refused or dropped connections and timeouts."""
+    if isinstance(error, ConnectionError):
+        return True
+    import httpx  # Installed with ollama; already imported once a request has been made
+    return isinstance(error, httpx.TransportError)
+
+
+def _next_backend(pool, model_name, errors):
+    """Chooses the next server to try, or raises once every server has failed."""
+    backend = pool.choose(model_name, exclude=[backend for backend, _ in errors])
+    if backend is None:
+        # A server that answered (e.g. model not found, or busy) says more than one that is down: report it as is
+        answers = [error for _, error in errors if not is_connection_error(error)]
+        if answers:
+            raise answers[-1]
+        raise _unavailable(errors)
+    call = metrics.current_call()
+    if call is not None:
+        call.labels['backend'] = backend.name  # Logged with the call, so slow servers can be spotted
+    return backend
+
+
+def _fail_over_or_raise(error, backend, errors):
+    """Remembers a failed attempt if another server may succeed; otherwise re-raises the error."""
+    if not is_connection_error(error) and getattr(error, 'status_code', None) not in FAILOVER_STATUS:
+        raise error
+    errors.append((backend, error))
+
+
+def _unavailable(errors):
+    details = '; '.join(f'{backend.name}: {str(error) or type(error).__name__}' for backend, error in errors)
+    return BackendUnavailable(f'Could not connect to any Ollama server ({details})')
+
+
+def _merge(responses):
+    """Combines the model lists of several servers, keeping the first entry for each model name."""
+    models = {}
+    for response in responses:
+        for model in response.models:
+            models.setdefault(model.model, model)
+    return list(models.values())
+
+
+# Shared pools, one per list of servers, so every client in the process sees the same load
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(hosts=None):
+    """
+    Returns the process-wide BackendPool for hosts, a list of server URLs. The default is the servers
+    in OLLAMA_HOSTS, read when called so that scripts can set it, or else OLLAMA_HOST or the local server.
+    """
+    hosts = tuple(hosts or parse_hosts(os.environ.get('OLLAMA_HOSTS')) or ())
+    with _pools_lock:
+        if hosts not in _pools:
+            _pools[hosts] = BackendPool(list(hosts))
+        return _pools[hosts]
+
+
+# Function to split a host setting into a list of servers
+def parse_hosts(value):
+    """Returns the URLs in a comma-separated host setting, or None if it is empty."""
+    hosts = [host.strip() for host in (value or '').split(',') if host.strip()]
+    return hosts or None
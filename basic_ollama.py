@@ -1,17 +1,15 @@
 # Basic Ollama implementation
 
 # Import statements
-import ollama
-from langchain_community.llms import Ollama
-from langchain.chains import LLMChain
-from langchain.prompts import PromptTemplate
+import llm_pool
+import metrics
 
 # Function to select a local LLM
 def select_llm():
     """This function helps the user to select a local LLM available in Ollama."""
     try:
-        # Fetch available models in Ollama
-        response = ollama.list()
+        # Fetch available models in Ollama (the shared client imports ollama on first use, so the welcome message appears immediately)
+        response = llm_pool.get_client().list()
         
         # Extract model names from the ListResponse object
         # In the new API, models is an attribute and each model's name is in the 'model' attribute of each Model object
@@ -131,45 +129,19 @@ def send_query(model_name, role, style, prompt_text):
     This function sends the query to the LLM and retrieves the response.
     It uses the updated langchain library syntax.
     """
-    try:
-        # Import the correct class
-        from langchain_ollama import OllamaLLM
-        from langchain.prompts import PromptTemplate
-        
-        # Initialize the Ollama model with the updated class
-        llm = OllamaLLM(model=model_name)
-        
-        # Handle "Normal" style by making it empty
-        style_instruction = f"Please provide a {style} answer." if style.lower() != "normal" else ""
-        
-        # Build template based on whether role is provided
-        if role:
-            template = f"""You are a {role}.
-
-                        Question: {{question}}
-
-                        {style_instruction}"""
-        else:
-            template = f"""Question: {{question}}
-
-                        {style_instruction}"""
-        
-        # Create the prompt template
-        prompt_template = PromptTemplate(
-            template=template,
-            input_variables=["question"]
-        )
-        
-        # Use pipe syntax instead of LLMChain
-        chain = prompt_template | llm
-        
-        # Use invoke instead of run
-        response = chain.invoke({"question": prompt_text})
+    with metrics.track('basic_ollama', model_name) as call:
+        try:
+            # Fetch a ready-to-run chain from the shared pool instead of rebuilding it
+            chain = llm_pool.get_chain(model_name, role, style)
+            
+            # Use invoke instead of run
+            response = chain.invoke({"question": prompt_text})
+            
+            return response
         
-        return response
-    
-    except Exception as e:
-        return f'Error getting response: {str(e)}'
+        except Exception as e:
+            call.fail(e)
+            return f'Error getting response: {str(e)}'
 
 
 def main():
@@ -0,0 +1,134 @@
+# Non-interactive batch mode for the Ollama query pipeline
+# Reads JSONL records of {model, role, style, prompt}, runs each one through the same
+# role/style template logic as advanced_ollama.send_query, and writes JSONL results.
+# Both files are processed one line at a time, so input size is not limited by memory.
+
+# Import statements
+import argparse
+import asyncio
+import json
+import sys
+import time
+
+# Constants
+TEXT_FIELDS = ('model', 'role', 'style')  # Optional record fields besides "prompt"; they must be strings if set
+
+
+# Function to read request records from a JSONL file one line at a time
+def iter_records(input_file):
+    """
+    Yields (line_number, record, error) for every non-blank line of a JSONL file object.
+    Lines that are not valid JSON objects, or whose fields are not text, are yielded with record=None
+    and an error message.
+    """
+    for line_number, line in enumerate(input_file, 1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError as e:
+            yield line_number, None, f'Invalid JSON: {e}'
+            continue
+        if not isinstance(record, dict):
+            yield line_number, None, 'Each line must be a JSON object'
+        elif record.get('prompt') is not None and not isinstance(record['prompt'], str):
+            yield line_number, None, '"prompt" must be a string'
+        elif not (record.get('prompt') or '').strip():
+            yield line_number, None, 'Missing "prompt" field'
+        else:
+            # The template logic only handles text: a number or list would fail the request later
+            invalid = [field for field in TEXT_FIELDS if record.get(field) is not None
+                       and not isinstance(record[field], str)]
+            if invalid:
+                yield line_number, None, f'"{invalid[0]}" must be a string'
+            else:
+                yield line_number, record, None
+
+
+# Function to run a whole JSONL batch
+def run_batch(input_file, output_file, concurrency=1):
+    """
+    Runs every record of input_file and writes one JSON result per line to output_file.
+    Each result is flushed as soon as it is written, so a partial run still leaves usable output.
+    Every request goes through a RequestScheduler, so results have the same fields and failed requests
+    the same retries whatever the concurrency. With concurrency > 1 the requests are sent in parallel;
+    results are still written in input order, and repeated prompts that are in flight at the same time
+    are generated only once.
+    Returns a dictionary of summary counts.
+    """
+    counts = {'total': 0, 'succeeded': 0, 'failed': 0, 'coalesced': 0}
+
+    def write_result(line_number, result):
+        result['line'] = line_number
+        counts['total'] += 1
+        counts['failed' if result['error'] else 'succeeded'] += 1
+        if result.get('coalesced'):
+            counts['coalesced'] += 1  # Repeated prompt answered by an identical request in flight
+        output_file.write(json.dumps(result, ensure_ascii=False) + '\n')
+        output_file.flush()
+
+    asyncio.run(_run_scheduled(input_file, write_result, concurrency))
+    return counts
+
+
+# Function to run the batch through the request scheduler
+async def _run_scheduled(input_file, write_result, concurrency):
+    """Feeds the input lines through a RequestScheduler and writes the results in input order."""
+    from scheduler import RequestScheduler
+    scheduler = RequestScheduler(concurrency=concurrency)
+
+    async def handle(item):
+        line_number, record, error = item
+        if error:
+            return line_number, {'error': error}
+        try:
+            return line_number, await scheduler.execute(record)
+        except Exception as e:
+            # execute() reports request failures in its result; anything else must not stop the batch
+            return line_number, {'error': f'{type(e).__name__}: {e}'}
+
+    async for line_number, result in scheduler.run(iter_records(input_file), handler=handle):
+        write_result(line_number, result)
+
+
+# Function to open a path for batch I/O, treating "-" as stdin/stdout
+def _open_stream(path, mode):
+    if path == '-':
+        return sys.stdin if 'r' in mode else sys.stdout
+    return open(path, mode, encoding='utf-8')
+
+
+def main(argv=None):
+    """Command-line entry point for batch mode."""
+    parser = argparse.ArgumentParser(description='Run a JSONL file of prompts through a local Ollama LLM.')
+    parser.add_argument('input', help='JSONL file of {model, role, style, prompt} records ("-" for stdin)')
+    parser.add_argument('-o', '--output', default='-', help='JSONL file to write results to ("-" for stdout, the default)')
+    parser.add_argument('-c', '--concurrency', type=int, default=1,
+                        help='Number of requests to send to the Ollama server in parallel (default: 1)')
+    args = parser.parse_args(argv)
+    if args.concurrency < 1:
+        parser.error('--concurrency must be at least 1')
+
+    try:
+        input_file = _open_stream(args.input, 'r')
+        output_file = _open_stream(args.output, 'w')
+    except OSError as e:
+        print(f'Error opening batch files: {e}', file=sys.stderr)
+        return 1
+
+    start_time = time.time()
+    try:
+        counts = run_batch(input_file, output_file, concurrency=args.concurrency)
+    finally:
+        for stream in (input_file, output_file):
+            if stream not in (sys.stdin, sys.stdout):
+                stream.close()
+
+    elapsed_time = time.time() - start_time
+    print(f"Processed {counts['total']} requests ({counts['succeeded']} succeeded, {counts['failed']} failed, "
+          f"{counts['coalesced']} coalesced) in {elapsed_time:.2f} seconds.", file=sys.stderr)
+    return 0 if counts['failed'] == 0 else 2
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,285 @@
+# Latency and throughput benchmark for the Ollama query pipeline
+# Runs a fixed prompt corpus against each model at several concurrency levels through the same
+# scheduler the batch mode uses, and reports time-to-first-token, tokens/sec, p50/p95/p99 latency
+# and the memory the Ollama server holds for the model (size and VRAM part, from /api/ps) during each
+# scenario, plus the benchmark client's own peak RSS. Results can be written as JSON/CSV and compared
+# against a previous run.
+# With --stub the benchmark runs against the local fake server, so CI can catch client-side
+# overhead regressions without a GPU.
+
+# Import statements
+import argparse
+import asyncio
+import csv
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+from backend_pool import AsyncPooledClient, get_pool, parse_hosts
+from llm_pool import MAX_PROMPT_LENGTH
+from metrics import percentile
+from scheduler import RequestScheduler
+
+# Constants
+DEFAULT_MODELS = ['gemma3:12b']
+DEFAULT_CONCURRENCY = [1, 4]
+DEFAULT_REQUESTS = 8  # requests per (model, prompt size, concurrency) scenario
+RSS_SAMPLE_INTERVAL = 0.01  # seconds between samples of the client's memory while a scenario runs
+MODEL_SAMPLE_INTERVAL = 0.25  # seconds between /api/ps samples of the model's memory while a scenario runs
+REGRESSION_THRESHOLD = 0.10  # relative slowdown of p50 latency that --compare reports as a regression
+CSV_FIELDS = ['model', 'prompt_size', 'prompt_chars', 'concurrency', 'requests', 'errors',
+              'ttft_p50_s', 'latency_p50_s', 'latency_p95_s', 'latency_p99_s',
+              'tokens_per_sec_mean', 'throughput_tokens_per_sec', 'requests_per_sec', 'model_size_mb', 'model_vram_mb',
+              'client_peak_rss_mb']
+
+# Fixed prompt corpus: the same text every run, at sizes around the MAX_PROMPT_LENGTH warning
+_PARAGRAPH = (
+    "Local language models trade some quality for privacy and predictable cost. "
+    "Explain the main factors that decide how fast a model answers on a desktop computer, "
+    "including model size, quantization, context length and available memory. "
+)
+PROMPT_CORPUS = {
+    'short': 'In one sentence, what is a large language model?',
+    'medium': (_PARAGRAPH * 4)[:MAX_PROMPT_LENGTH // 8],
+    'long': (_PARAGRAPH * 20)[:MAX_PROMPT_LENGTH - 100],  # just under the warning threshold
+    'over_limit': (_PARAGRAPH * 40)[:MAX_PROMPT_LENGTH * 2],  # would trigger the warning in build_prompt
+}
+
+
+# Function to read the current resident set size of this (client) process
+def current_rss_mb():
+    """Returns the current RSS of the benchmark client process in MB, or None where it cannot be read."""
+    try:
+        with open('/proc/self/statm') as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+    except (OSError, ValueError, IndexError, AttributeError):
+        pass  # Not Linux
+    try:
+        import psutil
+    except ImportError:
+        return None
+    return psutil.Process().memory_info().rss / (1024 * 1024)
+
+
+# Function to track the client's peak resident set size while a scenario runs
+async def sample_peak_rss(peak):
+    """Samples the client's RSS until cancelled, keeping the highest value in peak['mb'].
+    Unlike ru_maxrss, which is the peak over the whole process lifetime, this is the peak of one scenario.
+    """
+    while True:
+        rss = current_rss_mb()
+        if rss is None:
+            return
+        peak['mb'] = max(peak.get('mb') or 0.0, rss)
+        await asyncio.sleep(RSS_SAMPLE_INTERVAL)
+
+
+# Function to read how much memory the Ollama server holds for a model
+async def model_memory_mb(client, model_name):
+    """Returns (size, VRAM part) in MB of the loaded model as reported by /api/ps, or (None, None) if it is not loaded.
+    With several servers, the figures are those of the first server that has the model loaded.
+    """
+    names = {model_name, model_name if ':' in model_name else f'{model_name}:latest'}
+    try:
+        response = await client.ps()
+    except Exception:
+        return None, None
+    for model in response.models:
+        if model.model in names or model.name in names:
+            return (model.size or 0) / (1024 * 1024), (model.size_vram or 0) / (1024 * 1024)
+    return None, None
+
+
+# Function to track the model's peak memory on the server while a scenario runs
+async def sample_model_memory(client, model_name, peak):
+    """Polls /api/ps until cancelled, keeping the highest size and VRAM part of the model in peak."""
+    while True:
+        size, vram = await model_memory_mb(client, model_name)
+        if size is not None:
+            peak['size'] = max(peak.get('size') or 0.0, size)
+            peak['vram'] = max(peak.get('vram') or 0.0, vram)
+        await asyncio.sleep(MODEL_SAMPLE_INTERVAL)
+
+
+# Function to run one benchmark scenario
+async def run_scenario(model_name, prompt_size, concurrency, requests, host=None):
+    """Sends `requests` copies of one corpus prompt at the given concurrency and summarizes the results."""
+    prompt = PROMPT_CORPUS[prompt_size]
+    records = [{'model': model_name, 'prompt': prompt} for _ in range(requests)]
+    # No retries, so failures show up as errors instead of inflated latency, and no coalescing of the
+    # identical copies, so every request is really generated
+    scheduler = RequestScheduler(concurrency=concurrency, host=host, max_retries=1, coalesce=False)
+
+    peak = {}
+    model_peak = {}
+    ps_client = AsyncPooledClient(get_pool(parse_hosts(host)))
+    samplers = [asyncio.create_task(sample_peak_rss(peak)),
+                asyncio.create_task(sample_model_memory(ps_client, model_name, model_peak))]
+    start_time = time.time()
+    try:
+        results = [result async for result in scheduler.run(records)]
+    finally:
+        wall_time = time.time() - start_time
+        for sampler in samplers:
+            sampler.cancel()
+        await asyncio.gather(*samplers, return_exceptions=True)
+    rss = current_rss_mb()  # The last sample may predate the end of the run
+    if rss is not None:
+        peak['mb'] = max(peak.get('mb') or 0.0, rss)
+    size, vram = await model_memory_mb(ps_client, model_name)
+    if size is not None:
+        model_peak['size'] = max(model_peak.get('size') or 0.0, size)
+        model_peak['vram'] = max(model_peak.get('vram') or 0.0, vram)
+    await ps_client.aclose()
+
+    succeeded = [result for result in results if not result['error']]
+    latencies = [result['latency_s'] for result in succeeded]
+    ttfts = [result['ttft_s'] for result in succeeded if result['ttft_s'] is not None]
+    rates = [result['tokens_per_sec'] for result in succeeded if result['tokens_per_sec']]
+    total_tokens = sum(result['tokens'] for result in succeeded)
+
+    def rounded(value):
+        return round(value, 4) if value is not None else None
+
+    return {
+        'model': model_name,
+        'prompt_size': prompt_size,
+        'prompt_chars': len(prompt),
+        'concurrency': concurrency,
+        'requests': requests,
+        'errors': len(results) - len(succeeded),
+        'ttft_p50_s': rounded(percentile(ttfts, 50)),
+        'latency_p50_s': rounded(percentile(latencies, 50)),
+        'latency_p95_s': rounded(percentile(latencies, 95)),
+        'latency_p99_s': rounded(percentile(latencies, 99)),
+        'tokens_per_sec_mean': rounded(statistics.mean(rates)) if rates else None,
+        'throughput_tokens_per_sec': rounded(total_tokens / wall_time) if wall_time > 0 else None,
+        'requests_per_sec': rounded(len(succeeded) / wall_time) if wall_time > 0 else None,
+        'model_size_mb': round(model_peak['size'], 1) if model_peak.get('size') is not None else None,
+        'model_vram_mb': round(model_peak['vram'], 1) if model_peak.get('vram') is not None else None,
+        'client_peak_rss_mb': round(peak['mb'], 1) if peak.get('mb') is not None else None,
+    }
+
+
+# Function to run the whole benchmark matrix
+async def run_benchmark(models, concurrency_levels, prompt_sizes, requests, host=None, warmup=True):
+    """Runs every (model, prompt size, concurrency) scenario and returns the list of results."""
+    results = []
+    for model_name in models:
+        if warmup:
+            # One untimed request so model load time does not skew the first scenario
+            scheduler = RequestScheduler(concurrency=1, host=host, max_retries=1)
+            async for _ in scheduler.run([{'model': model_name, 'prompt': PROMPT_CORPUS['short']}]):
+                pass
+        for prompt_size in prompt_sizes:
+            for concurrency in concurrency_levels:
+                result = await run_scenario(model_name, prompt_size, concurrency, requests, host)
+                results.append(result)
+                print(f"{model_name:<24} {prompt_size:<10} c={concurrency:<3} "
+                      f"p50 {_fmt(result['latency_p50_s'])}s  p95 {_fmt(result['latency_p95_s'])}s  "
+                      f"p99 {_fmt(result['latency_p99_s'])}s  TTFT {_fmt(result['ttft_p50_s'])}s  "
+                      f"{_fmt(result['tokens_per_sec_mean'], 1)} tok/s  model {_fmt(result['model_size_mb'], 0)} MB  "
+                      f"errors {result['errors']}",
+                      file=sys.stderr)
+    return results
+
+
+def _fmt(value, digits=3):
+    return f'{value:.{digits}f}' if value is not None else 'n/a'
+
+
+# Function to compare results against a previous run
+def compare_results(results, baseline, threshold=REGRESSION_THRESHOLD):
+    """
+    Matches scenarios by (model, prompt size, concurrency) and returns a list of
+    (scenario name, baseline p50, current p50, relative change) for scenarios slower than threshold.
+    """
+    previous = {(r['model'], r['prompt_size'], r['concurrency']): r for r in baseline}
+    regressions = []
+    for result in results:
+        key = (result['model'], result['prompt_size'], result['concurrency'])
+        old = previous.get(key)
+        if not old or not old.get('latency_p50_s') or result['latency_p50_s'] is None:
+            continue
+        change = result['latency_p50_s'] / old['latency_p50_s'] - 1
+        if change > threshold:
+            regressions.append((f'{key[0]}/{key[1]}/c={key[2]}', old['latency_p50_s'], result['latency_p50_s'], change))
+    return regressions
+
+
+# Function to write results as CSV
+def write_csv(results, path):
+    """Writes one CSV row per scenario."""
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=CSV_FIELDS)
+        writer.writeheader()
+        writer.writerows(results)
+
+
+def main(argv=None):
+    """Command-line entry point."""
+    parser = argparse.ArgumentParser(description='Benchmark latency and throughput of local Ollama models.')
+    parser.add_argument('-m', '--models', nargs='+', help=f'Models to benchmark (default: {DEFAULT_MODELS[0]}, or the stub model)')
+    parser.add_argument('-c', '--concurrency', nargs='+', type=int, default=DEFAULT_CONCURRENCY, help='Concurrency levels')
+    parser.add_argument('-p', '--prompt-sizes', nargs='+', choices=list(PROMPT_CORPUS), default=list(PROMPT_CORPUS),
+                        help='Prompt sizes from the fixed corpus')
+    parser.add_argument('-n', '--requests', type=int, default=DEFAULT_REQUESTS, help='Requests per scenario')
+    parser.add_argument('--host', default=None, help='Ollama server URL (default: OLLAMA_HOST or the local server)')
+    parser.add_argument('--stub', action='store_true', help='Run against an in-process fake Ollama server')
+    parser.add_argument('--no-warmup', action='store_true', help='Skip the untimed warm-up request per model')
+    parser.add_argument('--json', dest='json_path', help='Write results to this JSON file')
+    parser.add_argument('--csv', dest='csv_path', help='Write results to this CSV file')
+    parser.add_argument('--compare', help='Previous JSON results; exit with status 1 if p50 latency regressed')
+    parser.add_argument('--threshold', type=float, default=REGRESSION_THRESHOLD,
+                        help='Relative p50 slowdown counted as a regression (default: 0.10)')
+    args = parser.parse_args(argv)
+
+    host = args.host
+    models = args.models
+    stub = None
+    if args.stub:
+        from fake_ollama_server import start_server, DEFAULT_MODELS as STUB_MODELS
+        stub = start_server()
+        host = stub.url
+        models = models or STUB_MODELS
+    models = models or DEFAULT_MODELS
+
+    try:
+        results = asyncio.run(run_benchmark(models, args.concurrency, args.prompt_sizes, args.requests,
+                                            host=host, warmup=not args.no_warmup))
+    finally:
+        if stub is not None:
+            stub.shutdown()
+
+    report = {
+        'created': time.strftime('%Y-%m-%d %H:%M:%S'),
+        'host': host or os.environ.get('OLLAMA_HOST', 'default'),
+        'stub': args.stub,
+        'python': platform.python_version(),
+        'results': results,
+    }
+    if args.json_path:
+        with open(args.json_path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+    if args.csv_path:
+        write_csv(results, args.csv_path)
+    if not args.json_path and not args.csv_path:
+        print(json.dumps(report, indent=2))
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare_results(results, baseline.get('results', []), args.threshold)
+        for name, old, new, change in regressions:
+            print(f'Regression: {name} p50 {old:.3f}s -> {new:.3f}s ({change:+.0%})', file=sys.stderr)
+        if regressions:
+            return 1
+
+    return 0 if all(result['errors'] == 0 for result in results) else 2
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,210 @@
+# Single-flight coalescing of identical LLM requests
+# When the same request (same model and rendered prompt) is made while an identical one is still
+# being generated, the later request attaches to the generation in progress instead of starting
+# its own: it receives the same tokens, from the first one, and the same result or error.
+# SingleFlight is for threaded callers such as send_query; AsyncSingleFlight is for asyncio code
+# such as the batch scheduler and the HTTP service. asyncio is imported by the async classes
+# only, so the interactive scripts do not pay for importing it.
+
+# Import statements
+import threading
+import time
+
+
+# Raised to requests following a generation that was abandoned before it finished
+class FlightAbandoned(Exception):
+    """The request being followed was cancelled before it finished"""
+
+
+class Flight:
+    """
+    One generation in progress, shared by every thread that asked for it.
+    Tokens are kept as they arrive so that requests joining late still receive the whole response.
+    """
+
+    def __init__(self):
+        self.created = time.time()
+        self.tokens = []
+        self.result = None  # Full response text (or the producer's return value) once done
+        self.error = None
+        self.done = False
+        self._condition = threading.Condition()
+
+    def push(self, token):
+        with self._condition:
+            self.tokens.append(token)
+            self._condition.notify_all()
+
+    def finish(self, result=None, error=None):
+        with self._condition:
+            self.result = ''.join(self.tokens) if result is None else result
+            self.error = error
+            self.done = True
+            self._condition.notify_all()
+
+    def follow(self):
+        """Yields every token of the generation, from the first one, raising its error if it fails."""
+        position = 0
+        while True:
+            with self._condition:
+                while position >= len(self.tokens) and not self.done:
+                    self._condition.wait()
+                new_tokens = self.tokens[position:]
+                position += len(new_tokens)
+                done = self.done
+            yield from new_tokens
+            if done:
+                if self.error is not None:
+                    raise self.error
+                return
+
+
+class SingleFlight:
+    """Coalesces identical token streams requested from several threads at once."""
+
+    def __init__(self):
+        self._flights = {}  # key -> Flight being generated
+        self._lock = threading.Lock()
+
+    def stream(self, key, produce):
+        """
+        Returns (tokens, coalesced). If a stream for key is in progress, tokens follows it and coalesced
+        is True; otherwise tokens is produce() (an iterator of tokens), shared with identical requests
+        made until it is exhausted.
+        The new stream is registered when its tokens are first read, so a leader that is never read
+        cannot leave followers waiting. If an identical stream was registered in between, tokens
+        follows that one instead (still reported as not coalesced).
+        """
+        with self._lock:
+            flight = self._flights.get(key)
+        if flight is not None:
+            return flight.follow(), True
+        return self._lead(key, produce), False
+
+    def _lead(self, key, produce):
+        with self._lock:
+            flight = self._flights.get(key)
+            leading = flight is None
+            if leading:
+                flight = self._flights[key] = Flight()
+        if not leading:
+            yield from flight.follow()
+            return
+
+        try:
+            for token in produce():
+                flight.push(token)
+                yield token
+        except Exception as e:
+            flight.finish(error=e)
+            raise
+        except BaseException:
+            # The caller stopped reading (or was interrupted) before the response was complete
+            flight.finish(error=FlightAbandoned('the request being followed was cancelled'))
+            raise
+        else:
+            flight.finish()
+        finally:
+            with self._lock:
+                if self._flights.get(key) is flight:
+                    del self._flights[key]
+
+
+class AsyncFlight:
+    """The asyncio counterpart of Flight, also tracking the requests following it."""
+
+    def __init__(self):
+        self.created = time.time()
+        self.tokens = []
+        self.result = None
+        self.error = None
+        self.done = False
+        self.final = None  # Ollama's final response part, if the producer keeps it
+        self.subscribers = 0
+        self.task = None
+        self._changed = _asyncio().Event()
+
+    def push(self, token):
+        self.tokens.append(token)
+        self._notify()
+
+    def finish(self, result=None, error=None):
+        self.result = ''.join(self.tokens) if result is None else result
+        self.error = error
+        self.done = True
+        self._notify()
+
+    async def follow(self):
+        """Yields every token of the generation, from the first one, raising its error if it fails."""
+        position = 0
+        while True:
+            while position < len(self.tokens):
+                yield self.tokens[position]
+                position += 1
+            if self.done:
+                if self.error is not None:
+                    raise self.error
+                return
+            await self._changed.wait()
+
+    async def wait(self):
+        """Waits for the generation to finish and returns its result."""
+        async for _ in self.follow():
+            pass
+        return self.result
+
+    def _notify(self):
+        # Wake everyone waiting on the current event and start a new one for the next change
+        self._changed.set()
+        self._changed = _asyncio().Event()
+
+
+class AsyncSingleFlight:
+    """Coalesces identical requests made by asyncio tasks on one event loop."""
+
+    def __init__(self):
+        self._flights = {}  # key -> AsyncFlight being generated
+
+    def __len__(self):
+        return len(self._flights)
+
+    def get(self, key):
+        """Returns the flight in progress for key, or None."""
+        return self._flights.get(key)
+
+    def join(self, key, produce):
+        """
+        Returns (flight, coalesced): the flight in progress for key, or a new one running
+        produce(flight) in its own task. The flight's result is produce's return value, or
+        the text of the tokens it pushed if that is None.
+        """
+        flight = self._flights.get(key)
+        if flight is not None:
+            return flight, True
+        flight = self._flights[key] = AsyncFlight()
+        flight.task = _asyncio().create_task(self._run(key, flight, produce))
+        return flight, False
+
+    def abandon(self, flight):
+        """Cancels a flight nobody is waiting for any more; later identical requests start a new one."""
+        for key, other in list(self._flights.items()):
+            if other is flight:
+                del self._flights[key]
+        if flight.task is not None:
+            flight.task.cancel()
+
+    async def _run(self, key, flight, produce):
+        try:
+            flight.finish(await produce(flight))
+        except _asyncio().CancelledError:
+            flight.finish(error=FlightAbandoned('the request being followed was cancelled'))
+        except Exception as e:
+            flight.finish(error=e)
+        finally:
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+
+
+def _asyncio():
+    import asyncio
+    return asyncio
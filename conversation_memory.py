@@ -0,0 +1,180 @@
+# Multi-turn conversation memory for the Ollama query scripts
+# Follow-up questions are sent with the `context` token array Ollama returned for the previous
+# turn, so the server continues from its cached state instead of re-reading the whole history.
+# When the conversation outgrows its token budget, older turns are summarized (or dropped) and
+# the context is rebuilt from that summary plus the most recent turns.
+
+# Import statements
+import llm_pool
+import metrics
+
+# Constants
+DEFAULT_TOKEN_BUDGET = 3000  # tokens of history kept, below Ollama's default context window
+CHARS_PER_TOKEN = 4  # Rough average for English text, used when Ollama reports no counts
+RECENT_SHARE = 0.5  # Share of the budget kept as verbatim recent turns after compaction
+SUMMARY_PROMPT = (
+    "Summarize the following conversation in a few sentences. "
+    "Keep the facts, names and decisions needed to answer follow-up questions.\n\n"
+    "{transcript}\n\n"
+    "Summary:"
+)
+
+
+class ConversationMemory:
+    """
+    Conversation history for one (model, role, style) session.
+
+    Each turn is sent with the Ollama context from the previous turn. Once the context (or, when
+    there is none, the text history) grows past token_budget, the memory is compacted: the oldest turns are condensed into a summary
+    (when summarize=True) or dropped, and the next request starts a fresh context from a
+    text preamble holding that summary and the most recent turns.
+    """
+
+    def __init__(self, model_name, role, style, token_budget=DEFAULT_TOKEN_BUDGET, summarize=True):
+        self.model_name = model_name
+        self.role = role
+        self.style = style
+        self.token_budget = token_budget
+        self.summarize = summarize
+        self.reset()
+
+    def reset(self):
+        """Forgets the whole conversation."""
+        self.turns = []  # (question, answer, estimated tokens)
+        self.summary = ''  # condensed text of turns that were compacted away
+        self.context = None  # Ollama context tokens after the latest turn
+        self.last_stats = {}
+
+    @property
+    def context_tokens(self):
+        """Number of tokens in the current Ollama context."""
+        return len(self.context) if self.context else 0
+
+    @property
+    def history_tokens(self):
+        """Estimated tokens of the text preamble (summary plus remembered turns) sent when there is no context."""
+        summary_tokens = self._estimate_tokens(self.summary) if self.summary else 0
+        return summary_tokens + sum(turn[2] for turn in self.turns)
+
+    def build_prompt(self, question):
+        """Returns the prompt text to send for a new question."""
+        if self.context:
+            # The role and earlier turns are already part of the context
+            return llm_pool.render_prompt(None, self.style, question)
+
+        preamble = self._history_preamble()
+        prompt = llm_pool.render_prompt(self.role, self.style, question)
+        if not preamble:
+            return prompt
+        # Rebuilt context: insert the history between the role line and the new question
+        if self.role:
+            role_line, _, rest = prompt.partition('\n\n')
+            return f'{role_line}\n\n{preamble}\n\n{rest}'
+        return f'{preamble}\n\n{prompt}'
+
+    def build_request(self, question):
+        """
+        Returns the (system, prompt) pair to send for a new question. With prefix caching the role and
+        style are sent as the system prompt on every turn, as llm_pool.render_request does, and the
+        history (when there is no context) goes in the prompt ahead of the question.
+        """
+        if not llm_pool.PREFIX_CACHE:
+            return None, self.build_prompt(question)
+        system, prompt = llm_pool.render_request(self.role, self.style, question)
+        preamble = None if self.context else self._history_preamble()
+        return system, f'{preamble}\n\n{prompt}' if preamble else prompt
+
+    def stream(self, question, client=None, options=None, keep_alive=None, record_as=None):
+        """
+        Sends a question with the conversation context and yields the response text as it streams.
+        The turn (and the new context) is recorded once the response is complete, under record_as
+        if given (e.g. the user's question without the document excerpts sent along with it).
+        """
+        client = client or llm_pool.get_client()
+        keep_alive = llm_pool.KEEP_ALIVE if keep_alive is None else keep_alive
+        system, prompt = self.build_request(question)
+        chunks = []
+        final = None
+        for part in client.generate(model=self.model_name, prompt=prompt, system=system, context=self.context,
+                                    stream=True, options=options, keep_alive=keep_alive):
+            if part.response:
+                chunks.append(part.response)
+                yield part.response
+            if part.done:
+                final = part
+        self.record(question if record_as is None else record_as, ''.join(chunks), final)
+
+    def record(self, question, answer, final=None):
+        """Stores a completed turn together with the context and counts from the final response part."""
+        if final is not None and final.context:
+            self.context = list(final.context)
+            self.last_stats = {
+                'prompt_eval_count': final.prompt_eval_count,
+                'eval_count': final.eval_count,
+                'context_tokens': len(self.context),
+            }
+        else:
+            self.context = None  # No context returned - rebuild from text next time
+
+        tokens = None
+        if final is not None and final.eval_count is not None and final.prompt_eval_count is not None:
+            tokens = final.eval_count + final.prompt_eval_count
+        self.turns.append((question, answer, tokens or self._estimate_tokens(question + answer)))
+
+        # Without a context (e.g. a cached answer, or a server that returns none) the history is
+        # resent as text, so the budget applies to the remembered turns instead
+        used = self.context_tokens if self.context else self.history_tokens
+        if used > self.token_budget:
+            self.compact()
+
+    def compact(self, client=None):
+        """Shrinks the history to fit the token budget and drops the Ollama context."""
+        recent_budget = int(self.token_budget * RECENT_SHARE)
+        recent = []
+        used = 0
+        # Keep the newest turns verbatim while they fit in the recent share of the budget
+        for turn in reversed(self.turns):
+            if used + turn[2] > recent_budget and recent:
+                break
+            recent.insert(0, turn)
+            used += turn[2]
+        older = self.turns[:len(self.turns) - len(recent)]
+
+        if older and self.summarize:
+            self.summary = self._summarize(older, client)
+        elif older:
+            self.summary = ''
+        self.turns = recent
+        self.context = None
+
+    def _summarize(self, turns, client=None):
+        """Condenses turns (plus any earlier summary) into a short summary with the same model."""
+        transcript = self._transcript(turns)
+        if self.summary:
+            transcript = f'Earlier summary: {self.summary}\n\n{transcript}'
+        client = client or llm_pool.get_client()
+        try:
+            with metrics.track('conversation_memory', self.model_name, stage='compact'):
+                response = client.generate(model=self.model_name, prompt=SUMMARY_PROMPT.format(transcript=transcript),
+                                           keep_alive=llm_pool.KEEP_ALIVE)
+            return response.response.strip()
+        except Exception:
+            # If summarizing fails, fall back to dropping the old turns
+            return self.summary
+
+    def _history_preamble(self):
+        """Text form of the remembered conversation, used when no Ollama context is available."""
+        parts = []
+        if self.summary:
+            parts.append(f'Summary of the earlier conversation: {self.summary}')
+        if self.turns:
+            parts.append(f'Recent conversation:\n{self._transcript(self.turns)}')
+        return '\n\n'.join(parts)
+
+    @staticmethod
+    def _transcript(turns):
+        return '\n\n'.join(f'User: {question}\nAssistant: {answer}' for question, answer, _ in turns)
+
+    @staticmethod
+    def _estimate_tokens(text):
+        return len(text) // CHARS_PER_TOKEN + 1
@@ -0,0 +1,332 @@
+# Structured, append-only store of saved conversations
+# Turns are kept in a SQLite database in WAL mode, indexed by date, model, role and conversation,
+# with a full-text index over prompts and responses. Writes are buffered and committed in
+# batches. Past conversations can be paged through or searched without reading the whole log.
+#
+#   python conversation_store.py list --model gemma3:12b
+#   python conversation_store.py search "context window"
+#   python conversation_store.py import ollama_conversation.txt   # old =====-delimited text log
+
+# Import statements
+import argparse
+import atexit
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+import uuid
+from collections import namedtuple
+
+# Constants
+STORE_PATH = os.environ.get('OLLAMA_CONVERSATION_DB', os.path.join(os.path.expanduser('~'), '.local', 'share',
+                                                                   'local_llms', 'conversations.sqlite3'))
+BUFFER_SIZE = 20  # turns held in memory before they are written in one transaction
+FLUSH_INTERVAL = 5  # seconds after which buffered turns are written, even if no other turn arrives
+PAGE_SIZE = 20
+LEGACY_SEPARATOR = '=' * 80  # Block separator of the old save_conversation text files
+
+# One saved question and answer
+Turn = namedtuple('Turn', ['id', 'created', 'conversation_id', 'model', 'role', 'style', 'prompt', 'response'])
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS turns (
+    id INTEGER PRIMARY KEY,
+    created REAL NOT NULL,
+    conversation_id TEXT,
+    model TEXT NOT NULL,
+    role TEXT,
+    style TEXT,
+    prompt TEXT NOT NULL,
+    response TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS turns_created ON turns (created);
+CREATE INDEX IF NOT EXISTS turns_model ON turns (model, created);
+CREATE INDEX IF NOT EXISTS turns_role ON turns (role, created);
+CREATE INDEX IF NOT EXISTS turns_conversation ON turns (conversation_id, created);
+'''
+
+# Full-text index kept in sync with the turns table by triggers (only if SQLite has FTS5)
+FTS_SCHEMA = '''
+CREATE VIRTUAL TABLE IF NOT EXISTS turns_fts USING fts5(prompt, response, content='turns', content_rowid='id');
+CREATE TRIGGER IF NOT EXISTS turns_fts_insert AFTER INSERT ON turns BEGIN
+    INSERT INTO turns_fts (rowid, prompt, response) VALUES (new.id, new.prompt, new.response);
+END;
+CREATE TRIGGER IF NOT EXISTS turns_fts_delete AFTER DELETE ON turns BEGIN
+    INSERT INTO turns_fts (turns_fts, rowid, prompt, response) VALUES ('delete', old.id, old.prompt, old.response);
+END;
+'''
+
+
+# Function to start a new conversation
+def new_conversation_id():
+    """Returns a new id that groups the turns of one conversation."""
+    return uuid.uuid4().hex
+
+
+class ConversationStore:
+    """
+    Append-only conversation log in SQLite.
+    append() buffers turns and writes them in batches, at the latest flush_interval seconds after they
+    were queued; flush() (also run at exit) writes the rest at once.
+    page() and search() read one page at a time using the indexes, newest first.
+    """
+
+    def __init__(self, path=STORE_PATH, buffer_size=BUFFER_SIZE, flush_interval=FLUSH_INTERVAL):
+        self.path = path
+        self.buffer_size = buffer_size
+        self.flush_interval = flush_interval
+        self._pending = []
+        self._last_flush = time.time()
+        self._timer = None  # Writes buffered turns flush_interval seconds after the first of them
+        self._lock = threading.Lock()
+        if path != ':memory:':
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute('PRAGMA journal_mode=WAL')  # Readers do not block the writer (and vice versa)
+        self._db.execute('PRAGMA synchronous=NORMAL')  # Safe with WAL, and avoids an fsync per commit
+        self._db.executescript(SCHEMA)
+        try:
+            self._db.executescript(FTS_SCHEMA)
+            self.full_text = True
+        except sqlite3.OperationalError:
+            self.full_text = False  # SQLite built without FTS5 - search falls back to LIKE
+        self._db.commit()
+        atexit.register(self.flush)
+
+    def append(self, model_name, role, style, prompt, response, conversation_id=None, created=None):
+        """Queues one turn for writing; it is written once the buffer is full or old enough. Use flush() to write it now."""
+        with self._lock:
+            self._pending.append((created or time.time(), conversation_id, model_name, role, style, prompt, response))
+            if len(self._pending) >= self.buffer_size or time.time() - self._last_flush >= self.flush_interval:
+                self._flush_locked()
+            elif self._timer is None:
+                self._timer = threading.Timer(self.flush_interval, self._timed_flush)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def flush(self):
+        """Writes all buffered turns in a single transaction."""
+        with self._lock:
+            self._flush_locked()
+
+    def close(self):
+        """Flushes buffered turns and closes the database."""
+        self.flush()
+        atexit.unregister(self.flush)
+        with self._lock:
+            self._db.close()
+
+    def page(self, model=None, role=None, since=None, until=None, conversation_id=None, before_id=None,
+             limit=PAGE_SIZE):
+        """
+        Returns up to limit turns, newest first, matching all of the given filters.
+        since/until are Unix timestamps. Pass the id of the last turn of a page as before_id to get the next one.
+        Every filter column has an index ending in created (and the rowid), so no page needs a sort.
+        """
+        conditions, params = self._filters(model, role, since, until, conversation_id, before_id)
+        where = f'WHERE {" AND ".join(conditions)}' if conditions else ''
+        return self._query(f'SELECT {self._columns()} FROM turns {where} ORDER BY created DESC, id DESC LIMIT ?',
+                           params + [limit])
+
+    def search(self, query, model=None, role=None, since=None, until=None, before_id=None, limit=PAGE_SIZE):
+        """
+        Returns up to limit turns whose prompt or response matches query, newest first.
+        With FTS5 the query uses its syntax (words, "phrases", prefix*); otherwise it is a plain substring.
+        """
+        conditions, params = self._filters(model, role, since, until, None, before_id)
+        if self.full_text:
+            conditions.append('id IN (SELECT rowid FROM turns_fts WHERE turns_fts MATCH ?)')
+            params.append(query)
+        else:
+            conditions.append('(prompt LIKE ? OR response LIKE ?)')
+            params += [f'%{query}%'] * 2
+        return self._query(f'SELECT {self._columns()} FROM turns WHERE {" AND ".join(conditions)} '
+                           f'ORDER BY created DESC, id DESC LIMIT ?', params + [limit])
+
+    def iter_turns(self, page_size=PAGE_SIZE, **filters):
+        """Yields every matching turn, newest first, reading one page at a time."""
+        before_id = None
+        while True:
+            turns = self.page(before_id=before_id, limit=page_size, **filters)
+            yield from turns
+            if len(turns) < page_size:
+                return
+            before_id = turns[-1].id
+
+    def get(self, turn_id):
+        """Returns the turn with the given id, or None."""
+        turns = self._query(f'SELECT {self._columns()} FROM turns WHERE id = ?', [turn_id])
+        return turns[0] if turns else None
+
+    def count(self):
+        """Returns the number of stored turns."""
+        with self._lock:
+            self._flush_locked()
+            return self._db.execute('SELECT COUNT(*) FROM turns').fetchone()[0]
+
+    def _query(self, sql, params):
+        """Runs a SELECT of Turn columns, after writing any buffered turns so they are included."""
+        with self._lock:
+            self._flush_locked()
+            return [Turn(*row) for row in self._db.execute(sql, params).fetchall()]
+
+    def _timed_flush(self):
+        """Run by the timer: writes the turns that were still buffered after flush_interval."""
+        with self._lock:
+            self._timer = None
+            try:
+                self._flush_locked()
+            except sqlite3.Error:
+                pass  # e.g. the database was closed meanwhile; flush() at exit tries again
+
+    def _flush_locked(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        self._last_flush = time.time()
+        if not self._pending:
+            return
+        with self._db:  # One transaction for the whole batch
+            self._db.executemany('INSERT INTO turns (created, conversation_id, model, role, style, prompt, response) '
+                                 'VALUES (?, ?, ?, ?, ?, ?, ?)', self._pending)
+        self._pending = []
+
+    @staticmethod
+    def _columns():
+        return ', '.join(Turn._fields)
+
+    @staticmethod
+    def _filters(model, role, since, until, conversation_id, before_id):
+        conditions, params = [], []
+        for column, operator, value in (('model', '=', model), ('role', '=', role), ('created', '>=', since),
+                                        ('created', '<', until), ('conversation_id', '=', conversation_id)):
+            if value is not None:
+                conditions.append(f'{column} {operator} ?')
+                params.append(value)
+        if before_id is not None:
+            # Keyset pagination: continue after the last turn of the previous page, in (created, id) order
+            conditions.append('(created, id) < (SELECT created, id FROM turns WHERE id = ?)')
+            params.append(before_id)
+        return conditions, params
+
+
+# Function to import a text log written by the old save_conversation
+def import_text_log(store, file_path):
+    """
+    Reads an old =====-delimited conversation text file into the store, one block at a time.
+    Returns the number of turns imported; blocks that cannot be parsed are skipped.
+    """
+    imported = 0
+    block = []
+    with open(file_path, 'r', encoding='utf-8', errors='replace') as f:
+        for line in f:
+            if line.rstrip('\n') == LEGACY_SEPARATOR:
+                imported += _import_block(store, block)
+                block = []
+            else:
+                block.append(line)
+    imported += _import_block(store, block)
+    store.flush()
+    return imported
+
+
+def _import_block(store, lines):
+    text = ''.join(lines)
+    match = re.match(r'Date: (?P<date>[^\n]+)\nModel: (?P<model>[^\n]+)\n(?:Role: (?P<role>[^\n]*)\n)?'
+                     r'Style: (?P<style>[^\n]*)\n'
+                     r'\nPROMPT:\n(?P<prompt>.*?)\n\nRESPONSE:\n(?P<response>.*)', text, re.DOTALL)
+    if not match:
+        return 0
+    try:
+        created = time.mktime(time.strptime(match['date'].strip(), '%Y-%m-%d %H:%M:%S'))
+    except ValueError:
+        created = None
+    store.append(match['model'].strip(), match['role'], match['style'], match['prompt'],
+                 match['response'].rstrip('\n'), created=created)
+    return 1
+
+
+# Shared store used by the scripts
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    """Returns the process-wide ConversationStore."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = ConversationStore()
+        return _store
+
+
+# Function to print a page of turns
+def _print_turns(turns, full=False):
+    for turn in turns:
+        created = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(turn.created))
+        print(f"#{turn.id}  {created}  {turn.model}  role: {turn.role or '-'}  style: {turn.style or '-'}")
+        if full:
+            print(f'\nPROMPT:\n{turn.prompt}\n\nRESPONSE:\n{turn.response}\n')
+        else:
+            print(f"    > {' '.join(turn.prompt.split())[:100]}")
+    if turns and len(turns) >= PAGE_SIZE:
+        print(f'(more: add --before {turns[-1].id})')
+
+
+def _parse_date(value):
+    return time.mktime(time.strptime(value, '%Y-%m-%d'))
+
+
+def main(argv=None):
+    """Command-line reader for the conversation store."""
+    parser = argparse.ArgumentParser(description='Browse and search saved conversations.')
+    parser.add_argument('--db', default=STORE_PATH, help='Database file (default: OLLAMA_CONVERSATION_DB or ~/.local/share)')
+    commands = parser.add_subparsers(dest='command', required=True)
+    for name in ('list', 'search'):
+        command = commands.add_parser(name, help='List saved turns' if name == 'list' else 'Full-text search of saved turns')
+        if name == 'search':
+            command.add_argument('query')
+        command.add_argument('--model')
+        command.add_argument('--role')
+        command.add_argument('--since', type=_parse_date, help='YYYY-MM-DD')
+        command.add_argument('--until', type=_parse_date, help='YYYY-MM-DD (exclusive)')
+        command.add_argument('--before', type=int, help='Show turns older than this id (next page)')
+        command.add_argument('--full', action='store_true', help='Print prompts and responses in full')
+    show = commands.add_parser('show', help='Print one conversation in order')
+    show.add_argument('turn_id', type=int, help='Id of any turn of the conversation')
+    importer = commands.add_parser('import', help='Import a text file written by the old save_conversation')
+    importer.add_argument('file')
+    args = parser.parse_args(argv)
+
+    store = ConversationStore(args.db)
+    try:
+        if args.command == 'list':
+            _print_turns(store.page(model=args.model, role=args.role, since=args.since, until=args.until,
+                                    before_id=args.before), args.full)
+        elif args.command == 'search':
+            _print_turns(store.search(args.query, model=args.model, role=args.role, since=args.since,
+                                      until=args.until, before_id=args.before), args.full)
+        elif args.command == 'show':
+            turn = store.get(args.turn_id)
+            if turn is None:
+                print(f'No turn with id {args.turn_id}.')
+                return 1
+            if turn.conversation_id is None:
+                turns = [turn]
+            else:
+                turns = list(reversed(list(store.iter_turns(conversation_id=turn.conversation_id))))
+            _print_turns(turns, full=True)
+        else:
+            print(f'Imported {import_text_log(store, args.file)} turns from {args.file} into {args.db}.')
+    except sqlite3.OperationalError as e:
+        print(f'Error: {e}')  # e.g. invalid full-text query syntax
+        return 1
+    finally:
+        store.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
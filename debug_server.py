@@ -2,6 +2,22 @@ import ollama
 import sys
 import importlib
 import inspect
+import argparse
+import json
+import socket
+import time
+from collections import deque
+from datetime import datetime
+import llm_pool
+import metrics
+
+# Probe mode settings
+PROBE_INTERVAL = 60  # seconds between probes
+PROBE_WINDOW = 30  # number of recent probes kept for the rolling statistics
+PROBE_PROMPT = "Hi"
+CONNECT_ALERT_SECONDS = 1.0  # TCP connect time that counts as degraded
+TTFT_ALERT_SECONDS = 10.0  # time to first token that counts as degraded (send_query gives up at 120)
+PROBE_KEEP_ALIVE = 0  # keep_alive for probing a model that is not loaded: unload it again right away
 
 def debug_ollama():
     print("=== Ollama Package Debug ===")
@@ -46,5 +62,242 @@ def debug_ollama():
         import traceback
         traceback.print_exc(file=sys.stderr)
 
+
+# Function to time a TCP connection to the Ollama server
+def measure_connect(client):
+    """Returns the seconds needed to open a TCP connection to the client's server"""
+    url = client._client.base_url
+    start_time = time.time()
+    with socket.create_connection((url.host, url.port or (443 if url.scheme == "https" else 80)), timeout=10):
+        return time.time() - start_time
+
+
+# Function to probe one model with a one-token generation
+def probe_model(client, model_name, keep_alive):
+    """Streams a one-token response and returns (time to first token, load seconds reported by Ollama)"""
+    start_time = time.time()
+    ttft = None
+    load_seconds = None
+    for part in client.generate(model=model_name, prompt=PROBE_PROMPT, stream=True,
+                                options={"num_predict": 1}, keep_alive=keep_alive):
+        if ttft is None and part.response:
+            ttft = time.time() - start_time
+        if part.done:
+            load_seconds = (part.load_duration or 0) / 1e9
+    return ttft if ttft is not None else time.time() - start_time, load_seconds
+
+
+# Function to run one health probe
+def probe_once(client, models=None, keep_alive=None):
+    """Checks the server once and returns the measurements as a dictionary
+    
+    The probe opens a TCP connection, lists the installed models, reads which models are loaded
+    and sends a one-token request to each of them (or to the given models, which loads them).
+    By default the probe leaves the models as it found them: a loaded model is kept for the rest of
+    its remaining keep-alive time, and a model the probe had to load is unloaded again. Otherwise
+    the probes would keep every model resident and hide the swap-outs they are meant to catch.
+    An explicit keep_alive (e.g. llm_pool.KEEP_ALIVE to keep the models warm) is used for every model.
+    """
+    result = {"time": time.strftime("%Y-%m-%d %H:%M:%S"), "connect_s": None, "tags_s": None,
+              "installed": {}, "models": [], "error": None}
+    try:
+        result["connect_s"] = round(measure_connect(client), 4)
+        
+        start_time = time.time()
+        tags = client.list()
+        result["tags_s"] = round(time.time() - start_time, 4)
+        result["installed"] = {model.model: model.digest for model in tags.models}
+        
+        loaded = {model.model: model for model in client.ps().models}
+    except Exception as e:
+        result["error"] = str(e)
+        return result
+    
+    for model_name in models or list(loaded):
+        running = loaded.get(model_name)
+        entry = {
+            "model": model_name,
+            "loaded": running is not None,
+            "digest": running.digest if running else result["installed"].get(model_name),
+            "size": running.size if running else None,
+            "size_vram": running.size_vram if running else None,
+            "expires_at": running.expires_at.isoformat() if running and running.expires_at else None,
+            "ttft_s": None,
+            "load_s": None,
+            "error": None,
+        }
+        try:
+            ttft, load_seconds = probe_model(client, model_name,
+                                             _remaining_keep_alive(running) if keep_alive is None else keep_alive)
+            entry["ttft_s"] = round(ttft, 4)
+            entry["load_s"] = round(load_seconds, 4) if load_seconds is not None else None
+        except Exception as e:
+            entry["error"] = str(e)
+        result["models"].append(entry)
+    return result
+
+
+# Function to work out a keep_alive that does not change how long a model stays loaded
+def _remaining_keep_alive(running):
+    """Returns the seconds the loaded model has left, or PROBE_KEEP_ALIVE if it is not loaded"""
+    if running is None:
+        return PROBE_KEEP_ALIVE
+    if running.expires_at is None:
+        return None  # Unknown: the server's default
+    remaining = (running.expires_at - datetime.now(running.expires_at.tzinfo)).total_seconds()
+    return max(1, int(remaining))
+
+
+class ProbeStats:
+    """Rolling statistics over the most recent probes, plus the checks that raise alerts"""
+    
+    def __init__(self, window=PROBE_WINDOW, connect_alert=CONNECT_ALERT_SECONDS, ttft_alert=TTFT_ALERT_SECONDS):
+        self.window = window
+        self.connect_alert = connect_alert
+        self.ttft_alert = ttft_alert
+        self.samples = {}  # metric name -> deque of recent values
+        self.probes = 0
+        self.failures = 0
+        self.alerts = 0
+        self.previous = None
+    
+    def add(self, result):
+        """Adds a probe result and returns the list of alert messages it raises"""
+        self.probes += 1
+        alerts = []
+        if result["error"]:
+            self.failures += 1
+            alerts.append(f"Server unreachable: {result['error']}")
+        else:
+            self._sample("connect_s", result["connect_s"])
+            self._sample("tags_s", result["tags_s"])
+            if result["connect_s"] > self.connect_alert:
+                alerts.append(f"Slow connect: {result['connect_s']:.2f}s (threshold {self.connect_alert:.2f}s)")
+        
+        for entry in result["models"]:
+            name = entry["model"]
+            if entry["error"]:
+                self.failures += 1
+                alerts.append(f"{name}: probe request failed: {entry['error']}")
+                continue
+            self._sample(f"ttft_s[{name}]", entry["ttft_s"])
+            if entry["ttft_s"] > self.ttft_alert:
+                alerts.append(f"{name}: slow first token {entry['ttft_s']:.2f}s (threshold {self.ttft_alert:.2f}s)")
+            if entry["load_s"] and entry["load_s"] > 0.5:
+                alerts.append(f"{name}: model had to be loaded ({entry['load_s']:.2f}s) - it was swapped out")
+            if entry["size"] and entry["size_vram"] is not None and entry["size_vram"] < entry["size"]:
+                share = entry["size_vram"] / entry["size"]
+                alerts.append(f"{name}: only {share:.0%} of the model is in GPU memory - the rest runs on the CPU")
+        
+        # Compare with the previous probe to catch models that were unloaded or re-pulled
+        if self.previous is not None and not result["error"] and not self.previous["error"]:
+            current = {entry["model"] for entry in result["models"] if entry["loaded"]}
+            for entry in self.previous["models"]:
+                if entry["loaded"] and entry["model"] not in current:
+                    alerts.append(f"{entry['model']}: no longer loaded")
+            for name, digest in result["installed"].items():
+                old_digest = self.previous["installed"].get(name)
+                if old_digest and old_digest != digest:
+                    alerts.append(f"{name}: digest changed from {old_digest[:12]} to {digest[:12]} - the model was replaced")
+        
+        self.previous = result
+        self.alerts += len(alerts)
+        return alerts
+    
+    def summary(self):
+        """Returns {metric: {"p50", "p95", "max", "n"}} over the rolling window"""
+        summary = {}
+        for name, values in self.samples.items():
+            # Same percentile definition as the request metrics, so both tools report comparable numbers
+            summary[name] = {
+                "p50": round(metrics.percentile(values, 50), 4),
+                "p95": round(metrics.percentile(values, 95), 4),
+                "max": round(max(values), 4),
+                "n": len(values),
+            }
+        return summary
+    
+    def _sample(self, name, value):
+        if value is not None:
+            self.samples.setdefault(name, deque(maxlen=self.window)).append(value)
+
+
+# Function to probe the server repeatedly
+def run_probe(host=None, interval=PROBE_INTERVAL, count=None, models=None, stats=None, json_output=False,
+              keep_alive=None):
+    """Probes the server every interval seconds (count times, or until interrupted)
+    
+    keep_alive is passed to probe_once(): None leaves the models loaded for as long as they already were.
+    Returns the ProbeStats, so the caller can tell whether any alerts were raised.
+    """
+    client = ollama.Client(host=host)
+    stats = stats or ProbeStats()
+    print(f"Probing {client._client.base_url} every {interval:g}s (Ctrl+C to stop)", file=sys.stderr)
+    
+    try:
+        while count is None or stats.probes < count:
+            start_time = time.time()
+            result = probe_once(client, models, keep_alive)
+            alerts = stats.add(result)
+            
+            if json_output:
+                print(json.dumps({**result, "alerts": alerts, "stats": stats.summary()}), flush=True)
+            else:
+                _print_probe(result, alerts, stats)
+            
+            if count is not None and stats.probes >= count:
+                break
+            time.sleep(max(0.0, interval - (time.time() - start_time)))
+    except KeyboardInterrupt:
+        pass
+    return stats
+
+
+def _print_probe(result, alerts, stats):
+    if result["error"]:
+        print(f"[{result['time']}] ERROR {result['error']}")
+    else:
+        print(f"[{result['time']}] connect {result['connect_s'] * 1000:.0f} ms, tags {result['tags_s'] * 1000:.0f} ms, "
+              f"{len(result['installed'])} installed, {sum(entry['loaded'] for entry in result['models'])} loaded")
+    for entry in result["models"]:
+        if entry["error"]:
+            print(f"    {entry['model']}: ERROR {entry['error']}")
+            continue
+        rolling = stats.summary().get(f"ttft_s[{entry['model']}]", {})
+        state = "loaded" if entry["loaded"] else "not loaded"
+        print(f"    {entry['model']}: {state}, TTFT {entry['ttft_s']:.3f}s "
+              f"(p50 {rolling.get('p50', 0):.3f}s, p95 {rolling.get('p95', 0):.3f}s over {rolling.get('n', 0)} probes)")
+    for alert in alerts:
+        print(f"ALERT: {alert}", file=sys.stderr)
+
+
+def main(argv=None):
+    """Runs the one-off package debug, or the health probe with --probe"""
+    parser = argparse.ArgumentParser(description="Debug the Ollama package or probe the Ollama server's health.")
+    parser.add_argument("--probe", action="store_true", help="Check the server repeatedly instead of printing package details")
+    parser.add_argument("--host", default=None, help="Ollama server URL (default: OLLAMA_HOST or the local server)")
+    parser.add_argument("-i", "--interval", type=float, default=PROBE_INTERVAL, help="Seconds between probes")
+    parser.add_argument("-n", "--count", type=int, default=None, help="Number of probes (default: run until interrupted)")
+    parser.add_argument("-m", "--models", nargs="+", help="Models to probe (default: the loaded models; others get loaded)")
+    parser.add_argument("--window", type=int, default=PROBE_WINDOW, help="Probes kept for the rolling statistics")
+    parser.add_argument("--ttft-alert", type=float, default=TTFT_ALERT_SECONDS, help="Alert above this time to first token (s)")
+    parser.add_argument("--connect-alert", type=float, default=CONNECT_ALERT_SECONDS, help="Alert above this connect time (s)")
+    parser.add_argument("--json", action="store_true", help="Print one JSON object per probe")
+    parser.add_argument("--keep-warm", action="store_true",
+                        help=f"Keep the probed models loaded for {llm_pool.KEEP_ALIVE} after each probe "
+                             "(default: leave their keep-alive time unchanged, so swap-outs still show up)")
+    args = parser.parse_args(argv)
+    
+    if not args.probe:
+        debug_ollama()
+        return 0
+    
+    stats = ProbeStats(window=args.window, connect_alert=args.connect_alert, ttft_alert=args.ttft_alert)
+    run_probe(args.host, args.interval, args.count, args.models, stats, args.json,
+              keep_alive=llm_pool.KEEP_ALIVE if args.keep_warm else None)
+    # A non-zero status lets a scheduled probe (e.g. from cron) report problems
+    return 1 if stats.alerts else 0
+
+
 if __name__ == "__main__":
-    debug_ollama()
+    sys.exit(main())
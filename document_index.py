@@ -0,0 +1,269 @@
+# Persistent vector index over a directory of documents, for retrieval-augmented answers
+# Pasting a whole document into the prompt makes Ollama evaluate all of it for every question.
+# Instead, the text files under a directory are split into overlapping chunks (as the summarizer
+# does, with text_chunking), each chunk is embedded with a local Ollama embedding model, and only the TOP_K chunks most
+# similar to a question are put in front of it, so the prompt stays about the same size however
+# large the corpus grows.
+#
+# The index of each directory is one .npz file under INDEX_DIR holding the chunk vectors, the chunk
+# texts and a manifest of the indexed files. update() re-embeds only files that were added or whose
+# content changed since the last run, and drops the chunks of deleted files.
+#
+#   python document_index.py ~/notes                     # index (or re-index) a directory
+#   python document_index.py ~/notes --search "backups"  # show the chunks a question would get
+#   python advanced_ollama.py --documents ~/notes        # ask questions about it
+
+# Import statements
+import argparse
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+import zipfile
+from collections import namedtuple
+import llm_pool
+from semantic_cache import EMBED_MODEL
+from text_chunking import iter_chunks, iter_file_blocks
+
+# Constants
+INDEX_DIR = os.environ.get('OLLAMA_DOCUMENT_INDEX_DIR',
+                           os.path.join(os.path.expanduser('~'), '.cache', 'local_llms', 'documents'))
+CHUNK_TOKENS = 300  # estimated tokens per chunk; small chunks make retrieval precise
+CHUNK_OVERLAP_TOKENS = 40
+TOP_K = int(os.environ.get('OLLAMA_RAG_TOP_K') or 4)  # chunks put in front of each question
+EMBED_BATCH = 32  # chunks embedded per request
+MAX_FILE_BYTES = 20 * 1024 * 1024  # larger files are skipped
+TEXT_EXTENSIONS = {'.txt', '.md', '.rst', '.tex', '.html', '.htm', '.xml', '.json', '.csv', '.yaml', '.yml',
+                   '.toml', '.ini', '.cfg', '.log', '.py', '.js', '.ts', '.java', '.c', '.h', '.cpp', '.go',
+                   '.rs', '.sh', '.sql'}
+RAG_PROMPT = (
+    "Answer the question using the excerpts from the user's documents below. If they do not contain "
+    "the answer, say so, and answer from general knowledge only if you make that clear.\n\n"
+    "{excerpts}\n\n"
+    "{question}"
+)
+
+# One retrieved chunk: the file it came from (relative to the indexed directory), its position in
+# the file, its text and its cosine similarity to the question
+Chunk = namedtuple('Chunk', ['file', 'index', 'text', 'score'])
+
+
+class DocumentIndex:
+    """
+    Chunk embeddings of the text files under one directory, kept on disk and updated incrementally.
+
+    Args:
+        corpus_dir (str): Directory whose files are indexed (recursively; hidden entries are skipped)
+        index_dir (str): Where the index file is stored
+        embed_model (str): Ollama embedding model; changing it re-embeds everything
+    """
+
+    def __init__(self, corpus_dir, index_dir=INDEX_DIR, embed_model=EMBED_MODEL):
+        self.corpus_dir = os.path.abspath(corpus_dir)
+        self.embed_model = embed_model
+        key = hashlib.sha256(f'{self.corpus_dir}\n{embed_model}'.encode('utf-8')).hexdigest()[:24]
+        self.path = os.path.join(index_dir, f'{key}.npz')
+        self.settings = {'embed_model': embed_model, 'chunk_tokens': CHUNK_TOKENS,
+                         'overlap_tokens': CHUNK_OVERLAP_TOKENS}
+        self.vectors = None  # float32 array, one unit-length row per chunk
+        self.chunks = []  # {'file', 'index', 'text'} per row
+        self.files = {}  # relative path -> {'size', 'mtime', 'sha256', 'chunks'}
+        self._lock = threading.Lock()
+        self._load()
+
+    def __len__(self):
+        return len(self.chunks)
+
+    def update(self, on_file=None):
+        """
+        Brings the index up to date with the directory: new and changed files are chunked and embedded,
+        deleted ones are dropped. on_file(relative path, action) is called for each file that changes.
+        Returns counts of added, updated, removed and unchanged files, embedded chunks and seconds taken.
+        """
+        import numpy as np
+        start_time = time.time()
+        stats = {'added': 0, 'updated': 0, 'removed': 0, 'unchanged': 0, 'embedded_chunks': 0}
+        with self._lock:
+            found = dict(self._scan())
+            stale = set(self.files) - set(found)  # Deleted files
+            pending = []  # (relative path, file record, action) to (re-)embed
+            touched = False  # Whether any unchanged file got a new mtime, which must be saved too
+            for relative_path, stat in found.items():
+                record = self.files.get(relative_path)
+                if record and record['size'] == stat.st_size and record['mtime'] == stat.st_mtime:
+                    stats['unchanged'] += 1
+                    continue
+                digest = _file_digest(os.path.join(self.corpus_dir, relative_path))
+                if record and record['sha256'] == digest:
+                    record['mtime'] = stat.st_mtime  # Touched but not changed: nothing to re-embed
+                    touched = True
+                    stats['unchanged'] += 1
+                    continue
+                pending.append((relative_path, {'size': stat.st_size, 'mtime': stat.st_mtime, 'sha256': digest},
+                                'updated' if record else 'added'))
+                stale.add(relative_path)
+
+            # Drop the chunks of deleted and changed files, then append the new ones
+            for relative_path in stale:
+                if relative_path not in found:
+                    stats['removed'] += 1
+                    if on_file:
+                        on_file(relative_path, 'removed')
+                self.files.pop(relative_path, None)
+            keep = [row for row, chunk in enumerate(self.chunks) if chunk['file'] not in stale]
+            if len(keep) < len(self.chunks):
+                self.vectors = self.vectors[keep]
+                self.chunks = [self.chunks[row] for row in keep]
+
+            for relative_path, record, action in pending:
+                texts = list(iter_chunks(iter_file_blocks(os.path.join(self.corpus_dir, relative_path)),
+                                         CHUNK_TOKENS, CHUNK_OVERLAP_TOKENS))
+                vectors = [self._embed(texts[i:i + EMBED_BATCH]) for i in range(0, len(texts), EMBED_BATCH)]
+                if vectors:
+                    vectors = np.vstack(vectors)
+                    self.vectors = vectors if self.vectors is None or not len(self.chunks) \
+                        else np.vstack([self.vectors, vectors])
+                    self.chunks += [{'file': relative_path, 'index': i, 'text': text} for i, text in enumerate(texts)]
+                record['chunks'] = len(texts)
+                self.files[relative_path] = record
+                stats[action] += 1
+                stats['embedded_chunks'] += len(texts)
+                if on_file:
+                    on_file(relative_path, action)
+                self._save()  # After every file, so an interrupted run keeps the files already embedded
+
+            if (stats['removed'] or touched) and not pending:
+                self._save()
+        stats['chunks'] = len(self.chunks)
+        stats['seconds'] = round(time.time() - start_time, 2)
+        return stats
+
+    def search(self, question, k=TOP_K):
+        """Returns the k chunks most similar to the question, most similar first."""
+        import numpy as np
+        with self._lock:
+            if not self.chunks or k <= 0:
+                return []
+            scores = self.vectors @ self._embed([question])[0]
+            k = min(k, len(scores))
+            rows = np.argpartition(-scores, k - 1)[:k]
+            rows = rows[np.argsort(-scores[rows])]
+            return [Chunk(self.chunks[row]['file'], self.chunks[row]['index'], self.chunks[row]['text'],
+                          float(scores[row])) for row in rows]
+
+    def _scan(self):
+        """Yields (relative path, stat) of the indexable files under the directory."""
+        for root, dirs, files in os.walk(self.corpus_dir):
+            dirs[:] = sorted(name for name in dirs if not name.startswith('.'))
+            for name in sorted(files):
+                if name.startswith('.') or os.path.splitext(name)[1].lower() not in TEXT_EXTENSIONS:
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                if 0 < stat.st_size <= MAX_FILE_BYTES:
+                    yield os.path.relpath(path, self.corpus_dir), stat
+
+    def _embed(self, texts):
+        """Returns the unit-length embeddings of texts as a float32 array, one row per text."""
+        import numpy as np
+        response = llm_pool.get_client().embed(model=self.embed_model, input=texts, keep_alive=llm_pool.KEEP_ALIVE)
+        vectors = np.asarray(response.embeddings, dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+
+    def _load(self):
+        """Reads the index from disk; it starts empty if there is none or it was built with other settings."""
+        import numpy as np  # Deferred: only needed once documents are used
+        try:
+            with np.load(self.path, allow_pickle=False) as data:
+                manifest = json.loads(str(data['manifest']))
+                vectors = data['vectors'].astype(np.float32)
+        except (OSError, ValueError, KeyError, zipfile.BadZipFile):
+            return
+        if manifest.get('settings') != self.settings or len(manifest['chunks']) != len(vectors):
+            return  # Re-chunked and re-embedded by the next update()
+        self.vectors = vectors
+        self.chunks = manifest['chunks']
+        self.files = manifest['files']
+
+    def _save(self):
+        """Writes the index through a temporary file, so an interrupted write never corrupts it. Caller must hold the lock."""
+        import numpy as np
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        manifest = {'corpus_dir': self.corpus_dir, 'settings': self.settings, 'files': self.files,
+                    'chunks': self.chunks}
+        vectors = self.vectors if self.vectors is not None and len(self.chunks) else np.empty((0, 0), np.float32)
+        temp_path = f'{self.path}.{os.getpid()}.tmp'
+        with open(temp_path, 'wb') as f:
+            np.savez(f, vectors=vectors, manifest=np.array(json.dumps(manifest)))
+        os.replace(temp_path, self.path)
+
+
+# Function to put the retrieved chunks in front of a question
+def build_prompt(question, chunks):
+    """Returns the question preceded by the chunks, each labelled with its source file; the question alone if there are none."""
+    if not chunks:
+        return question
+    excerpts = '\n\n'.join(f'[{chunk.file}, part {chunk.index + 1}]\n{chunk.text.strip()}' for chunk in chunks)
+    return RAG_PROMPT.format(excerpts=excerpts, question=question)
+
+
+# Function to open the index of a directory and bring it up to date
+def open_index(corpus_dir, verbose=True):
+    """Returns the DocumentIndex of corpus_dir after indexing new and changed files, reporting progress if verbose."""
+    index = DocumentIndex(corpus_dir)
+    on_file = (lambda path, action: print(f'  {action}: {path}')) if verbose else None
+    if verbose:
+        print(f'Indexing documents in {index.corpus_dir}...')
+    stats = index.update(on_file)
+    if verbose:
+        print(f"{len(index.files)} files, {stats['chunks']} chunks indexed "
+              f"({stats['added']} added, {stats['updated']} updated, {stats['removed']} removed) "
+              f"in {stats['seconds']:.2f} seconds.")
+    return index
+
+
+# Function to hash a file's content for change detection
+def _file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def main(argv=None):
+    """Command-line entry point."""
+    parser = argparse.ArgumentParser(description='Index a directory of documents for retrieval-augmented answers.')
+    parser.add_argument('directory', help='Directory of text files to index')
+    parser.add_argument('--search', metavar='QUESTION', help='Show the chunks retrieved for a question')
+    parser.add_argument('-k', '--top-k', type=int, default=TOP_K, help='Chunks retrieved per question')
+    args = parser.parse_args(argv)
+
+    if not os.path.isdir(args.directory):
+        print(f'Error: {args.directory} is not a directory.')
+        return 1
+    try:
+        index = open_index(args.directory)
+        if args.search:
+            for chunk in index.search(args.search, args.top_k):
+                print(f'\n[{chunk.file}, part {chunk.index + 1}] similarity {chunk.score:.3f}')
+                print(chunk.text.strip())
+    except ConnectionError as e:
+        print(f'Error: {e}')
+        return 1
+    except Exception as e:
+        print(f'Error indexing documents: {e}')
+        print(f'Make sure the embedding model is available (ollama pull {EMBED_MODEL}).')
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
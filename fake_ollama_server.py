@@ -0,0 +1,464 @@
+# Lightweight stand-in for the Ollama HTTP API
+# Serves /api/tags, /api/ps, /api/version, /api/generate and /api/chat (streaming and
+# non-streaming) with deterministic text, and /api/embed with bag-of-words embeddings, so the client code paths can be tested and benchmarked
+# under realistic latency without a GPU or real model weights. Per-token delay, model load delay,
+# prompt evaluation delay, failure injection and a concurrency limit are all configurable.
+# Like the real server, each loaded model keeps the tokens of its recent prompts (its KV cache), and
+# only the part of a new prompt after the longest cached prefix is evaluated and counted.
+#
+# Point the scripts at it with OLLAMA_HOST, e.g.
+#   python fake_ollama_server.py --models gemma3:12b --load-delay 2 --failure-rate 0.1
+#   OLLAMA_HOST=http://127.0.0.1:11435 python advanced_ollama.py
+
+# Import statements
+import argparse
+import json
+import random
+import re
+import sys
+import threading
+import time
+import zlib
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Constants
+DEFAULT_PORT = 11435  # Next to Ollama's 11434, so both can run at once
+DEFAULT_MODELS = ['stub-model:latest']
+DEFAULT_TOKEN_DELAY = 0.01  # seconds between streamed tokens
+DEFAULT_RESPONSE_TOKENS = 50
+DEFAULT_KEEP_ALIVE = 300  # seconds a model stays loaded, like Ollama's default of 5m
+CHARS_PER_TOKEN = 4  # The stub "tokenizes" text into fixed-size chunks
+FAILURE_MODES = ['error', 'disconnect']  # HTTP 500 before any output, or a stream cut off mid-response
+STUB_VERSION = '0.0.0-stub'
+EMBED_DIMENSIONS = 256  # Length of the stub's embedding vectors
+STUB_WORDS = ['The', ' quick', ' brown', ' fox', ' jumps', ' over', ' the', ' lazy', ' dog', '.']
+
+
+# Function to convert an Ollama keep_alive value to seconds
+def parse_keep_alive(value, default=DEFAULT_KEEP_ALIVE):
+    """
+    Accepts the forms Ollama does: a number of seconds or a duration string ("30m", "1h", "90s").
+    Returns seconds, with a negative value meaning "keep loaded forever".
+    """
+    if value is None or value == '':
+        return default
+    if isinstance(value, (int, float)):
+        return float(value)
+    match = re.fullmatch(r'\s*(-?\d+(?:\.\d+)?)\s*(ms|s|m|h)?\s*', str(value))
+    if not match:
+        return default
+    amount = float(match.group(1))
+    return amount * {'ms': 0.001, 's': 1, 'm': 60, 'h': 3600, None: 1}[match.group(2)]
+
+
+class FakeOllamaServer(ThreadingHTTPServer):
+    """
+    HTTP server holding the stub's settings and state; request handling is in FakeOllamaHandler.
+
+    Args:
+        models (list): Model names to advertise
+        token_delay (float): Seconds between streamed tokens
+        prompt_eval_delay (float): Seconds per prompt token that is not in the model's KV cache
+        response_tokens (int): Tokens per response (capped by a request's options.num_predict)
+        load_delay (float): Seconds a request waits when its model is not loaded yet
+        failure_rate (float): Fraction of generate/chat requests that fail (0 disables failures)
+        failure_mode (str): "error" returns HTTP 500, "disconnect" closes the connection mid-stream
+        max_parallel (int): Requests processed at once; others wait (0 means unlimited).
+            Also the number of cached prompts kept per model, like Ollama's OLLAMA_NUM_PARALLEL slots.
+        max_queue (int): Requests allowed to wait before HTTP 503 is returned (0 means unlimited)
+        seed (int): Seed for failure injection, so failures repeat from run to run
+    """
+
+    daemon_threads = True
+
+    def __init__(self, address, models=None, token_delay=DEFAULT_TOKEN_DELAY, response_tokens=DEFAULT_RESPONSE_TOKENS,
+                 load_delay=0.0, failure_rate=0.0, failure_mode='error', max_parallel=0, max_queue=0, seed=None,
+                 prompt_eval_delay=0.0):
+        if failure_mode not in FAILURE_MODES:
+            raise ValueError(f'failure_mode must be one of {FAILURE_MODES}')
+        super().__init__(address, FakeOllamaHandler)
+        self.models = list(models or DEFAULT_MODELS)
+        self.token_delay = token_delay
+        self.response_tokens = response_tokens
+        self.load_delay = load_delay
+        self.failure_rate = failure_rate
+        self.failure_mode = failure_mode
+        self.max_queue = max_queue
+        self.prompt_eval_delay = prompt_eval_delay
+        self.cache_slots = max(1, max_parallel)
+        self.stats = {'requests': 0, 'failures': 0, 'rejected': 0, 'loads': 0, 'max_active': 0,
+                      'prompt_tokens': 0, 'cached_tokens': 0}
+        self._slots = threading.BoundedSemaphore(max_parallel) if max_parallel > 0 else None
+        self._random = random.Random(seed)
+        self._loaded = {}  # model name -> expiry time (None means forever)
+        self._kv_cache = {}  # model name -> token lists of its most recent prompts, newest last
+        self._active = 0
+        self._waiting = 0
+        self._lock = threading.Lock()
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def acquire_slot(self):
+        """Waits for a processing slot. Returns False if the wait queue is full."""
+        with self._lock:
+            if self._slots is not None and self.max_queue and self._waiting >= self.max_queue:
+                self.stats['rejected'] += 1
+                return False
+            self._waiting += 1
+        if self._slots is not None:
+            self._slots.acquire()
+        with self._lock:
+            self._waiting -= 1
+            self._active += 1
+            self.stats['requests'] += 1
+            self.stats['max_active'] = max(self.stats['max_active'], self._active)
+        return True
+
+    def release_slot(self):
+        with self._lock:
+            self._active -= 1
+        if self._slots is not None:
+            self._slots.release()
+
+    def should_fail(self):
+        """Decides whether the current request gets an injected failure."""
+        with self._lock:
+            failed = self.failure_rate > 0 and self._random.random() < self.failure_rate
+            if failed:
+                self.stats['failures'] += 1
+            return failed
+
+    def load_model(self, model_name, keep_alive):
+        """
+        Marks a model as loaded, sleeping for load_delay if it was not loaded.
+        Returns the simulated load time in seconds.
+        """
+        with self._lock:
+            self._expire()
+            cold = model_name not in self._loaded
+            if cold:
+                self.stats['loads'] += 1
+        if cold:
+            time.sleep(self.load_delay)
+        seconds = parse_keep_alive(keep_alive)
+        with self._lock:
+            if seconds == 0:
+                self._loaded.pop(model_name, None)  # keep_alive=0 unloads after the request
+                self._kv_cache.pop(model_name, None)
+            else:
+                self._loaded[model_name] = None if seconds < 0 else time.time() + seconds
+        return self.load_delay if cold else 0.0
+
+    def cached_prefix(self, model_name, tokens):
+        """
+        Returns how many leading tokens of a prompt are already in the model's KV cache and stores the
+        prompt in the slot it shared the longest prefix with (or the least recently used one).
+        """
+        with self._lock:
+            slots = self._kv_cache.setdefault(model_name, [])
+            best, best_idx = 0, None
+            for idx, cached in enumerate(slots):
+                common = _common_prefix(cached, tokens)
+                if common > best:
+                    best, best_idx = common, idx
+            if best_idx is not None:
+                del slots[best_idx]
+            elif len(slots) >= self.cache_slots:
+                del slots[0]
+            slots.append(list(tokens))
+            self.stats['prompt_tokens'] += len(tokens)
+            self.stats['cached_tokens'] += best
+            return best
+
+    def loaded_models(self):
+        """Returns {model name: expiry time or None} for the models currently loaded."""
+        with self._lock:
+            self._expire()
+            return dict(self._loaded)
+
+    def _expire(self):
+        now = time.time()
+        for name, expires_at in list(self._loaded.items()):
+            if expires_at is not None and expires_at < now:
+                del self._loaded[name]
+                self._kv_cache.pop(name, None)
+
+
+class FakeOllamaHandler(BaseHTTPRequestHandler):
+    """Implements the subset of the Ollama API used by the scripts."""
+
+    protocol_version = 'HTTP/1.1'  # Keep-alive, like the real server
+
+    def log_message(self, format, *args):
+        pass  # Keep benchmark output clean
+
+    def do_GET(self):
+        if self.path == '/api/tags':
+            self._send_json({'models': [self._model_entry(name) for name in self.server.models]})
+        elif self.path == '/api/ps':
+            self._send_json({'models': [self._running_entry(name, expires_at)
+                                        for name, expires_at in self.server.loaded_models().items()]})
+        elif self.path == '/api/version':
+            self._send_json({'version': STUB_VERSION})
+        elif self.path == '/':
+            self._send_text('Ollama is running')
+        else:
+            self._send_json({'error': 'not found'}, status=404)
+
+    def do_HEAD(self):
+        self._send_text('')
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        try:
+            request = json.loads(self.rfile.read(length) or b'{}')
+        except json.JSONDecodeError:
+            self._send_json({'error': 'invalid JSON body'}, status=400)
+            return
+
+        if self.path == '/api/generate':
+            self._respond(request, chat=False)
+        elif self.path == '/api/chat':
+            self._respond(request, chat=True)
+        elif self.path == '/api/embed':
+            self._embed(request)
+        else:
+            self._send_json({'error': 'not found'}, status=404)
+
+    def _respond(self, request, chat):
+        """Handles /api/generate and /api/chat, which differ only in how text is wrapped."""
+        model = request.get('model', '')
+        if model not in self.server.models:
+            self._send_json({'error': f"model '{model}' not found"}, status=404)
+            return
+
+        if not self.server.acquire_slot():
+            # Same status and message as Ollama when OLLAMA_MAX_QUEUE is exceeded
+            self._send_json({'error': 'server busy, please try again.  maximum pending requests exceeded'}, status=503)
+            return
+        try:
+            self._run(model, request, chat)
+        except (BrokenPipeError, ConnectionResetError):
+            self.close_connection = True  # The client stopped reading, as clients do to cancel a generation
+        finally:
+            self.server.release_slot()
+
+    def _run(self, model, request, chat):
+        start_time = time.time()
+        load_seconds = self.server.load_model(model, request.get('keep_alive'))
+
+        if chat:
+            messages = request.get('messages') or []
+            prompt = ''.join(str(message.get('content') or '') for message in messages)
+        else:
+            prompt = (request.get('system') or '') + (request.get('prompt') or '')
+        # Continuing from a returned context means the context tokens come first, as with the real server
+        prompt_ids = list(request.get('context') or []) if not chat else []
+        prompt_ids += _tokenize(prompt)
+        # A request with no prompt (or no messages) only loads the model, like the real server
+        tokens = self._tokens(request.get('options') or {}) if prompt else []
+
+        prompt_tokens = 0
+        prompt_eval_seconds = 0.0
+        if prompt:
+            prompt_tokens = max(1, len(prompt_ids) - self.server.cached_prefix(model, prompt_ids))
+            prompt_eval_seconds = self.server.prompt_eval_delay * prompt_tokens
+            time.sleep(prompt_eval_seconds)
+        context = prompt_ids + _tokenize(''.join(tokens))
+
+        failed = tokens and self.server.should_fail()
+        if failed and self.server.failure_mode == 'error':
+            self._send_json({'error': 'injected failure'}, status=500)
+            return
+
+        if request.get('stream', True):
+            self._start_stream()
+            for i, token in enumerate(tokens):
+                if failed and i == len(tokens) // 2:
+                    self.close_connection = True  # Cut the stream off without the final message
+                    return
+                time.sleep(self.server.token_delay)
+                self._send_chunk(self._message(model, token, chat))
+            self._send_chunk(self._final(model, '', chat, prompt_tokens, len(tokens), start_time, load_seconds,
+                                         prompt_eval_seconds, context, load_only=not prompt))
+            self._end_stream()
+        else:
+            if failed:
+                self.close_connection = True
+                return
+            time.sleep(self.server.token_delay * len(tokens))
+            self._send_json(self._final(model, ''.join(tokens), chat, prompt_tokens, len(tokens), start_time, load_seconds,
+                                        prompt_eval_seconds, context, load_only=not prompt))
+
+    def _embed(self, request):
+        """Handles /api/embed: one stand-in embedding per input text, so similar texts get similar vectors."""
+        model = request.get('model', '')
+        if ':' not in model:
+            model += ':latest'  # Ollama resolves untagged names to the latest tag
+        if model not in self.server.models:
+            self._send_json({'error': f"model '{model}' not found"}, status=404)
+            return
+        start_time = time.time()
+        load_seconds = self.server.load_model(model, request.get('keep_alive'))
+        texts = request.get('input') or ''
+        texts = [texts] if isinstance(texts, str) else texts
+        prompt_tokens = sum(len(_tokenize(text)) for text in texts)
+        time.sleep(self.server.prompt_eval_delay * prompt_tokens)
+        self._send_json({'model': model, 'embeddings': [_embedding(text) for text in texts],
+                         'total_duration': int((time.time() - start_time) * 1e9),
+                         'load_duration': int(load_seconds * 1e9), 'prompt_eval_count': prompt_tokens})
+
+    def _tokens(self, options):
+        count = self.server.response_tokens
+        if options.get('num_predict') is not None and options['num_predict'] >= 0:
+            count = min(count, options['num_predict'])
+        return [STUB_WORDS[i % len(STUB_WORDS)] for i in range(count)]
+
+    def _message(self, model, text, chat):
+        message = {'model': model, 'created_at': _now(), 'done': False}
+        if chat:
+            message['message'] = {'role': 'assistant', 'content': text}
+        else:
+            message['response'] = text
+        return message
+
+    def _final(self, model, text, chat, prompt_tokens, eval_count, start_time, load_seconds, prompt_eval_seconds,
+               context, load_only=False):
+        """Final message with the same timing fields as the real server (durations in nanoseconds)."""
+        total = int((time.time() - start_time) * 1e9)
+        load = int(load_seconds * 1e9)
+        prompt_eval = int(prompt_eval_seconds * 1e9)
+        final = self._message(model, text, chat)
+        final.update({
+            'done': True, 'done_reason': 'load' if load_only else 'stop',
+            'total_duration': total, 'load_duration': load,
+            'prompt_eval_count': prompt_tokens, 'prompt_eval_duration': prompt_eval,
+            'eval_count': eval_count, 'eval_duration': max(0, total - load - prompt_eval),
+        })
+        if not chat:
+            final['context'] = context
+        return final
+
+    def _model_entry(self, name):
+        return {
+            'name': name, 'model': name, 'modified_at': _now(), 'size': 1024 * 1024,
+            'digest': f'stub-{name}', 'details': {'format': 'gguf', 'family': 'stub', 'parameter_size': '1M',
+                                                  'quantization_level': 'Q4_0'},
+        }
+
+    def _running_entry(self, name, expires_at):
+        entry = self._model_entry(name)
+        del entry['modified_at']
+        expiry = datetime.now(timezone.utc) + timedelta(days=3650) if expires_at is None \
+            else datetime.fromtimestamp(expires_at, timezone.utc)
+        entry.update({'expires_at': expiry.isoformat(), 'size_vram': entry['size']})
+        return entry
+
+    def _send_json(self, payload, status=200):
+        self._send_body(json.dumps(payload).encode('utf-8'), 'application/json', status)
+
+    def _send_text(self, text, status=200):
+        self._send_body(text.encode('utf-8'), 'text/plain; charset=utf-8', status)
+
+    def _send_body(self, body, content_type, status):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if self.command != 'HEAD':
+            self.wfile.write(body)
+
+    def _start_stream(self):
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/x-ndjson')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+
+    def _send_chunk(self, payload):
+        data = (json.dumps(payload) + '\n').encode('utf-8')
+        self.wfile.write(f'{len(data):x}\r\n'.encode('ascii') + data + b'\r\n')
+        self.wfile.flush()
+
+    def _end_stream(self):
+        self.wfile.write(b'0\r\n\r\n')
+        self.wfile.flush()
+
+
+def _now():
+    return datetime.now(timezone.utc).isoformat()
+
+
+def _tokenize(text):
+    """Stand-in tokenizer: stable integer ids for fixed-size chunks of the text."""
+    return [zlib.crc32(text[i:i + CHARS_PER_TOKEN].encode('utf-8')) for i in range(0, len(text), CHARS_PER_TOKEN)]
+
+
+def _embedding(text):
+    """Stand-in embedding: hashed words and word trigrams, normalized to unit length."""
+    vector = [0.0] * EMBED_DIMENSIONS
+    for word in re.findall(r'\w+', text.lower()):
+        padded = f' {word} '
+        for feature in [word] + [padded[i:i + 3] for i in range(len(padded) - 2)]:
+            hashed = zlib.crc32(feature.encode('utf-8'))
+            vector[hashed % EMBED_DIMENSIONS] += 1.0 if hashed & 0x80000000 else -1.0
+    norm = sum(value * value for value in vector) ** 0.5 or 1.0
+    return [value / norm for value in vector]
+
+
+def _common_prefix(a, b):
+    count = 0
+    for x, y in zip(a, b):
+        if x != y:
+            break
+        count += 1
+    return count
+
+
+# Function to start the stub server on a background thread
+def start_server(host='127.0.0.1', port=0, **settings):
+    """Starts a FakeOllamaServer in a daemon thread and returns it (port=0 picks a free port)."""
+    server = FakeOllamaServer((host, port), **settings)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main(argv=None):
+    """Command-line entry point: serve the stub API until interrupted."""
+    parser = argparse.ArgumentParser(description='Run a fake Ollama server for testing and benchmarking.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--models', nargs='+', default=DEFAULT_MODELS, help='Model names to advertise')
+    parser.add_argument('--token-delay', type=float, default=DEFAULT_TOKEN_DELAY, help='Seconds between streamed tokens')
+    parser.add_argument('--response-tokens', type=int, default=DEFAULT_RESPONSE_TOKENS, help='Tokens per response')
+    parser.add_argument('--load-delay', type=float, default=0.0, help='Seconds to "load" a model that is not loaded')
+    parser.add_argument('--prompt-eval-delay', type=float, default=0.0,
+                        help='Seconds per prompt token that is not in the KV cache')
+    parser.add_argument('--failure-rate', type=float, default=0.0, help='Fraction of requests that fail (0-1)')
+    parser.add_argument('--failure-mode', choices=FAILURE_MODES, default='error',
+                        help='"error" returns HTTP 500, "disconnect" cuts the stream off halfway')
+    parser.add_argument('--max-parallel', type=int, default=0, help='Requests processed at once (0: unlimited)')
+    parser.add_argument('--max-queue', type=int, default=0, help='Waiting requests before HTTP 503 (0: unlimited)')
+    parser.add_argument('--seed', type=int, default=None, help='Random seed for failure injection')
+    args = parser.parse_args(argv)
+
+    server = FakeOllamaServer((args.host, args.port), models=args.models, token_delay=args.token_delay,
+                              response_tokens=args.response_tokens, load_delay=args.load_delay,
+                              failure_rate=args.failure_rate, failure_mode=args.failure_mode,
+                              max_parallel=args.max_parallel, max_queue=args.max_queue, seed=args.seed,
+                              prompt_eval_delay=args.prompt_eval_delay)
+    print(f'Fake Ollama server listening on {server.url} (set OLLAMA_HOST={server.url} to use it)')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,259 @@
+# Shared pool of ready-to-run LLM chains for the Ollama scripts
+# Building an OllamaLLM, a PromptTemplate and a chain (plus a fresh HTTP connection) on every
+# query is wasted work, so chains are cached here keyed by (model, role, style) and reused.
+# ollama and langchain are imported on first use: together they take over a second to import,
+# which would otherwise delay the first prompt or window of every script.
+
+# Import statements
+import os
+import threading
+import time
+from collections import OrderedDict
+import metrics
+
+# Constants
+IDLE_TIMEOUT = 600  # seconds an unused chain or model stays in the pool
+MAX_POOL_SIZE = 32  # maximum number of cached chains
+# How long Ollama keeps a model in memory after a request (a duration like "30m", seconds, or -1 for
+# forever). Long enough that slow interactive turns do not pay the model load again. Plain numbers are
+# sent as integers: Ollama parses strings as Go durations, which need a unit, and rejects "300" or "-1".
+KEEP_ALIVE = os.environ.get('OLLAMA_KEEP_ALIVE', '30m').strip()
+KEEP_ALIVE = int(KEEP_ALIVE) if KEEP_ALIVE.lstrip('-').isdigit() else KEEP_ALIVE
+# Set OLLAMA_USE_LANGCHAIN=0 to render templates locally and call the ollama client directly,
+# skipping the langchain import and call overhead entirely
+USE_LANGCHAIN = os.environ.get('OLLAMA_USE_LANGCHAIN', '1').lower() not in ('0', 'false', 'no')
+# Set OLLAMA_PREFIX_CACHE=1 to put the role and style instructions before the question and send them
+# (and the fixed part of other templates) as the system prompt, so they are an identical prefix on every
+# request and Ollama reuses its evaluated KV cache instead of re-evaluating it. Off by default: it
+# replaces any SYSTEM prompt in the model's Modelfile and moves the style instruction, changing answers.
+PREFIX_CACHE = os.environ.get('OLLAMA_PREFIX_CACHE', '').lower() in ('1', 'true', 'yes')
+
+# Defaults shared by the query scripts, the batch scheduler and the API server. They live here rather
+# than in advanced_ollama so importing them does not load the interactive CLI.
+DEFAULT_MODEL = 'gemma3:12b'
+MAX_RETRIES = 3
+RETRY_DELAY = 2  # seconds
+REQUEST_TIMEOUT = 120  # seconds before a request is considered slow (interactive) or timed out (batch)
+MAX_PROMPT_LENGTH = 4000
+
+# Module state - one shared client and two LRU-ordered caches, all guarded by one lock
+_lock = threading.Lock()
+_client = None
+_llms = OrderedDict()  # model_name -> (llm, last_used)
+_chains = OrderedDict()  # (model_name, role, style, template) -> (chain, last_used)
+
+
+# Function to build the fixed preamble for a role and response style
+def build_prefix(role, style):
+    """
+    Returns the role and style instructions that precede every question with prefix caching, or ""
+    if there are none. All requests with the same role and style then share a prefix.
+    """
+    lines = []
+    if role:
+        lines.append(f"You are a {role}.")
+    # Handle "Normal" style by leaving the instruction out
+    if style and style.lower() != "normal":
+        lines.append(f"Please provide a {style} answer.")
+    return "\n".join(lines)
+
+
+# Function to build the role/style prompt template used by the query scripts
+def build_template(role, style, prefix_layout=None):
+    """
+    Builds the prompt template text for a role and response style.
+    The template has a single input variable, "question". With prefix caching (PREFIX_CACHE, or
+    prefix_layout=True) the role and style come first; otherwise the style instruction follows the question.
+    """
+    if PREFIX_CACHE if prefix_layout is None else prefix_layout:
+        prefix = build_prefix(role, style)
+        return f"{prefix}\n\nQuestion: {{question}}" if prefix else "Question: {question}"
+
+    # Handle "Normal" style by making it empty
+    style_instruction = f"Please provide a {style} answer." if style and style.lower() != "normal" else ""
+
+    # Build template based on whether role is provided
+    if role:
+        return f"""You are a {role}.
+
+Question: {{question}}
+
+{style_instruction}"""
+
+    return f"""Question: {{question}}
+
+{style_instruction}"""
+
+
+# Function to split a template into its fixed prefix and the part that changes per request
+def split_template(template):
+    """
+    Returns (prefix, rest), split at the last blank line before the first {variable}.
+    The prefix holds the instructions that are the same for every request made with the template;
+    it is "" if the template does not start with a separate block of instructions.
+    """
+    cut = template.rfind("\n\n", 0, template.find("{"))
+    if cut <= 0:
+        return "", template
+    return template[:cut].strip(), template[cut:].lstrip()
+
+
+# Function to render the full prompt text without going through langchain
+def render_prompt(role, style, question):
+    """Returns the role/style template filled in with the question, as sent to the model."""
+    return build_template(role, style).replace("{question}", question)
+
+
+# Function to render a request as (system prompt, prompt) for callers that use the client directly
+def render_request(role, style, question):
+    """
+    Returns the (system, prompt) pair a pooled chain would send for the question.
+    system is None when prefix caching is off or there is no role/style preamble.
+    """
+    system, template = split_template(build_template(role, style)) if PREFIX_CACHE else ("", build_template(role, style))
+    return system or None, template.replace("{question}", question)
+
+
+# Function to get the shared Ollama client
+def get_client():
+    """
+    Returns the shared client, a backend_pool.PooledClient standing in for ollama.Client.
+    It keeps one keep-alive HTTP connection pool per Ollama server, so every chain in the pool
+    talks to Ollama without opening a new connection per query, and spreads requests over the
+    servers in OLLAMA_HOSTS if several are set. It is instrumented, so calls inside a
+    metrics.track() block record Ollama's timing fields.
+    """
+    global _client
+    with _lock:
+        if _client is None:
+            import backend_pool
+            _client = metrics.instrument_client(backend_pool.PooledClient(backend_pool.get_pool()))
+        return _client
+
+
+# Function to get a cached LLM object for a model
+def get_llm(model_name):
+    """
+    Returns a cached LLM object for the given model, creating it on first use.
+    """
+    client = get_client()
+    with _lock:
+        _evict_idle(time.time())
+        if model_name in _llms:
+            llm, _ = _llms.pop(model_name)
+            _llms[model_name] = (llm, time.time())
+            return llm
+
+    # Import the correct class
+    try:
+        from langchain_ollama import OllamaLLM
+        llm = OllamaLLM(model=model_name, keep_alive=KEEP_ALIVE)
+        llm._client = client  # Share the keep-alive connection instead of the per-LLM one
+    except ImportError:
+        print("Warning: langchain_ollama package not found. Falling back to legacy implementation.")
+        from langchain_community.llms import Ollama
+        llm = Ollama(model=model_name, keep_alive=KEEP_ALIVE)
+
+    with _lock:
+        _llms[model_name] = (llm, time.time())
+    return llm
+
+
+# Function to get a cached, ready-to-run chain
+def get_chain(model_name, role=None, style=None, template=None):
+    """
+    Returns a cached prompt | llm chain keyed by (model, role, style).
+    If template is given it is used instead of the role/style template (and becomes part of the key).
+    """
+    key = (model_name, role, style, template)
+    with _lock:
+        _evict_idle(time.time())
+        if key in _chains:
+            chain, _ = _chains.pop(key)
+            _chains[key] = (chain, time.time())
+            return chain
+
+    template = template or build_template(role, style)
+    # With prefix caching the fixed prefix is sent as the system prompt and only the rest as the prompt
+    system, template = split_template(template) if PREFIX_CACHE else ("", template)
+
+    if USE_LANGCHAIN:
+        from langchain.prompts import PromptTemplate  # Deferred until the first chain is built
+        llm = get_llm(model_name)
+        if system:
+            llm = llm.bind(system=system)  # Passed through to ollama's generate()
+        prompt_template = PromptTemplate.from_template(template)
+
+        # Try using modern pipe syntax, but fall back to old chain method if needed
+        try:
+            chain = prompt_template | llm
+        except (AttributeError, TypeError):
+            from langchain.chains import LLMChain
+            chain = LLMChain(llm=llm, prompt=prompt_template)
+    else:
+        chain = DirectChain(model_name, template, system)
+
+    with _lock:
+        _chains[key] = (chain, time.time())
+        # Evict the least recently used chains if the pool is full
+        while len(_chains) > MAX_POOL_SIZE:
+            _chains.popitem(last=False)
+    return chain
+
+
+class DirectChain:
+    """
+    Drop-in replacement for a prompt | llm chain that calls the shared ollama client directly
+    (or the given client instead). Templates are filled in with plain string replacement of their
+    {variable} placeholders, which is all the templates in these scripts need. A system prompt,
+    if given, is sent with every request.
+    """
+
+    def __init__(self, model_name, template, system="", client=None):
+        self.model_name = model_name
+        self.template = template
+        self.system = system or None
+        self.client = client
+
+    def render(self, variables):
+        """Returns the template with each {name} replaced by variables[name]."""
+        prompt = self.template
+        for name, value in variables.items():
+            prompt = prompt.replace("{" + name + "}", str(value))
+        return prompt
+
+    def invoke(self, variables):
+        """Returns the full response text."""
+        response = (self.client or get_client()).generate(model=self.model_name, prompt=self.render(variables),
+                                                          system=self.system, keep_alive=KEEP_ALIVE)
+        return response.response
+
+    def stream(self, variables):
+        """Yields the response text as it is generated."""
+        for part in (self.client or get_client()).generate(model=self.model_name, prompt=self.render(variables),
+                                                           system=self.system, stream=True, keep_alive=KEEP_ALIVE):
+            yield part.response
+
+
+# Function to drop pool entries that have not been used recently
+def _evict_idle(now):
+    """Removes chains and LLMs idle for longer than IDLE_TIMEOUT. Caller must hold the lock."""
+    for cache in (_chains, _llms):
+        # Entries are kept in least-recently-used order, so stop at the first fresh one
+        while cache:
+            key, (_, last_used) = next(iter(cache.items()))
+            if now - last_used <= IDLE_TIMEOUT:
+                break
+            del cache[key]
+
+
+# Function to empty the pool
+def clear_pool():
+    """Drops all cached chains and LLMs and closes the shared client."""
+    global _client
+    with _lock:
+        _chains.clear()
+        _llms.clear()
+        if _client is not None:
+            _client.close()  # Close the underlying httpx connection pools
+            _client = None
@@ -0,0 +1,408 @@
+# Per-request metrics for the Ollama scripts
+# Every LLM call is wrapped in a metrics.track() block, which records where the time went:
+# queue time, model load, prompt evaluation, generation, retries, response-cache hits (exact or
+# semantic, with the time the semantic lookup took) and whether the request was coalesced with an
+# identical one already in flight.
+# The shared ollama clients are instrumented so the timing fields Ollama sends with its final
+# response part are captured even when the call goes through langchain, which discards them.
+#
+# Finished calls are written as one JSON object per line to OLLAMA_METRICS_LOG ("-" for stderr)
+# and added to in-process counters and histograms, which are served in Prometheus text format
+# on http://127.0.0.1:<OLLAMA_METRICS_PORT>/metrics when that variable is set.
+
+# Import statements
+import contextlib
+import contextvars
+import functools
+import json
+import os
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+
+# Constants
+METRICS_LOG = os.environ.get('OLLAMA_METRICS_LOG')  # JSONL log path, "-" for stderr; unset disables the log
+METRICS_PORT = int(os.environ.get('OLLAMA_METRICS_PORT') or 0)  # Prometheus endpoint port; 0 disables it
+METRICS_HOST = os.environ.get('OLLAMA_METRICS_HOST', '127.0.0.1')
+# Histogram buckets in seconds, from fast cache hits up to the slow-request threshold
+LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+# Ollama duration fields (nanoseconds) and the record fields they are reported as (seconds)
+OLLAMA_DURATIONS = {
+    'load_duration': 'load_s',
+    'prompt_eval_duration': 'prompt_eval_s',
+    'eval_duration': 'eval_s',
+    'total_duration': 'server_total_s',
+}
+# Record fields exported as Prometheus histograms, with their metric names
+HISTOGRAMS = {
+    'total_s': ('ollama_request_duration_seconds', 'Wall-clock time of a request, including queueing'),
+    'queue_s': ('ollama_queue_seconds', 'Time between a request being queued and being sent to Ollama'),
+    'ttft_s': ('ollama_time_to_first_token_seconds', 'Time from sending a request to its first token'),
+    'semantic_s': ('ollama_semantic_cache_lookup_seconds', 'Time spent embedding a question and searching the semantic cache'),
+    'load_s': ('ollama_load_seconds', 'Time Ollama spent loading the model'),
+    'prompt_eval_s': ('ollama_prompt_eval_seconds', 'Time Ollama spent evaluating the prompt'),
+    'eval_s': ('ollama_eval_seconds', 'Time Ollama spent generating the response'),
+}
+
+# The call being tracked in the current thread or asyncio task, and when its request was queued
+_current_call = contextvars.ContextVar('current_call', default=None)
+_queued_at = contextvars.ContextVar('queued_at', default=None)
+
+
+class CallMetrics:
+    """Measurements for one LLM call; filled in by track() and the instrumented client."""
+
+    def __init__(self, source, model_name, queued_at=None, **labels):
+        self.source = source
+        self.model_name = model_name
+        self.labels = labels  # Extra fields for the log record, e.g. stage="map"
+        self.started_at = time.time()
+        self.queued_at = queued_at if queued_at is not None else self.started_at
+        self.sent_at = None
+        self.first_token_at = None
+        self.ended_at = None
+        self.attempts = 0
+        self.retries = None  # Set by callers with their own retry loop; otherwise attempts - 1
+        self.cache = None  # "hit", "semantic", "miss" or "bypass" when the response cache was consulted
+        self.semantic_s = None  # Seconds spent on the semantic cache lookup, if one was made
+        self.similarity = None  # Cosine similarity of the closest cached question
+        self.coalesced = None  # True if served by an identical request in flight, False if it led one
+        self.status = None
+        self.error = None
+        self.ollama = {}  # Counts and durations from the final response part
+
+    def mark_sent(self):
+        """Called when a request (or a retry of it) is sent to Ollama."""
+        self.attempts += 1
+        if self.sent_at is None:
+            self.sent_at = time.time()
+
+    def mark_token(self):
+        """Called for every generated token; only the first one is timed."""
+        if self.first_token_at is None:
+            self.first_token_at = time.time()
+
+    def observe(self, response):
+        """Keeps the counts and durations of Ollama's final response part."""
+        for field in ('prompt_eval_count', 'eval_count', *OLLAMA_DURATIONS):
+            value = getattr(response, field, None)
+            if value is None and isinstance(response, dict):
+                value = response.get(field)
+            if value is not None:
+                self.ollama[field] = value
+
+    def fail(self, error, status='error'):
+        """Marks the call as failed (or cancelled) with an error message."""
+        self.status = status
+        self.error = str(error)
+
+    def record(self):
+        """Returns the call as a flat dictionary for the JSON log."""
+        ended_at = self.ended_at or time.time()
+        record = {
+            'ts': datetime.fromtimestamp(self.started_at, timezone.utc).isoformat(timespec='milliseconds'),
+            'source': self.source,
+            'model': self.model_name,
+            **self.labels,
+            'status': self.status or 'ok',
+            'error': self.error,
+            'cache': self.cache,
+            'similarity': round(self.similarity, 4) if self.similarity is not None else None,
+            'coalesced': self.coalesced,
+            'retries': self.retries if self.retries is not None else max(0, self.attempts - 1),
+            'total_s': _round(ended_at - self.queued_at),
+            'queue_s': _round(self.sent_at - self.queued_at) if self.sent_at else None,
+            'ttft_s': _round(self.first_token_at - self.sent_at) if self.first_token_at and self.sent_at else None,
+            'semantic_s': _round(self.semantic_s) if self.semantic_s is not None else None,
+            'prompt_eval_count': self.ollama.get('prompt_eval_count'),
+            'eval_count': self.ollama.get('eval_count'),
+        }
+        for field, name in OLLAMA_DURATIONS.items():
+            value = self.ollama.get(field)
+            record[name] = _round(value / 1e9) if value is not None else None
+        if record['eval_count'] and record['eval_s']:
+            record['tokens_per_sec'] = round(record['eval_count'] / record['eval_s'], 2)
+        else:
+            record['tokens_per_sec'] = None
+        return record
+
+
+def _round(value):
+    return round(value, 4)
+
+
+# Function to time one LLM call
+@contextlib.contextmanager
+def track(source, model_name, queued_at=None, **labels):
+    """
+    Context manager that measures one LLM call and records it when the block exits.
+    Requests made through an instrumented client inside the block are attributed to it.
+    Yields the CallMetrics, so callers can add cache results, retries or errors.
+    """
+    if queued_at is None:
+        queued_at = _queued_at.get()
+    call = CallMetrics(source, model_name, queued_at, **labels)
+    token = _current_call.set(call)
+    try:
+        yield call
+    except BaseException as e:
+        if call.status is None:
+            call.fail(str(e) or type(e).__name__)
+        raise
+    finally:
+        _current_call.reset(token)
+        call.ended_at = time.time()
+        get_registry().add(call)
+
+
+# Function to mark when the request handled in the current context was queued
+@contextlib.contextmanager
+def queued_since(timestamp):
+    """Calls tracked inside this block report queue time from timestamp instead of their own start."""
+    token = _queued_at.set(timestamp)
+    try:
+        yield
+    finally:
+        _queued_at.reset(token)
+
+
+# Function to get the call tracked in the current context
+def current_call():
+    """Returns the CallMetrics of the enclosing track() block, or None."""
+    return _current_call.get()
+
+
+# Function to compute a percentile of a list of numbers
+def percentile(values, pct):
+    """Returns the pct-th percentile (0-100) of values using linear interpolation, or None if empty."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * pct / 100
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+# Function to instrument an ollama client
+def instrument_client(client):
+    """
+    Wraps generate() and chat() of an ollama.Client or ollama.AsyncClient so that requests made
+    inside a track() block report when they were sent, their first token and Ollama's timing fields.
+    Returns the same client.
+    """
+    import inspect  # Deferred with the client itself, which is created on the first request
+    for name in ('generate', 'chat'):
+        method = getattr(client, name)
+        wrapper = _instrument_async(method) if inspect.iscoroutinefunction(method) else _instrument(method)
+        setattr(client, name, wrapper)
+    return client
+
+
+def _instrument(method):
+    @functools.wraps(method)
+    def wrapper(*args, **kwargs):
+        call = _current_call.get()
+        if call is None:
+            return method(*args, **kwargs)
+        call.mark_sent()
+        result = method(*args, **kwargs)
+        if kwargs.get('stream'):
+            return _observe_stream(result, call)
+        call.observe(result)
+        return result
+    return wrapper
+
+
+def _instrument_async(method):
+    @functools.wraps(method)
+    async def wrapper(*args, **kwargs):
+        call = _current_call.get()
+        if call is None:
+            return await method(*args, **kwargs)
+        call.mark_sent()
+        result = await method(*args, **kwargs)
+        if kwargs.get('stream'):
+            return _observe_async_stream(result, call)
+        call.observe(result)
+        return result
+    return wrapper
+
+
+def _observe_stream(parts, call):
+    for part in parts:
+        _observe_part(part, call)
+        yield part
+
+
+async def _observe_async_stream(parts, call):
+    async for part in parts:
+        _observe_part(part, call)
+        yield part
+
+
+def _observe_part(part, call):
+    message = getattr(part, 'message', None)
+    if getattr(part, 'response', None) or (message is not None and message.content):
+        call.mark_token()
+    if getattr(part, 'done', False):
+        call.observe(part)
+
+
+class MetricsRegistry:
+    """
+    In-process counters and histograms of finished calls, plus the JSON log writer.
+    Rendered in the Prometheus text exposition format by render().
+    """
+
+    def __init__(self, log_path=METRICS_LOG, buckets=LATENCY_BUCKETS):
+        self.log_path = log_path
+        self.buckets = buckets
+        self._counters = {}  # (metric name, labels) -> value
+        self._histograms = {}  # (metric name, labels) -> [bucket counts..., sum, count]
+        self._log_file = None
+        self._lock = threading.Lock()
+
+    def add(self, call):
+        """Records a finished call in the log and the aggregates."""
+        record = call.record()
+        labels = (('source', record['source']), ('model', record['model'] or ''),
+                  ('stage', record.get('stage') or ''))
+        with self._lock:
+            self._write_log(record)
+            self._inc('ollama_requests_total', labels + (('status', record['status']),))
+            if record['cache']:
+                self._inc('ollama_cache_lookups_total', labels + (('result', record['cache']),))
+            if record['coalesced']:
+                self._inc('ollama_coalesced_requests_total', labels)
+            if record['retries']:
+                self._inc('ollama_retries_total', labels, record['retries'])
+            if record['prompt_eval_count']:
+                self._inc('ollama_prompt_tokens_total', labels, record['prompt_eval_count'])
+            if record['eval_count']:
+                self._inc('ollama_generated_tokens_total', labels, record['eval_count'])
+            for field, (name, _) in HISTOGRAMS.items():
+                if record[field] is not None:
+                    self._observe(name, labels, record[field])
+
+    def render(self):
+        """Returns all metrics in the Prometheus text exposition format."""
+        help_texts = {
+            'ollama_requests_total': 'LLM calls by source, model, stage and status',
+            'ollama_cache_lookups_total': 'Response cache lookups by result',
+            'ollama_coalesced_requests_total': 'Requests served by an identical request already in flight',
+            'ollama_retries_total': 'Retried LLM requests',
+            'ollama_prompt_tokens_total': 'Prompt tokens evaluated by Ollama',
+            'ollama_generated_tokens_total': 'Tokens generated by Ollama',
+        }
+        lines = []
+        with self._lock:
+            for name, help_text in help_texts.items():
+                samples = [(labels, value) for (metric, labels), value in self._counters.items() if metric == name]
+                if samples:
+                    lines += [f'# HELP {name} {help_text}', f'# TYPE {name} counter']
+                    lines += [f'{name}{_labels(labels)} {value}' for labels, value in samples]
+            for name, help_text in HISTOGRAMS.values():
+                samples = [(labels, data) for (metric, labels), data in self._histograms.items() if metric == name]
+                if not samples:
+                    continue
+                lines += [f'# HELP {name} {help_text}', f'# TYPE {name} histogram']
+                for labels, data in samples:
+                    cumulative = 0
+                    for bound, count in zip(self.buckets, data):
+                        cumulative += count
+                        lines.append(f'{name}_bucket{_labels(labels + (("le", str(bound)),))} {cumulative}')
+                    lines.append(f'{name}_bucket{_labels(labels + (("le", "+Inf"),))} {data[-1]}')
+                    lines.append(f'{name}_sum{_labels(labels)} {data[-2]:.6f}')
+                    lines.append(f'{name}_count{_labels(labels)} {data[-1]}')
+        return '\n'.join(lines) + '\n'
+
+    def _inc(self, name, labels, amount=1):
+        key = (name, labels)
+        self._counters[key] = self._counters.get(key, 0) + amount
+
+    def _observe(self, name, labels, value):
+        data = self._histograms.setdefault((name, labels), [0] * len(self.buckets) + [0.0, 0])
+        for idx, bound in enumerate(self.buckets):
+            if value <= bound:
+                data[idx] += 1
+                break
+        data[-2] += value
+        data[-1] += 1
+
+    def _write_log(self, record):
+        if not self.log_path:
+            return
+        try:
+            if self._log_file is None:
+                self._log_file = sys.stderr if self.log_path == '-' else open(self.log_path, 'a', encoding='utf-8')
+            self._log_file.write(json.dumps(record) + '\n')
+            self._log_file.flush()
+        except OSError as e:
+            print(f'Warning: could not write metrics log {self.log_path}: {e}', file=sys.stderr)
+            self.log_path = None  # Do not retry (and warn) on every call
+
+
+def _labels(labels):
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in labels) + '}'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+# Shared registry and endpoint
+_registry = None
+_server = None
+_registry_lock = threading.Lock()
+
+
+def get_registry():
+    """Returns the process-wide MetricsRegistry, starting the Prometheus endpoint if OLLAMA_METRICS_PORT is set."""
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = MetricsRegistry()
+            if METRICS_PORT:
+                _start_server_locked(METRICS_PORT, METRICS_HOST)
+        return _registry
+
+
+# Function to serve the metrics over HTTP
+def start_server(port=METRICS_PORT, host=METRICS_HOST):
+    """Serves /metrics in Prometheus text format from a daemon thread and returns the server."""
+    get_registry()
+    with _registry_lock:
+        return _start_server_locked(port, host)
+
+
+def _start_server_locked(port, host):
+    global _server
+    if _server is None:
+        # Deferred: http.server takes longer to import than the rest of this module
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] != '/metrics':
+                    self.send_error(404)
+                    return
+                body = get_registry().render().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass  # Scrapes should not interleave with the scripts' console output
+
+        try:
+            _server = ThreadingHTTPServer((host, port), MetricsHandler)
+        except OSError as e:
+            print(f'Warning: could not start the metrics endpoint on {host}:{port}: {e}', file=sys.stderr)
+            return None
+        _server.daemon_threads = True
+        threading.Thread(target=_server.serve_forever, daemon=True).start()
+    return _server
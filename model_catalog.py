@@ -0,0 +1,166 @@
+# Cached catalog of the models available in the local Ollama installation
+# ollama.list() is cached for a short TTL and refreshed in the background, so choosing or
+# changing a model does not wait on the server every time. Along with the name, each entry
+# keeps the size, parameter count, quantization and digest reported by Ollama.
+
+# Import statements
+import threading
+import time
+from collections import namedtuple
+
+# Constants
+CATALOG_TTL = 30  # seconds before the cached model list is refreshed
+MAX_ATTEMPTS = 3  # attempts per refresh before giving up
+BACKOFF_BASE = 0.5  # seconds before the first retry; doubled after each failed attempt
+BACKOFF_MAX = 8  # seconds, upper limit for a single backoff delay
+FAILURE_BACKOFF = 15  # seconds after a failed refresh before lookups start another one
+
+# Information about one local model
+ModelInfo = namedtuple('ModelInfo', ['name', 'digest', 'size_bytes', 'parameter_size', 'quantization_level',
+                                     'family', 'modified_at'])
+
+
+# Function to format a byte count for display
+def format_size(size_bytes):
+    """Returns a byte count as a short human-readable string, e.g. "8.1 GB"."""
+    if not size_bytes:
+        return 'unknown size'
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if size_bytes < 1024 or unit == 'GB':
+            return f'{size_bytes:.1f} {unit}' if unit != 'B' else f'{size_bytes} B'
+        size_bytes /= 1024
+
+
+# Function to describe a model for a selection menu
+def describe_model(info):
+    """Returns "name (size, parameters, quantization)" for a ModelInfo."""
+    details = [format_size(info.size_bytes)]
+    if info.parameter_size:
+        details.append(f'{info.parameter_size} params')
+    if info.quantization_level:
+        details.append(info.quantization_level)
+    return f'{info.name} ({", ".join(details)})'
+
+
+class ModelCatalog:
+    """
+    Caches the model list from ollama.list().
+    get_models() serves the cached list while it is fresh, serves a stale list while a background
+    refresh runs, and only blocks when there is no list at all. Failed fetches are retried with
+    exponential backoff. Lookups by name (get(), digest()) never wait on a server that just failed:
+    they answer from the stale or empty list and leave retrying to a background refresh.
+    """
+
+    def __init__(self, ttl=CATALOG_TTL, max_attempts=MAX_ATTEMPTS, backoff_base=BACKOFF_BASE):
+        self.ttl = ttl
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.last_error = None
+        self._models = None
+        self._fetched_at = 0.0
+        self._failed_at = None  # When the last refresh gave up, if it has not succeeded since
+        self._lock = threading.Lock()
+        self._refresh_thread = None
+
+    def get_models(self, force_refresh=False):
+        """
+        Returns the list of ModelInfo for the local models.
+        Raises the last connection error if the list has never been fetched successfully.
+        """
+        # Let a refresh that is already running (e.g. started at program start) finish first
+        refresh_thread = self._refresh_thread
+        if self._models is None and refresh_thread is not None and refresh_thread.is_alive():
+            refresh_thread.join()
+        if force_refresh or self._models is None:
+            return self.refresh()
+        if time.time() - self._fetched_at > self.ttl:
+            self.refresh_in_background()
+        return self._models
+
+    def get(self, model_name):
+        """Returns the ModelInfo for model_name, or None if it is not installed (or the list is unavailable)."""
+        if self._models is None and self._failed_at is not None:
+            # The server was unreachable: do not block every cache lookup on another round of retries
+            self.refresh_in_background()
+            return None
+        try:
+            models = self.get_models()
+        except Exception:
+            return None
+        for info in models:
+            if info.name == model_name:
+                return info
+        return None
+
+    def digest(self, model_name):
+        """Returns the digest of model_name, or None if unknown."""
+        info = self.get(model_name)
+        return info.digest if info else None
+
+    def refresh(self):
+        """Fetches the model list now, retrying with exponential backoff, and returns it."""
+        delay = self.backoff_base
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                models = self._fetch()
+            except Exception as e:
+                self.last_error = e
+                if attempt == self.max_attempts:
+                    self._failed_at = time.time()
+                    raise
+                time.sleep(delay)
+                delay = min(delay * 2, BACKOFF_MAX)
+                continue
+            with self._lock:
+                self._models = models
+                self._fetched_at = time.time()
+                self._failed_at = None
+                self.last_error = None
+            return models
+
+    def refresh_in_background(self):
+        """Starts a background refresh unless one is already running or the last one failed within FAILURE_BACKOFF."""
+        with self._lock:
+            if self._refresh_thread is not None and self._refresh_thread.is_alive():
+                return
+            if self._failed_at is not None and time.time() - self._failed_at < FAILURE_BACKOFF:
+                return
+            self._refresh_thread = threading.Thread(target=self._background_refresh, daemon=True)
+            self._refresh_thread.start()
+
+    def _background_refresh(self):
+        try:
+            self.refresh()
+        except Exception:
+            pass  # Keep serving the previous list; the error is kept in last_error
+
+    def _fetch(self):
+        import llm_pool
+        response = llm_pool.get_client().list()  # Models of every server when several are configured
+        models = []
+        for model in response.models:
+            details = model.details
+            models.append(ModelInfo(
+                name=model.model,
+                digest=model.digest,
+                size_bytes=model.size,
+                parameter_size=details.parameter_size if details else None,
+                quantization_level=details.quantization_level if details else None,
+                family=details.family if details else None,
+                modified_at=model.modified_at,
+            ))
+        return models
+
+
+# Shared catalog used by the scripts
+_catalog = None
+_catalog_lock = threading.Lock()
+
+
+def get_catalog():
+    """Returns the process-wide ModelCatalog."""
+    global _catalog
+    with _catalog_lock:
+        if _catalog is None:
+            _catalog = ModelCatalog()
+        return _catalog
@@ -0,0 +1,82 @@
+# Model warm-up for the Ollama scripts
+# Loading model weights is the slowest part of a first query. A warm-up sends an empty prompt,
+# which makes Ollama load the model without generating anything, so the load can happen in the
+# background while the user is still choosing a role and response style.
+
+# Import statements
+import threading
+import time
+import llm_pool
+import metrics
+
+
+class Warmup:
+    """Background load of one model. The cold-load time is kept so it can be reported separately."""
+
+    def __init__(self, model_name, keep_alive):
+        self.model_name = model_name
+        self.keep_alive = keep_alive
+        self.load_seconds = None  # Time Ollama spent loading the weights (0 if already loaded)
+        self.total_seconds = None  # Wall-clock time of the warm-up request
+        self.error = None
+        self.reported = False
+        self.done = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        start_time = time.time()
+        try:
+            with metrics.track('model_warmup', self.model_name):
+                # An empty prompt loads the model (and applies keep_alive) without generating text
+                response = llm_pool.get_client().generate(model=self.model_name, prompt='', keep_alive=self.keep_alive)
+            self.total_seconds = time.time() - start_time
+            # load_duration is reported in nanoseconds
+            self.load_seconds = (response.load_duration or 0) / 1e9
+        except Exception as e:
+            self.error = str(e)
+        finally:
+            self.done.set()
+
+    def wait(self, timeout=None):
+        """Blocks until the warm-up has finished and returns the number of seconds spent waiting."""
+        start_time = time.time()
+        self.done.wait(timeout)
+        return time.time() - start_time
+
+    def describe(self):
+        """Short description of the warm-up result for the console."""
+        if not self.done.is_set():
+            return f'Model "{self.model_name}" is still loading.'
+        if self.error:
+            return f'Warm-up of model "{self.model_name}" failed: {self.error}'
+        if self.load_seconds < 0.5:
+            return f'Model "{self.model_name}" was already loaded (warm-up took {self.total_seconds:.2f} seconds).'
+        return f'Model "{self.model_name}" cold load took {self.load_seconds:.2f} seconds.'
+
+
+# Warm-ups by model name
+_warmups = {}
+_lock = threading.Lock()
+
+
+# Function to start loading a model in the background
+def start_warmup(model_name, keep_alive=None):
+    """
+    Starts loading model_name in a background thread and returns its Warmup.
+    A warm-up that is already running for the model is reused.
+    """
+    keep_alive = llm_pool.KEEP_ALIVE if keep_alive is None else keep_alive
+    with _lock:
+        warmup = _warmups.get(model_name)
+        if warmup is None or warmup.done.is_set():
+            warmup = Warmup(model_name, keep_alive)
+            _warmups[model_name] = warmup
+        return warmup
+
+
+# Function to look up the latest warm-up of a model
+def get_warmup(model_name):
+    """Returns the most recent Warmup started for model_name, or None."""
+    with _lock:
+        return _warmups.get(model_name)
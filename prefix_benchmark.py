@@ -0,0 +1,123 @@
+# Prompt prefix caching benchmark
+# Sends the same role/style questions in two prompt layouts and compares how many prompt tokens
+# Ollama had to evaluate, and how long that took:
+#   inline - the original template, with the style instruction after the question, all in one prompt
+#   prefix - role and style sent as the system prompt ahead of the question (OLLAMA_PREFIX_CACHE=1)
+# Ollama keeps the evaluated tokens of recent prompts in its KV cache and only evaluates what follows
+# the longest cached prefix, so the prefix layout should evaluate little more than the question.
+# With --stub the benchmark runs against the local fake server, which simulates that cache.
+
+# Import statements
+import argparse
+import json
+import os
+import sys
+import time
+import llm_pool
+
+# Constants
+DEFAULT_MODEL = 'gemma3:12b'
+DEFAULT_ROUNDS = 3  # passes over every (role, question) pair
+NUM_PREDICT = 16  # generated tokens per request; only prompt evaluation is being measured
+STUB_PROMPT_EVAL_DELAY = 0.002  # seconds per uncached prompt token on the fake server
+LAYOUTS = ['inline', 'prefix']
+# Long, fixed preambles like the ones users define for the query scripts
+ROLES = [
+    ('senior Python developer who reviews code for correctness, performance, readability and test coverage, '
+     'and explains every suggestion with a short example', 'Detailed'),
+    ('history teacher preparing material for secondary school students, who avoids jargon, '
+     'gives dates and places for every event and mentions one primary source', 'Outline-style'),
+]
+QUESTIONS = [
+    'What should I check first in a slow function?',
+    'How do I explain the causes of the First World War?',
+    'Why does the order of operations matter here?',
+    'What is a good way to summarize a long chapter?',
+]
+
+
+# Function to build the request for one question in a given layout
+def build_request(layout, role, style, question):
+    """Returns (system, prompt) for a layout; system is None for the inline layout."""
+    if layout == 'prefix':
+        return llm_pool.build_prefix(role, style), f'Question: {question}'
+    # The default template (OLLAMA_PREFIX_CACHE off): the style instruction follows the question
+    return None, llm_pool.build_template(role, style, prefix_layout=False).replace('{question}', question)
+
+
+# Function to run every question of the benchmark in one layout
+def run_layout(client, model_name, layout, rounds):
+    """Sends rounds x roles x questions requests and returns the totals Ollama reported."""
+    totals = {'layout': layout, 'requests': 0, 'errors': 0, 'prompt_eval_count': 0, 'prompt_eval_s': 0.0,
+              'total_s': 0.0}
+    # Questions with the same role are sent back to back, as in an interactive session
+    for _ in range(rounds):
+        for role, style in ROLES:
+            for question in QUESTIONS:
+                system, prompt = build_request(layout, role, style, question)
+                start_time = time.time()
+                try:
+                    response = client.generate(model=model_name, prompt=prompt, system=system,
+                                               options={'num_predict': NUM_PREDICT}, keep_alive=llm_pool.KEEP_ALIVE)
+                except Exception as e:
+                    print(f'Error ({layout}): {e}', file=sys.stderr)
+                    totals['errors'] += 1
+                    continue
+                totals['requests'] += 1
+                totals['total_s'] += time.time() - start_time
+                totals['prompt_eval_count'] += response.prompt_eval_count or 0
+                totals['prompt_eval_s'] += (response.prompt_eval_duration or 0) / 1e9
+    for field in ('prompt_eval_s', 'total_s'):
+        totals[field] = round(totals[field], 4)
+    return totals
+
+
+# Function to compare the layouts
+def run_benchmark(model_name, rounds=DEFAULT_ROUNDS, host=None):
+    """Runs both layouts after an untimed warm-up request and returns the report dictionary."""
+    import ollama
+    client = ollama.Client(host=host) if host else ollama.Client()
+    client.generate(model=model_name, prompt='', keep_alive=llm_pool.KEEP_ALIVE)  # Load the model first
+
+    results = {layout: run_layout(client, model_name, layout, rounds) for layout in LAYOUTS}
+    inline, prefix = results['inline'], results['prefix']
+    saved = {
+        'prompt_eval_count': inline['prompt_eval_count'] - prefix['prompt_eval_count'],
+        'prompt_eval_s': round(inline['prompt_eval_s'] - prefix['prompt_eval_s'], 4),
+    }
+    if inline['prompt_eval_count']:
+        saved['prompt_eval_count_pct'] = round(100 * saved['prompt_eval_count'] / inline['prompt_eval_count'], 1)
+    return {'model': model_name, 'rounds': rounds, 'results': list(results.values()), 'saved': saved}
+
+
+def main(argv=None):
+    """Command-line entry point."""
+    parser = argparse.ArgumentParser(description='Compare prompt evaluation with and without a cached system-prompt prefix.')
+    parser.add_argument('-m', '--model', help=f'Model to benchmark (default: {DEFAULT_MODEL}, or the stub model)')
+    parser.add_argument('-r', '--rounds', type=int, default=DEFAULT_ROUNDS, help='Passes over every role and question')
+    parser.add_argument('--host', default=None, help='Ollama server URL (default: OLLAMA_HOST or the local server)')
+    parser.add_argument('--stub', action='store_true', help='Run against an in-process fake Ollama server')
+    args = parser.parse_args(argv)
+
+    host = args.host
+    model_name = args.model
+    stub = None
+    if args.stub:
+        from fake_ollama_server import start_server, DEFAULT_MODELS as STUB_MODELS
+        stub = start_server(token_delay=0, prompt_eval_delay=STUB_PROMPT_EVAL_DELAY)
+        host = stub.url
+        model_name = model_name or STUB_MODELS[0]
+    model_name = model_name or DEFAULT_MODEL
+
+    try:
+        report = run_benchmark(model_name, args.rounds, host=host)
+    finally:
+        if stub is not None:
+            stub.shutdown()
+    report['host'] = host or os.environ.get('OLLAMA_HOST', 'default')
+    print(json.dumps(report, indent=2))
+    return 0 if all(result['errors'] == 0 for result in report['results']) else 2
+
+
+if __name__ == '__main__':
+    sys.exit(main())
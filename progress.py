@@ -0,0 +1,99 @@
+# Console progress reporter for long-running LLM calls
+# Replaces the old fire-and-forget spinner thread: the reporter thread is stopped with an Event
+# and joined, so no thread outlives the query that started it.
+
+# Import statements
+import sys
+import threading
+import time
+
+# Constants
+SPINNER_CHARS = ["-", "\\", "|", "/"]
+REFRESH_INTERVAL = 0.2  # seconds between spinner updates
+SLOW_RESPONSE_THRESHOLD = 120  # seconds before warning that processing is taking long
+
+
+class ProgressReporter:
+    """
+    Shows a spinner with elapsed time and the number of tokens received so far.
+    Use start() and stop() (or a with-block); feed streamed tokens in with on_token().
+    If stop_on_first_token is set, the spinner clears itself as soon as the first token
+    arrives so the caller can print the streamed text on a clean line.
+    """
+
+    def __init__(self, message="Processing", stop_on_first_token=False, output=None,
+                 slow_after=SLOW_RESPONSE_THRESHOLD):
+        self.message = message
+        self.slow_after = slow_after
+        self.stop_on_first_token = stop_on_first_token
+        self.output = output or sys.stdout
+        self.tokens = 0
+        self.start_time = None
+        self.first_token_time = None
+        self._stop_event = threading.Event()
+        self._write_lock = threading.Lock()
+        self._thread = None
+        self._line_length = 0
+
+    def start(self):
+        """Starts the spinner thread."""
+        self.start_time = time.time()
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def on_token(self, text=""):
+        """Records a received token; stops the spinner on the first one if requested."""
+        if not text:
+            return
+        self.tokens += 1
+        if self.first_token_time is None:
+            self.first_token_time = time.time()
+            if self.stop_on_first_token:
+                self.stop()
+
+    def stop(self):
+        """Stops the spinner thread, waits for it to exit and clears the progress line."""
+        if self._stop_event.is_set():
+            return
+        self._stop_event.set()
+        if self._thread and self._thread is not threading.current_thread():
+            self._thread.join()
+        self._thread = None
+        self._clear_line()
+
+    @property
+    def elapsed(self):
+        """Seconds since start() was called."""
+        return time.time() - self.start_time if self.start_time else 0.0
+
+    def _run(self):
+        i = 0
+        # wait() doubles as the refresh delay and returns as soon as stop() is called
+        while not self._stop_event.wait(REFRESH_INTERVAL if i else 0):
+            elapsed = self.elapsed
+            if elapsed > self.slow_after:
+                status = f"{self.message} is taking longer than expected... {elapsed:.0f}s"
+            else:
+                status = f"{self.message} {SPINNER_CHARS[i % len(SPINNER_CHARS)]} {elapsed:.1f}s"
+            if self.tokens:
+                status += f", {self.tokens} tokens received"
+            with self._write_lock:
+                if not self._stop_event.is_set():
+                    self.output.write(f"\r{status} ")
+                    self.output.flush()
+                    self._line_length = max(self._line_length, len(status) + 1)
+            i += 1
+
+    def _clear_line(self):
+        with self._write_lock:
+            self.output.write("\r" + " " * self._line_length + "\r")
+            self.output.flush()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+        return False
@@ -0,0 +1,192 @@
+# On-disk response cache for repeated prompts
+# Entries are content-addressed: the key is a hash of the model digest reported by ollama.list(),
+# the fully rendered prompt and the generation options. Re-pulling a model changes its digest,
+# so the old entries simply stop matching and age out through normal eviction.
+
+# Import statements
+import hashlib
+import json
+import os
+import threading
+import time
+import model_catalog
+
+# Constants
+CACHE_DIR = os.environ.get('OLLAMA_CACHE_DIR', os.path.join(os.path.expanduser('~'), '.cache', 'local_llms', 'responses'))
+MAX_CACHE_BYTES = 200 * 1024 * 1024  # Total size of cached responses before least recently used entries are evicted
+CACHE_TTL = 7 * 24 * 60 * 60  # seconds before a cached response expires
+CACHE_BYPASS = os.environ.get('OLLAMA_NO_CACHE', '').lower() in ('1', 'true', 'yes')
+
+
+class ResponseCache:
+    """
+    Size-bounded LRU cache of LLM responses stored as one JSON file per entry.
+    Recency is tracked with file modification times, so it survives restarts.
+    Counters for hits, misses, bypassed lookups, evictions and failed writes are kept in self.stats.
+    """
+
+    def __init__(self, cache_dir=CACHE_DIR, max_bytes=MAX_CACHE_BYTES, ttl=CACHE_TTL, bypass=CACHE_BYPASS):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.bypass = bypass
+        self.stats = {'hits': 0, 'misses': 0, 'bypassed': 0, 'evictions': 0, 'errors': 0}
+        self.last_error = None
+        self._lock = threading.Lock()
+        self._index = None  # path -> (size, last_used), loaded from disk on first use
+        self._total_bytes = 0
+
+    def get(self, model_name, prompt, options=None, bypass=False):
+        """Returns the cached response for (model, prompt, options), or None on a miss."""
+        if bypass or self.bypass:
+            with self._lock:
+                self.stats['bypassed'] += 1
+            return None
+
+        # Outside the lock: the digest may need a (slow) model list refresh
+        key = self.make_key(model_name, prompt, options)
+        with self._lock:
+            if key is None:
+                self.stats['misses'] += 1
+                return None
+            path = self._path(key)
+
+            self._load_index()
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    entry = json.load(f)
+            except (OSError, ValueError):
+                self.stats['misses'] += 1
+                return None
+            if not isinstance(entry, dict) or not isinstance(entry.get('response'), str):
+                self.stats['misses'] += 1  # Damaged entry: overwritten by the next put()
+                return None
+
+            # Expired entries are removed on access
+            if time.time() - entry.get('created', 0) > self.ttl:
+                self._remove(path)
+                self.stats['misses'] += 1
+                return None
+
+            # Mark as recently used for LRU eviction
+            now = time.time()
+            try:
+                os.utime(path, (now, now))
+            except OSError:
+                pass  # Read-only cache: recency is still tracked in memory
+            if path in self._index:
+                self._index[path] = (self._index[path][0], now)
+            self.stats['hits'] += 1
+            return entry['response']
+
+    def put(self, model_name, prompt, response, options=None, bypass=False):
+        """
+        Stores a response; entries are evicted in LRU order once the cache is over its size limit.
+        A failed write (e.g. a full or read-only cache directory) is counted in stats['errors'] and
+        kept in last_error; it never fails the caller, which already has its response.
+        """
+        if bypass or self.bypass:
+            return
+        entry = {'model': model_name, 'created': time.time(), 'response': response}
+
+        key = self.make_key(model_name, prompt, options)  # Outside the lock, like in get()
+        if key is None:
+            return  # Without a digest the entry could outlive the model it came from
+        with self._lock:
+            path = self._path(key)
+
+            self._load_index()
+            # Write to a temporary file first so readers never see a partial entry
+            temp_path = f'{path}.{os.getpid()}.tmp'
+            try:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                with open(temp_path, 'w', encoding='utf-8') as f:
+                    json.dump(entry, f)
+                os.replace(temp_path, path)
+            except OSError as e:
+                self.stats['errors'] += 1
+                self.last_error = str(e)
+                try:
+                    os.remove(temp_path)
+                except OSError:
+                    pass
+                return
+
+            if path in self._index:
+                self._total_bytes -= self._index[path][0]
+            size = os.path.getsize(path)
+            self._index[path] = (size, time.time())
+            self._total_bytes += size
+            self._evict()
+
+    def make_key(self, model_name, prompt, options=None):
+        """Returns the content hash for (model digest, prompt, options), or None if the digest is unknown."""
+        digest = self.model_digest(model_name)
+        if digest is None:
+            return None
+        payload = json.dumps({'digest': digest, 'prompt': prompt, 'options': options or {}}, sort_keys=True)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def model_digest(self, model_name):
+        """Returns the digest of a local model from the shared model catalog (a cached ollama.list())."""
+        return model_catalog.get_catalog().digest(model_name)
+
+    def clear(self):
+        """Removes every cached entry."""
+        with self._lock:
+            self._load_index()
+            for path in list(self._index):
+                self._remove(path)
+
+    def _path(self, key):
+        # Two-level layout keeps directories small
+        return os.path.join(self.cache_dir, key[:2], f'{key}.json')
+
+    def _load_index(self):
+        """Scans the cache directory once to learn entry sizes and recency. Caller must hold the lock."""
+        if self._index is not None:
+            return
+        self._index = {}
+        self._total_bytes = 0
+        if not os.path.isdir(self.cache_dir):
+            return
+        for sub_dir in os.scandir(self.cache_dir):
+            if not sub_dir.is_dir():
+                continue
+            for entry in os.scandir(sub_dir.path):
+                if entry.name.endswith('.json'):
+                    stat = entry.stat()
+                    self._index[entry.path] = (stat.st_size, stat.st_mtime)
+                    self._total_bytes += stat.st_size
+
+    def _evict(self):
+        """Removes least recently used entries until the cache fits in max_bytes. Caller must hold the lock."""
+        if self._total_bytes <= self.max_bytes:
+            return
+        for path, _ in sorted(self._index.items(), key=lambda item: item[1][1]):
+            if self._total_bytes <= self.max_bytes:
+                break
+            self._remove(path)
+            self.stats['evictions'] += 1
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        size, _ = self._index.pop(path, (0, 0))
+        self._total_bytes -= size
+
+
+# Shared cache instance used by the query and summarizer scripts
+_default_cache = None
+_default_lock = threading.Lock()
+
+
+def get_cache():
+    """Returns the process-wide ResponseCache."""
+    global _default_cache
+    with _default_lock:
+        if _default_cache is None:
+            _default_cache = ResponseCache()
+        return _default_cache
@@ -0,0 +1,208 @@
+# Concurrent request scheduler for batch prompts
+# Sends several prompts to the Ollama server at once (up to its OLLAMA_NUM_PARALLEL capacity)
+# using ollama.AsyncClient, while keeping memory bounded and returning results in input order.
+# With several servers (a comma-separated host, or OLLAMA_HOSTS) requests are spread over them
+# by backend_pool, so concurrency can be raised to the servers' combined capacity.
+# Identical records in flight at the same time are generated once and share the result.
+
+# Import statements
+import asyncio
+import time
+import ollama
+import llm_pool
+import metrics
+from backend_pool import AsyncPooledClient, get_pool, parse_hosts
+from coalesce import AsyncSingleFlight
+from llm_pool import DEFAULT_MODEL, MAX_RETRIES, RETRY_DELAY, REQUEST_TIMEOUT
+
+# Constants
+DEFAULT_CONCURRENCY = 4  # matches Ollama's default OLLAMA_NUM_PARALLEL on most machines
+DEFAULT_STYLE = 'Normal'
+_END = object()  # Returned by next() once the input is exhausted
+
+
+class RequestScheduler:
+    """
+    Runs prompt records through the LLM with bounded parallelism.
+
+    - concurrency: maximum number of requests in flight at once
+    - queue_size: maximum number of records read ahead of the slowest unfinished one
+      (backpressure, so a huge input is never fully buffered)
+    - timeout: per-attempt timeout in seconds
+    - max_retries / retry_delay: retry policy for failed or timed-out attempts
+    - coalesce: send identical records that are in flight at the same time only once. A record that
+      follows an identical one keeps its worker until that generation finishes, so heavy duplication
+      lowers the number of distinct requests in flight below concurrency
+    """
+
+    def __init__(self, concurrency=DEFAULT_CONCURRENCY, queue_size=None, timeout=REQUEST_TIMEOUT,
+                 max_retries=MAX_RETRIES, retry_delay=RETRY_DELAY, host=None, coalesce=True):
+        if concurrency < 1:
+            raise ValueError('concurrency must be at least 1')
+        self.concurrency = concurrency
+        self.queue_size = queue_size or concurrency * 4
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self.host = host
+        self.client = None
+        self.in_flight = AsyncSingleFlight() if coalesce else None
+
+    async def run(self, items, handler=None):
+        """
+        Asynchronously yields one result per item, in input order.
+        If iterating items raises, the error is raised here once the results of the items before it are yielded.
+        items may be any (lazy) iterable; it is read in a worker thread, so a slow input does not hold up
+        the requests in flight. handler is an async function mapping an item to a result and defaults
+        to execute(), which treats each item as a {model, role, style, prompt} record.
+        """
+        handler = handler or self.execute
+        work_queue = asyncio.Queue(maxsize=self.queue_size)
+        # Futures in input order; the bounded size caps how far reading can run ahead
+        ordered = asyncio.Queue(maxsize=self.queue_size)
+        self.client = metrics.instrument_client(AsyncPooledClient(get_pool(parse_hosts(self.host))))
+
+        async def produce():
+            loop = asyncio.get_running_loop()
+            iterator = iter(items)
+            try:
+                while True:
+                    # Read in a worker thread, so waiting on stdin or a slow file does not stall the workers
+                    item = await loop.run_in_executor(None, next, iterator, _END)
+                    if item is _END:
+                        break
+                    future = loop.create_future()
+                    await ordered.put(future)
+                    await work_queue.put((item, future, time.time()))
+            except Exception as e:
+                # The input failed (e.g. a bad line): run() re-raises the error after the results before it
+                future = loop.create_future()
+                future.set_exception(e)
+                await ordered.put(future)
+            await ordered.put(None)  # End marker
+            for _ in range(self.concurrency):
+                await work_queue.put(None)
+
+        async def work():
+            while True:
+                job = await work_queue.get()
+                if job is None:
+                    return
+                item, future, queued_at = job
+                try:
+                    # Time spent waiting for a free worker is reported as queue time
+                    with metrics.queued_since(queued_at):
+                        future.set_result(await handler(item))
+                except Exception as e:
+                    future.set_exception(e)
+
+        tasks = [asyncio.create_task(produce())]
+        tasks += [asyncio.create_task(work()) for _ in range(self.concurrency)]
+        try:
+            while True:
+                future = await ordered.get()
+                if future is None:
+                    break
+                yield await future
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            await self.client.aclose()  # Close the underlying httpx connection pools
+            self.client = None
+
+    async def execute(self, record):
+        """
+        Runs one {model, role, style, prompt} record with timeout and retries.
+        Returns a result dictionary with the response text plus latency and token-count fields.
+        """
+        model_name = record.get('model') or DEFAULT_MODEL
+        role = record.get('role') or None
+        style = record.get('style') or DEFAULT_STYLE
+        prompt_text = record['prompt']
+
+        result = {'model': model_name, 'role': role, 'style': style, 'prompt': prompt_text}
+        # Pass through any caller-supplied identifier so results can be matched to requests
+        for id_field in ('id', 'request_id'):
+            if id_field in record:
+                result[id_field] = record[id_field]
+
+        system, rendered = llm_pool.render_request(role, style, prompt_text)
+        start_time = time.time()
+        with metrics.track('scheduler', model_name) as call:
+            if self.in_flight is not None:
+                # A repeated record that is already being generated waits for that generation instead
+                flight, coalesced = self.in_flight.join((model_name, system, rendered),
+                                                        lambda flight: self._attempt(model_name, rendered, system))
+                attempt, stats, error = await flight.wait()
+            else:
+                coalesced = False
+                attempt, stats, error = await self._attempt(model_name, rendered, system)
+            call.coalesced = coalesced
+            call.retries = 0 if coalesced else attempt - 1
+            if error:
+                call.fail(error)
+
+        result['attempts'] = 0 if coalesced else attempt
+        result['coalesced'] = coalesced
+        if error:
+            result.update({'response': '', 'error': error, 'latency_s': round(time.time() - start_time, 4),
+                           'ttft_s': None, 'tokens': 0, 'tokens_per_sec': None})
+        else:
+            result.update(stats)
+            result['error'] = None
+            # Report latency including any failed attempts, as the caller experienced it
+            result['latency_s'] = round(time.time() - start_time, 4)
+        return result
+
+    async def _attempt(self, model_name, prompt, system=None):
+        """Generates a response with timeout and retries. Returns (attempts, stats, error)."""
+        stats = None
+        for attempt in range(1, self.max_retries + 1):
+            try:
+                stats = await asyncio.wait_for(self._generate(model_name, prompt, system), self.timeout)
+                return attempt, stats, None
+            except asyncio.TimeoutError:
+                error = f'Request timed out after {self.timeout} seconds'
+            except ollama.ResponseError as e:
+                error = str(e)
+                if e.status_code == 404:
+                    break  # Model not found - retrying will not help
+            except Exception as e:
+                error = str(e)
+            if attempt < self.max_retries:
+                await asyncio.sleep(self.retry_delay)
+        return attempt, stats, error
+
+    async def _generate(self, model_name, prompt, system=None):
+        """Streams one generation and returns the response text with timing statistics."""
+        start_time = time.time()
+        first_token_time = None
+        chunks = []
+        async for part in await self.client.generate(model=model_name, prompt=prompt, system=system, stream=True,
+                                                     keep_alive=llm_pool.KEEP_ALIVE):
+            if not part.response:
+                continue
+            if first_token_time is None:
+                first_token_time = time.time()
+            chunks.append(part.response)
+        end_time = time.time()
+
+        # Ollama streams one token per chunk, so chunks are counted as tokens
+        generation_time = end_time - first_token_time if first_token_time else 0.0
+        return {
+            'response': ''.join(chunks),
+            'ttft_s': round(first_token_time - start_time, 4) if first_token_time else None,
+            'tokens': len(chunks),
+            'tokens_per_sec': round(len(chunks) / generation_time, 2) if generation_time > 0 else None,
+        }
+
+
+# Function to run a list of records synchronously
+def run_all(records, **scheduler_options):
+    """Runs records through a RequestScheduler and returns the results as a list, in input order."""
+    async def collect():
+        scheduler = RequestScheduler(**scheduler_options)
+        return [result async for result in scheduler.run(records)]
+
+    return asyncio.run(collect())
@@ -0,0 +1,238 @@
+# Semantic response cache for paraphrased questions
+# The response cache only matches a prompt it has seen character for character. This cache embeds
+# each question with a local Ollama embedding model and, when a question asked before with the same
+# model, role and style is similar enough (cosine similarity of at least SIMILARITY_THRESHOLD),
+# returns that question's answer instead of generating a new one.
+#
+# Each (model digest, role, style) has its own index: a NumPy matrix of unit-length question vectors
+# searched with one matrix-vector product, stored on disk as a single .npz file. Indexes hold at most
+# MAX_ENTRIES questions (least recently used ones are dropped) and at most MAX_LOADED_INDEXES are kept
+# in memory. It is off by default: set OLLAMA_SEMANTIC_CACHE=1 and pull the embedding model
+# (ollama pull nomic-embed-text). numpy is imported on first use.
+
+# Import statements
+import hashlib
+import json
+import os
+import threading
+import time
+import zipfile
+from collections import OrderedDict, namedtuple
+import llm_pool
+import model_catalog
+
+# Constants
+SEMANTIC_CACHE = os.environ.get('OLLAMA_SEMANTIC_CACHE', '').lower() in ('1', 'true', 'yes')
+CACHE_DIR = os.environ.get('OLLAMA_SEMANTIC_CACHE_DIR',
+                           os.path.join(os.path.expanduser('~'), '.cache', 'local_llms', 'semantic'))
+EMBED_MODEL = os.environ.get('OLLAMA_EMBED_MODEL', 'nomic-embed-text')
+SIMILARITY_THRESHOLD = float(os.environ.get('OLLAMA_SEMANTIC_THRESHOLD') or 0.92)  # cosine similarity for a hit
+MAX_ENTRIES = 500  # questions kept per (model, role, style) index
+MAX_LOADED_INDEXES = 8  # indexes kept in memory; the rest are read from disk when needed
+CACHE_TTL = 7 * 24 * 60 * 60  # seconds before a cached answer expires, as in the response cache
+EMBED_RETRY_INTERVAL = 300  # seconds to stop embedding after the embedding model failed (e.g. not pulled)
+
+# Result of a lookup: the cached answer (None on a miss), the similarity of the closest cached
+# question, and the question's embedding, which put() reuses so a miss is only embedded once
+SemanticMatch = namedtuple('SemanticMatch', ['response', 'similarity', 'embedding'])
+MISS = SemanticMatch(None, None, None)
+
+
+class SemanticIndex:
+    """The cached questions of one (model, role, style): a matrix of their embeddings and their answers."""
+
+    def __init__(self, path, vectors=None, entries=None):
+        self.path = path
+        self.vectors = vectors  # float32 array, one unit-length row per entry
+        self.entries = entries or []  # {'question', 'response', 'created', 'last_used'} per row
+
+    def search(self, embedding, now, ttl):
+        """Returns (row, similarity) of the closest unexpired question, or (None, None)."""
+        if not self.entries or self.vectors is None or self.vectors.shape[1] != embedding.shape[0]:
+            return None, None  # Empty, or built with an embedding model of other dimensions (replaced by add())
+        import numpy as np
+        similarities = self.vectors @ embedding
+        expired = np.array([now - entry['created'] > ttl for entry in self.entries])
+        similarities[expired] = -1.0
+        row = int(np.argmax(similarities))
+        if expired[row]:
+            return None, None
+        return row, float(similarities[row])
+
+    def add(self, embedding, entry, max_entries):
+        """Appends an entry, dropping the least recently used ones beyond max_entries. Returns how many were dropped."""
+        import numpy as np
+        if self.vectors is None or not len(self.entries) or self.vectors.shape[1] != embedding.shape[0]:
+            # First entry, or the embedding model changed its dimensions: start over
+            self.vectors = np.empty((0, embedding.shape[0]), dtype=np.float32)
+            self.entries = []
+        self.vectors = np.vstack([self.vectors, embedding[None, :]])
+        self.entries.append(entry)
+        if len(self.entries) <= max_entries:
+            return 0
+        keep = sorted(range(len(self.entries)), key=lambda row: self.entries[row]['last_used'])[-max_entries:]
+        keep.sort()
+        dropped = len(self.entries) - len(keep)
+        self.vectors = self.vectors[keep]
+        self.entries = [self.entries[row] for row in keep]
+        return dropped
+
+    def save(self):
+        """Writes the index to its .npz file, through a temporary file so readers never see a partial one."""
+        import numpy as np
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        temp_path = f'{self.path}.{os.getpid()}.tmp'
+        with open(temp_path, 'wb') as f:
+            np.savez(f, vectors=self.vectors, entries=np.array(json.dumps(self.entries)))
+        os.replace(temp_path, self.path)
+
+    @classmethod
+    def load(cls, path):
+        """Reads an index from disk; a missing or unreadable file gives an empty index."""
+        import numpy as np
+        try:
+            with np.load(path, allow_pickle=False) as data:
+                return cls(path, data['vectors'].astype(np.float32), json.loads(str(data['entries'])))
+        except (OSError, ValueError, KeyError, zipfile.BadZipFile):
+            return cls(path)
+
+
+class SemanticCache:
+    """
+    Answers questions from earlier answers to similar questions.
+    Counters for hits, misses, bypassed lookups, evictions and embedding errors are kept in self.stats,
+    along with the total time spent on lookups.
+    """
+
+    def __init__(self, cache_dir=CACHE_DIR, embed_model=EMBED_MODEL, threshold=SIMILARITY_THRESHOLD,
+                 max_entries=MAX_ENTRIES, max_loaded=MAX_LOADED_INDEXES, ttl=CACHE_TTL, enabled=SEMANTIC_CACHE):
+        self.cache_dir = cache_dir
+        self.embed_model = embed_model
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.max_loaded = max_loaded
+        self.ttl = ttl
+        self.enabled = enabled
+        self.stats = {'hits': 0, 'misses': 0, 'bypassed': 0, 'evictions': 0, 'errors': 0, 'lookup_s': 0.0}
+        self.last_error = None
+        self._lock = threading.Lock()
+        self._indexes = OrderedDict()  # path -> SemanticIndex, least recently used first
+        self._embed_failed_at = None
+
+    def lookup(self, model_name, role, style, question, bypass=False):
+        """
+        Returns a SemanticMatch for the question. Its response is the cached answer to the most similar
+        earlier question if that reaches the threshold, and None otherwise.
+        """
+        if bypass or not self.enabled:
+            with self._lock:
+                self.stats['bypassed'] += 1
+            return MISS
+        start_time = time.time()
+        try:
+            path = self._path(model_name, role, style)
+            embedding = self.embed(question) if path is not None else None
+            if embedding is None:
+                with self._lock:
+                    self.stats['misses'] += 1
+                return MISS
+            with self._lock:
+                index = self._index(path)
+                now = time.time()
+                row, similarity = index.search(embedding, now, self.ttl)
+                if row is None or similarity < self.threshold:
+                    self.stats['misses'] += 1
+                    return SemanticMatch(None, similarity, embedding)
+                entry = index.entries[row]
+                entry['last_used'] = now  # Kept in memory; written with the next change to the index
+                self.stats['hits'] += 1
+                return SemanticMatch(entry['response'], similarity, embedding)
+        finally:
+            with self._lock:
+                self.stats['lookup_s'] += time.time() - start_time
+
+    def put(self, model_name, role, style, question, response, embedding=None, bypass=False):
+        """Stores an answer; embedding is the one returned by lookup(), if the question was looked up."""
+        if bypass or not self.enabled or not response:
+            return
+        path = self._path(model_name, role, style)
+        if path is None:
+            return  # Without a digest the entry could outlive the model it came from
+        if embedding is None:
+            embedding = self.embed(question)
+            if embedding is None:
+                return
+        now = time.time()
+        entry = {'question': question, 'response': response, 'created': now, 'last_used': now}
+        with self._lock:
+            index = self._index(path)
+            self.stats['evictions'] += index.add(embedding, entry, self.max_entries)
+            try:
+                index.save()
+            except OSError as e:
+                self.last_error = str(e)
+
+    def embed(self, text):
+        """Returns the unit-length embedding of text as a float32 array, or None if the embedding model failed."""
+        if self._embed_failed_at is not None and time.time() - self._embed_failed_at < EMBED_RETRY_INTERVAL:
+            return None
+        import numpy as np  # Deferred: only needed once the cache is enabled and used
+        try:
+            response = llm_pool.get_client().embed(model=self.embed_model, input=text, keep_alive=llm_pool.KEEP_ALIVE)
+        except Exception as e:
+            # Usually the embedding model has not been pulled; answer without the cache for a while
+            with self._lock:
+                self.stats['errors'] += 1
+                self.last_error = str(e)
+            self._embed_failed_at = time.time()
+            return None
+        self._embed_failed_at = None
+        vector = np.asarray(response.embeddings[0], dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def clear(self):
+        """Removes every cached answer."""
+        with self._lock:
+            self._indexes.clear()
+            if not os.path.isdir(self.cache_dir):
+                return
+            for entry in os.scandir(self.cache_dir):
+                if entry.name.endswith('.npz'):
+                    try:
+                        os.remove(entry.path)
+                    except OSError:
+                        pass
+
+    def _path(self, model_name, role, style):
+        """Returns the index file for (model, role, style), or None if the model's digest is unknown."""
+        digest = model_catalog.get_catalog().digest(model_name)
+        if digest is None:
+            return None
+        payload = json.dumps({'digest': digest, 'role': role, 'style': style, 'embed_model': self.embed_model},
+                             sort_keys=True)
+        return os.path.join(self.cache_dir, f'{hashlib.sha256(payload.encode("utf-8")).hexdigest()}.npz')
+
+    def _index(self, path):
+        """Returns the index stored at path, loading it and unloading the least recently used ones. Caller must hold the lock."""
+        if path in self._indexes:
+            self._indexes.move_to_end(path)
+            return self._indexes[path]
+        index = self._indexes[path] = SemanticIndex.load(path)
+        while len(self._indexes) > self.max_loaded:
+            self._indexes.popitem(last=False)  # Saved whenever it changed, so it can simply be dropped
+        return index
+
+
+# Shared cache instance used by the query scripts
+_default_cache = None
+_default_lock = threading.Lock()
+
+
+def get_cache():
+    """Returns the process-wide SemanticCache."""
+    global _default_cache
+    with _default_lock:
+        if _default_cache is None:
+            _default_cache = SemanticCache()
+        return _default_cache
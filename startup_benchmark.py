@@ -0,0 +1,105 @@
+# Startup time benchmark for the CLI and GUI entry points
+# Runs `python -X importtime -c "import <module>"` in fresh interpreters and checks the import
+# time of each entry point against a budget, so heavy imports (langchain, ollama) do not creep
+# back into module load. Exits with status 1 if any entry point is over budget.
+
+# Import statements
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+# Constants
+ENTRY_POINTS = ['advanced_ollama', 'basic_ollama', 'text_summarizer', 'batch_ollama']
+STARTUP_BUDGET_MS = 300  # Maximum median import time per entry point
+DEFAULT_RUNS = 5
+TOP_IMPORTS = 5  # Number of slowest imports to show per entry point
+
+
+# Function to measure one import of a module in a fresh interpreter
+def measure_import(module_name):
+    """
+    Imports module_name in a new Python process with -X importtime.
+    Returns (total microseconds, list of (cumulative microseconds, module) for its direct imports).
+    """
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module_name}'],
+        capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__))
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f'Importing {module_name} failed:\n{result.stderr.strip()}')
+
+    # Lines look like "import time:   self [us] | cumulative | imported package", with nested
+    # imports indented and listed before the module that imported them
+    imports = []
+    total = None
+    children = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        name = name[1:].rstrip()  # Drop the space after the separator, keep the indentation
+        if name.startswith('  ') and not name.startswith('    '):
+            children.append((int(cumulative), name.strip()))
+        elif not name.startswith(' '):
+            if name.strip() == module_name:
+                total = int(cumulative)
+                imports = children
+            children = []
+    return total, imports
+
+
+# Function to benchmark the startup of several entry points
+def run_benchmark(modules=ENTRY_POINTS, runs=DEFAULT_RUNS, budget_ms=STARTUP_BUDGET_MS):
+    """Returns one result dictionary per module with median/min/max import time in milliseconds."""
+    results = []
+    for module_name in modules:
+        totals = []
+        slowest = []
+        for _ in range(runs):
+            total, imports = measure_import(module_name)
+            totals.append(total / 1000)
+            slowest = imports
+        # Report the slowest direct imports of the entry point from the last run
+        top = sorted(((cumulative / 1000, name) for cumulative, name in slowest), reverse=True)[:TOP_IMPORTS]
+        median = statistics.median(totals)
+        results.append({
+            'module': module_name,
+            'median_ms': round(median, 1),
+            'min_ms': round(min(totals), 1),
+            'max_ms': round(max(totals), 1),
+            'budget_ms': budget_ms,
+            'within_budget': median <= budget_ms,
+            'slowest_imports': [{'module': name, 'ms': round(ms, 1)} for ms, name in top],
+        })
+    return results
+
+
+def main(argv=None):
+    """Command-line entry point."""
+    parser = argparse.ArgumentParser(description='Measure the import time of the entry-point scripts.')
+    parser.add_argument('modules', nargs='*', default=ENTRY_POINTS, help='Modules to measure')
+    parser.add_argument('-n', '--runs', type=int, default=DEFAULT_RUNS, help='Imports per module (median is reported)')
+    parser.add_argument('-b', '--budget', type=float, default=STARTUP_BUDGET_MS, help='Budget per module in milliseconds')
+    parser.add_argument('--json', action='store_true', help='Print results as JSON')
+    args = parser.parse_args(argv)
+
+    results = run_benchmark(args.modules, args.runs, args.budget)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        for result in results:
+            status = 'OK' if result['within_budget'] else 'OVER BUDGET'
+            print(f"{result['module']}: {result['median_ms']:.1f} ms median "
+                  f"(min {result['min_ms']:.1f}, max {result['max_ms']:.1f}, budget {result['budget_ms']:.0f}) - {status}")
+            for slow in result['slowest_imports']:
+                print(f"    {slow['ms']:8.1f} ms  {slow['module']}")
+
+    return 0 if all(result['within_budget'] for result in results) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,404 @@
+# Map-reduce summarization of text documents with the local LLM
+# Shared by the summarizer GUI (text_summarizer) and the API server. Kept free of GUI code so the
+# API server can summarize documents without tkinter installed.
+
+# Import statements
+import time  # For per-stage timing
+import hashlib  # For fingerprinting documents for the response cache
+import json  # For building the response cache key
+import itertools  # For stitching the first chunks back onto the lazy chunk stream
+import collections  # For the bounded queue of in-flight chunk summaries
+import threading  # For cancelling a summary
+import queue  # For handing tokens from a cancellable stream's helper thread
+import contextvars  # For keeping the metrics context on that helper thread
+from concurrent.futures import ThreadPoolExecutor  # For summarizing chunks in parallel
+import llm_pool  # Shared pool of ready-to-run LLM chains
+import response_cache  # On-disk cache of previous summaries
+import metrics  # Per-request timing and token metrics
+from text_chunking import (CHARS_PER_TOKEN, CHUNK_TOKENS, CHUNK_OVERLAP_TOKENS,  # Splitting documents into chunks
+                           READ_BLOCK_CHARS, iter_file_blocks, iter_chunks, split_into_chunks)
+
+# Model used for summarization
+SUMMARY_MODEL = "gemma3:12b"
+
+# Chunking settings for large documents are in text_chunking
+MAX_PARALLEL_CHUNKS = 4  # Number of chunk summaries requested from Ollama at the same time
+MAX_MAP_ROUNDS = 3  # Limit on re-summarizing partial summaries that are still too large
+
+
+# Raised when a summary is cancelled by the user
+class SummaryCancelled(Exception):
+    """Raised by summarize_text when its cancel_event is set"""
+
+
+# Cancel signal for one summary that also aborts its requests in flight
+class SummaryCancel(threading.Event):
+    """A threading.Event whose set() also aborts the summary's requests that are waiting for Ollama
+    
+    Checking the event between tokens cannot stop a request that has no tokens yet, e.g. while
+    Ollama evaluates a long prompt. Responses read through stream() are read on a helper thread,
+    so set() wakes their readers at once; it then closes the summary's own client (self.client),
+    which drops its connections, so Ollama, seeing the client gone, stops working on the requests.
+    """
+    
+    def __init__(self):
+        super().__init__()
+        self._lock = threading.Lock()
+        self._client = None
+        self._readers = set()  # Queues of the streams being read
+    
+    @property
+    def client(self):
+        """The summary's own client (a PooledClient, instrumented for metrics), created on first use"""
+        with self._lock:
+            if self._client is None:
+                import backend_pool
+                self._client = metrics.instrument_client(backend_pool.PooledClient(
+                    backend_pool.get_pool(), cancelled=self.is_set))
+            return self._client
+    
+    def stream(self, tokens):
+        """Yields the items of the iterator tokens, raising SummaryCancelled as soon as the event is set"""
+        if self.is_set():
+            raise SummaryCancelled()
+        items = queue.Queue()
+        with self._lock:
+            self._readers.add(items)
+        # The helper thread runs in this thread's context, so its requests are attributed to the tracked call
+        context = contextvars.copy_context()
+        threading.Thread(target=context.run, args=(_read_stream, tokens, items), daemon=True).start()
+        try:
+            while True:
+                kind, value = items.get()
+                if kind == "token":
+                    yield value
+                elif kind == "error":
+                    raise value
+                elif kind == "cancelled":
+                    raise SummaryCancelled()
+                else:
+                    return
+        finally:
+            with self._lock:
+                self._readers.discard(items)
+    
+    def set(self):
+        """Sets the event, wakes every stream being read and closes the summary's client"""
+        super().set()
+        with self._lock:
+            readers = list(self._readers)
+            client, self._client = self._client, None
+        for items in readers:
+            items.put(("cancelled", None))
+        if client is not None:
+            client.close()
+    
+    def close(self):
+        """Closes the summary's connections once it has finished"""
+        with self._lock:
+            client, self._client = self._client, None
+        if client is not None:
+            client.close()
+
+
+# Function to read a token stream into a queue (runs on a SummaryCancel helper thread)
+def _read_stream(tokens, items):
+    """Puts ("token", token) for each item of tokens, then ("done", None) or ("error", exception)"""
+    try:
+        for token in tokens:
+            items.put(("token", token))
+    except Exception as e:
+        items.put(("error", e))
+    else:
+        items.put(("done", None))
+    finally:
+        close = getattr(tokens, "close", None)
+        if close is not None:
+            close()  # Ends the HTTP response if the stream was left early
+
+
+# Prompt for a document that fits in a single request (and for the final reduce step)
+SUMMARY_PROMPT = (
+    "Read the following text and create a summary.\n"
+    "First, list the five most important points in the text as bullet points.\n"
+    "Then, write a more detailed summary paragraph (~250 words).\n\n"
+    "Text:\n"
+    "{input_text}\n\n"
+    "Summary:\n"
+    "- "  # Starting with a bullet point to guide the format
+)
+
+# Prompt for summarizing one chunk of a larger document (the map step)
+CHUNK_PROMPT = (
+    "The following text is one section of a longer document.\n"
+    "Summarize the key points of this section as concise bullet points.\n"
+    "Keep names, numbers and conclusions; do not add an introduction.\n\n"
+    "Section:\n"
+    "{input_text}\n\n"
+    "Key points:\n"
+    "- "
+)
+
+# Prompt for combining the chunk summaries into the final summary (the reduce step)
+REDUCE_PROMPT = (
+    "The following are summaries of consecutive sections of one document.\n"
+    "Combine them into a summary of the whole document.\n"
+    "First, list the five most important points in the document as bullet points.\n"
+    "Then, write a more detailed summary paragraph (~250 words).\n\n"
+    "Section summaries:\n"
+    "{input_text}\n\n"
+    "Summary:\n"
+    "- "
+)
+
+
+# Function to run one summarization prompt against the LLM
+def _run_prompt(template, text, on_token=None, cancel_event=None, queued_at=None):
+    """Streams text through the cached chain for the given prompt template and returns the response
+    
+    The response is streamed so that on_token can be called for every token and so that the
+    request can be aborted: leaving the stream early closes the HTTP response, which makes
+    Ollama stop generating. queued_at is when the request was submitted to the worker pool,
+    so the metrics include the time it waited for a free worker.
+    """
+    stage = {CHUNK_PROMPT: "map", REDUCE_PROMPT: "reduce"}.get(template, "summary")
+    with metrics.track("text_summarizer", SUMMARY_MODEL, queued_at=queued_at, stage=stage) as call:
+        if cancel_event is not None and cancel_event.is_set():
+            call.fail("cancelled", status="cancelled")
+            raise SummaryCancelled()
+        
+        if isinstance(cancel_event, SummaryCancel):
+            # Through the summary's own client, so cancelling can abort the request before its first token
+            system, body = llm_pool.split_template(template) if llm_pool.PREFIX_CACHE else ("", template)
+            chain = llm_pool.DirectChain(SUMMARY_MODEL, body, system, client=cancel_event.client)
+            tokens = cancel_event.stream(chain.stream({"input_text": text}))
+        else:
+            chain = llm_pool.get_chain(SUMMARY_MODEL, role="summarizer", template=template)
+            tokens = chain.stream({"input_text": text})
+        chunks = []
+        try:
+            for chunk in tokens:
+                if cancel_event is not None and cancel_event.is_set():
+                    raise SummaryCancelled()  # Closing the stream aborts the in-flight request
+                if chunk:
+                    chunks.append(chunk)
+                    if on_token is not None:
+                        on_token(chunk)
+        except Exception as e:
+            # A request aborted by closing its connection fails with a connection error
+            if cancel_event is not None and cancel_event.is_set():
+                call.fail("cancelled", status="cancelled")
+                raise SummaryCancelled() from (None if isinstance(e, SummaryCancelled) else e)
+            raise
+        return "".join(chunks)
+
+
+# Function to combine two optional token callbacks into one
+def _both(first, second):
+    """Returns a callback that calls both first and second (either may be None)"""
+    if first is None or second is None:
+        return first or second
+    
+    def callback(token):
+        first(token)
+        second(token)
+    return callback
+
+
+# Set up LLM query function to process text with the local LLM
+def summarize_text(text, timings=None, on_token=None, cancel_event=None, on_output=None, use_cache=True):
+    """Summarizes text using the local gemma3:12b LLM via Ollama
+    
+    Documents that fit in one chunk are summarized with a single request. Larger documents
+    are split into overlapping chunks, the chunks are summarized in parallel (map), and the
+    partial summaries are combined into the final bullet points + paragraph (reduce).
+    
+    Args:
+        text (str): The input text to be summarized
+        timings (dict, optional): If given, filled with per-stage timings in seconds
+            ("split", "map", "reduce") and the number of chunks ("chunks"); "trimmed" is True if the
+            partial summaries had to be shortened to fit the final request
+        on_token (callable, optional): Called with each generated token, possibly from worker threads
+        on_output (callable, optional): Called with each token of the final summary only (not the
+            intermediate chunk summaries), so the summary can be displayed as it is generated
+        cancel_event (threading.Event, optional): When set, the summary is aborted with SummaryCancelled
+        use_cache (bool, optional): Set to False to bypass the on-disk response cache
+        
+    Returns:
+        str: The generated summary from the LLM
+    """
+    document_hash = hashlib.sha256(text.encode("utf-8")).hexdigest()
+    return _cached_summary(
+        document_hash, lambda: _summarize_blocks([text], timings, on_token, cancel_event, on_output),
+        timings, on_output, use_cache
+    )
+
+
+# Function to summarize a text file without reading all of it into memory
+def summarize_file(file_path, timings=None, on_token=None, cancel_event=None, on_output=None, use_cache=True):
+    """Summarizes a text file, reading it block by block
+    
+    Takes the same optional arguments as summarize_text. Only the chunks currently being
+    summarized are held in memory, so very large files can be summarized.
+    
+    Args:
+        file_path (str): Path of the UTF-8 text file to summarize
+        
+    Returns:
+        str: The generated summary from the LLM
+    """
+    # Fingerprint the file contents (read in blocks) for the response cache
+    document_hash = hashlib.sha256()
+    with open(file_path, "rb") as file:
+        for block in iter(lambda: file.read(READ_BLOCK_CHARS), b""):
+            document_hash.update(block)
+    
+    return _cached_summary(
+        document_hash.hexdigest(),
+        lambda: _summarize_blocks(iter_file_blocks(file_path), timings, on_token, cancel_event, on_output),
+        timings, on_output, use_cache
+    )
+
+
+# Function to look a summary up in the response cache, generating and storing it on a miss
+def _cached_summary(document_hash, generate, timings, on_output, use_cache):
+    """Returns the cached summary for a document hash, or calls generate() and caches its result
+    
+    The cache key covers the document and everything else that shapes the summary
+    (prompts and chunking settings), so changing any of them invalidates old entries.
+    """
+    cache = response_cache.get_cache()
+    cache_prompt = json.dumps({
+        "document_sha256": document_hash,
+        "prompts": [SUMMARY_PROMPT, CHUNK_PROMPT, REDUCE_PROMPT],
+        "chunking": [CHARS_PER_TOKEN, CHUNK_TOKENS, CHUNK_OVERLAP_TOKENS],
+    })
+    
+    # The whole document is logged as one "document" request; the LLM calls made for it are
+    # logged separately as its map/reduce/summary stages
+    with metrics.track("text_summarizer", SUMMARY_MODEL, stage="document") as call:
+        summary = cache.get(SUMMARY_MODEL, cache_prompt, bypass=not use_cache)
+        if not use_cache or cache.bypass:
+            call.cache = "bypass"
+        else:
+            call.cache = "hit" if summary is not None else "miss"
+        if summary is not None:
+            if timings is not None:
+                timings.update(split=0.0, map=0.0, reduce=0.0, chunks=0, cached=True)
+            if on_output is not None:
+                on_output(summary)  # Display the cached summary just like a streamed one
+            return summary
+        
+        try:
+            summary = generate()
+        except SummaryCancelled:
+            call.fail("cancelled", status="cancelled")
+            raise
+        if summary:
+            cache.put(SUMMARY_MODEL, cache_prompt, summary, bypass=not use_cache)
+        return summary
+
+
+# Function to time how long a generator spends producing its items
+def _timed(iterable, timings, key):
+    """Yields the items of iterable, adding the time spent producing them to timings[key]"""
+    iterator = iter(iterable)
+    while True:
+        start_time = time.time()
+        item = next(iterator, None)
+        timings[key] += time.time() - start_time
+        if item is None:
+            return
+        yield item
+
+
+# Function to run the map-reduce pipeline over a stream of text blocks
+def _summarize_blocks(blocks, timings, on_token, cancel_event, on_output):
+    """Shared implementation of summarize_text and summarize_file"""
+    timings = timings if timings is not None else {}
+    timings.update(split=0.0, map=0.0, reduce=0.0, chunks=0)
+    
+    # Split stage - runs lazily, interleaved with the map stage
+    chunks = _timed(iter_chunks(blocks), timings, "split")
+    first_chunk = next(chunks, None)
+    second_chunk = next(chunks, None)
+    
+    # Small documents go straight to the LLM in a single request
+    if second_chunk is None:
+        timings["chunks"] = 1 if first_chunk else 0
+        start_time = time.time()
+        summary = _run_prompt(SUMMARY_PROMPT, first_chunk or "", _both(on_token, on_output), cancel_event)
+        timings["reduce"] = time.time() - start_time
+        return summary
+    
+    # Map stage - summarize the chunks in parallel; repeat on the partial summaries
+    # if together they are still too large for one request
+    start_time = time.time()
+    executor = ThreadPoolExecutor(max_workers=MAX_PARALLEL_CHUNKS)
+    try:
+        chunks = itertools.chain([first_chunk, second_chunk], chunks)
+        rounds = 0
+        while rounds < MAX_MAP_ROUNDS:
+            rounds += 1
+            partial_summaries = _map_chunks(executor, chunks, on_token, cancel_event)
+            if rounds == 1:
+                timings["chunks"] = len(partial_summaries)
+            combined = "\n\n".join(
+                f"Section {idx}:\n- {partial.strip()}" for idx, partial in enumerate(partial_summaries, 1)
+            )
+            chunks = split_into_chunks(combined)
+            if len(chunks) <= 1:
+                break
+        else:
+            # Still too large after MAX_MAP_ROUNDS: shorten every section to an equal share of one chunk,
+            # so the reduce request fits the context window (instead of Ollama silently cutting the
+            # prompt) and still covers the whole document
+            combined = _fit_sections(partial_summaries, CHUNK_TOKENS * CHARS_PER_TOKEN)
+            timings["trimmed"] = True
+    finally:
+        # Every chunk is done unless one failed; then the chunks not started yet are dropped, not waited for
+        executor.shutdown(wait=False, cancel_futures=True)
+    timings["map"] = time.time() - start_time - timings["split"]
+    
+    # Reduce stage - combine the partial summaries into the final format
+    start_time = time.time()
+    summary = _run_prompt(REDUCE_PROMPT, combined, _both(on_token, on_output), cancel_event)
+    timings["reduce"] = time.time() - start_time
+    
+    return summary
+
+
+# Function to shorten partial summaries so that together they fit in one request
+def _fit_sections(partial_summaries, max_chars):
+    """Returns the partial summaries as numbered sections of at most max_chars in total
+    
+    Each section is cut to the same share of max_chars, at a word boundary where possible.
+    """
+    sections = []
+    share = max_chars // len(partial_summaries)
+    for idx, partial in enumerate(partial_summaries, 1):
+        header = f"Section {idx}:\n- "
+        room = max(0, share - len(header) - 2)  # 2 for the blank line between sections
+        text = partial.strip()
+        if len(text) > room:
+            space = text.rfind(" ", 0, room)
+            text = text[:space if space > room // 2 else room]
+        sections.append(header + text)
+    return "\n\n".join(sections)[:max_chars]
+
+
+# Function to summarize chunks in parallel while keeping only a few of them in memory
+def _map_chunks(executor, chunks, on_token, cancel_event):
+    """Summarizes each chunk with CHUNK_PROMPT and returns the partial summaries in order
+    
+    At most 2 * MAX_PARALLEL_CHUNKS chunks are submitted ahead of the oldest unfinished one,
+    so a lazily read document is never fully buffered.
+    """
+    pending = collections.deque()
+    partial_summaries = []
+    for chunk in chunks:
+        pending.append(executor.submit(_run_prompt, CHUNK_PROMPT, chunk, on_token, cancel_event, time.time()))
+        if len(pending) >= MAX_PARALLEL_CHUNKS * 2:
+            partial_summaries.append(pending.popleft().result())
+    partial_summaries.extend(future.result() for future in pending)
+    return partial_summaries
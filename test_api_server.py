@@ -0,0 +1,98 @@
+# Tests for the HTTP service: /chat streams server-sent events, and a full queue is rejected with HTTP 503
+# Run with: python -m pytest test_api_server.py
+
+# Import statements
+import json
+import threading
+import time
+import httpx
+import pytest
+import api_server
+from fake_ollama_server import start_server, DEFAULT_MODELS
+
+# Constants
+MODEL = DEFAULT_MODELS[0]
+RESPONSE_TOKENS = 5
+
+
+@pytest.fixture
+def stub():
+    """A fake Ollama server that answers slowly enough for requests to overlap."""
+    server = start_server(token_delay=0.05, response_tokens=RESPONSE_TOKENS)
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def service(stub):
+    """Starts the service in front of the stub with one backend slot and one pending generation allowed."""
+    services = []
+
+    def start(**settings):
+        svc = api_server.start_server(ollama_host=stub.url, **{'concurrency': 1, 'max_pending': 1, **settings})
+        services.append(svc)
+        return svc
+    yield start
+    for svc in services:
+        svc.shutdown()
+
+
+def _chat(prompt, **fields):
+    return {'model': MODEL, 'prompt': prompt, 'use_cache': False, **fields}
+
+
+def test_chat_streams_server_sent_events(service):
+    svc = service()
+    events = []
+    with httpx.stream('POST', f'{svc.url}/chat', json=_chat('Why is the sky blue?', stream=True),
+                      timeout=10) as response:
+        assert response.status_code == 200
+        assert response.headers['content-type'] == 'text/event-stream'
+        for line in response.iter_lines():
+            if line.startswith('data: '):
+                events.append(json.loads(line[len('data: '):]))
+
+    *tokens, done = events
+    assert len(tokens) == RESPONSE_TOKENS
+    assert all('token' in event for event in tokens)
+    assert done['response'] == ''.join(event['token'] for event in tokens)
+    assert done['model'] == MODEL and not done['cached'] and not done['coalesced']
+
+
+def test_rejects_with_503_when_too_many_requests_are_pending(service):
+    svc = service()
+
+    # One generation running and one waiting for the backend slot fill the service
+    def occupy(prompt):
+        try:
+            httpx.post(f'{svc.url}/chat', json=_chat(prompt), timeout=10)
+        except httpx.HTTPError:
+            pass
+    threads = [threading.Thread(target=occupy, args=(prompt,), daemon=True) for prompt in ('First', 'Second')]
+    for thread in threads:
+        thread.start()
+    deadline = time.time() + 5
+    while len(svc.in_flight) < 2 and time.time() < deadline:
+        time.sleep(0.01)
+    assert len(svc.in_flight) == 2
+
+    response = httpx.post(f'{svc.url}/chat', json=_chat('Third'), timeout=10)
+    assert response.status_code == 503
+    assert response.headers['retry-after'] == '1'
+    assert svc.stats['rejected'] == 1
+
+    # An identical request joins a running generation instead, so it is not rejected
+    response = httpx.post(f'{svc.url}/chat', json=_chat('First'), timeout=10)
+    assert response.status_code == 200
+    for thread in threads:
+        thread.join(timeout=10)
+
+
+@pytest.mark.parametrize('field, value', [('style', 3), ('role', ['x']), ('model', {'name': MODEL})])
+def test_chat_rejects_fields_that_are_not_strings(service, field, value):
+    svc = service()
+    response = httpx.post(f'{svc.url}/chat', json=_chat('Why is the sky blue?', **{field: value}), timeout=10)
+    assert response.status_code == 400
+    assert response.json() == {'error': f'"{field}" must be a string'}
+    assert svc.stats['generations'] == 0
@@ -0,0 +1,117 @@
+# Tests for load balancing: requests fail over to another server only before their first stream part
+# Run with: python -m pytest test_backend_pool.py
+
+# Import statements
+import socket
+import threading
+import time
+import httpx
+import pytest
+from fake_ollama_server import start_server, DEFAULT_MODELS
+from backend_pool import BackendPool, PooledClient
+
+# Constants
+MODEL = DEFAULT_MODELS[0]
+
+
+class _StaticPool(BackendPool):
+    """A pool without background health checks, so each test decides which server is tried first."""
+
+    def start_health_checks(self):
+        pass
+
+
+@pytest.fixture
+def stubs():
+    """Starts fake Ollama servers on demand and shuts them all down after the test."""
+    servers = []
+
+    def start(**settings):
+        server = start_server(**{'token_delay': 0, 'response_tokens': 5, **settings})
+        servers.append(server)
+        return server
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def _closed_port_url():
+    """URL of a local port nothing is listening on."""
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        port = sock.getsockname()[1]
+    return f'http://127.0.0.1:{port}'
+
+
+def _pool(first, second):
+    """A pool of two servers that sends the next request to first (it has the model loaded)."""
+    pool = _StaticPool([first, second])
+    pool.backends[0].loaded.add(MODEL)
+    return pool
+
+
+def _generate(client):
+    return ''.join(part.response for part in client.generate(model=MODEL, prompt='Hello', stream=True))
+
+
+def test_fails_over_on_connection_error(stubs):
+    live = stubs()
+    pool = _pool(_closed_port_url(), live.url)
+    client = PooledClient(pool)
+    try:
+        assert _generate(client)
+    finally:
+        client.close()
+    dead_backend, live_backend = pool.backends
+    assert not dead_backend.healthy
+    assert dead_backend.failures == 1
+    assert live_backend.requests == 1 and live_backend.failures == 0
+    assert live.stats['requests'] == 1
+
+
+def test_fails_over_when_server_is_busy(stubs):
+    # One request running and one waiting fill the busy server, so the next one gets HTTP 503
+    busy = stubs(max_parallel=1, max_queue=1, token_delay=0.2)
+    idle = stubs()
+
+    def occupy():
+        try:
+            httpx.post(f'{busy.url}/api/generate', json={'model': MODEL, 'prompt': 'Hello'}, timeout=10)
+        except httpx.HTTPError:
+            pass
+    threads = [threading.Thread(target=occupy, daemon=True) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    deadline = time.time() + 5
+    while (busy.stats['requests'] < 1 or busy._waiting < 1) and time.time() < deadline:
+        time.sleep(0.01)
+
+    pool = _pool(busy.url, idle.url)
+    client = PooledClient(pool)
+    try:
+        assert _generate(client)
+    finally:
+        client.close()
+    assert busy.stats['rejected'] == 1
+    assert pool.backends[0].healthy  # Busy, not down
+    assert idle.stats['requests'] == 1
+    for thread in threads:
+        thread.join(timeout=10)  # Leaves no threads behind for the next test
+
+
+def test_no_failover_after_first_part(stubs):
+    flaky = stubs(failure_rate=1.0, failure_mode='disconnect', response_tokens=10)
+    other = stubs()
+    pool = _pool(flaky.url, other.url)
+    client = PooledClient(pool)
+    received = []
+    try:
+        with pytest.raises(Exception):
+            for part in client.generate(model=MODEL, prompt='Hello', stream=True):
+                received.append(part.response)
+    finally:
+        client.close()
+    assert received  # Part of the response arrived before the stream was cut off
+    assert other.stats['requests'] == 0  # So it was not sent again
+    assert pool.backends[0].failures == 1
@@ -0,0 +1,75 @@
+# Tests for batch mode: bad records get an error row and the records after them still run
+# Run with: python -m pytest test_batch_ollama.py
+
+# Import statements
+import io
+import json
+import pytest
+import scheduler
+from batch_ollama import run_batch
+from fake_ollama_server import start_server, DEFAULT_MODELS
+
+# Constants
+MODEL = DEFAULT_MODELS[0]
+
+
+@pytest.fixture
+def stub_server(monkeypatch):
+    """A fake Ollama server answering instantly, used as the only backend of the scheduler."""
+    server = start_server(token_delay=0, response_tokens=3)
+    monkeypatch.setenv('OLLAMA_HOSTS', server.url)
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def _run(lines, concurrency=2):
+    """Runs the JSONL lines as a batch. Returns (results, counts)."""
+    output_file = io.StringIO()
+    counts = run_batch(io.StringIO('\n'.join(lines) + '\n'), output_file, concurrency=concurrency)
+    return [json.loads(line) for line in output_file.getvalue().splitlines()], counts
+
+
+def test_mixed_good_and_bad_records(stub_server):
+    lines = [
+        json.dumps({'model': MODEL, 'prompt': 'First question', 'id': 'a'}),
+        json.dumps({'model': MODEL, 'prompt': 42}),
+        '{"model": "unterminated',
+        json.dumps(['not', 'an', 'object']),
+        json.dumps({'model': MODEL, 'prompt': '   '}),
+        json.dumps({'model': MODEL, 'prompt': 'Hello', 'style': 3}),
+        json.dumps({'model': MODEL, 'prompt': 'Hello', 'role': ['x']}),
+        json.dumps({'model': 7, 'prompt': 'Hello'}),
+        json.dumps({'model': MODEL, 'prompt': 'Last question', 'id': 'b'}),
+    ]
+    results, counts = _run(lines)
+
+    assert [result['line'] for result in results] == list(range(1, len(lines) + 1))
+    first, *bad, last = results
+    assert first['error'] is None and first['response'] and first['id'] == 'a'
+    assert last['error'] is None and last['response'] and last['id'] == 'b'
+    errors = [result['error'] for result in bad]
+    assert errors[1].startswith('Invalid JSON')
+    assert errors[:1] + errors[2:] == [
+        '"prompt" must be a string',
+        'Each line must be a JSON object',
+        'Missing "prompt" field',
+        '"style" must be a string',
+        '"role" must be a string',
+        '"model" must be a string',
+    ]
+    assert counts == {'total': len(lines), 'succeeded': 2, 'failed': len(lines) - 2, 'coalesced': 0}
+
+
+def test_unexpected_error_fails_only_its_record(stub_server, monkeypatch):
+    execute = scheduler.RequestScheduler.execute
+
+    async def fail_on_boom(self, record):
+        if record['prompt'] == 'boom':
+            raise RuntimeError('template exploded')
+        return await execute(self, record)
+    monkeypatch.setattr(scheduler.RequestScheduler, 'execute', fail_on_boom)
+
+    results, counts = _run([json.dumps({'model': MODEL, 'prompt': prompt}) for prompt in ('one', 'boom', 'two')])
+    assert [result['error'] for result in results] == [None, 'RuntimeError: template exploded', None]
+    assert counts['succeeded'] == 2 and counts['failed'] == 1
@@ -0,0 +1,135 @@
+# Tests for request coalescing: identical requests in flight share one generation, errors included
+# Run with: python -m pytest test_coalesce.py
+
+# Import statements
+import asyncio
+import threading
+import time
+import pytest
+from coalesce import SingleFlight, AsyncSingleFlight
+
+# Constants
+REQUESTS = 8
+TOKENS = ['The', ' quick', ' brown', ' fox']
+
+
+def _consume(streams):
+    """Reads every token stream on its own thread. Returns (texts, errors), one entry per stream."""
+    texts = [None] * len(streams)
+    errors = [None] * len(streams)
+
+    def read(index):
+        try:
+            texts[index] = ''.join(streams[index])
+        except Exception as e:
+            errors[index] = e
+
+    threads = [threading.Thread(target=read, args=(index,)) for index in range(len(streams))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=5)
+    return texts, errors
+
+
+def _wait_for(condition):
+    deadline = time.time() + 5
+    while not condition() and time.time() < deadline:
+        time.sleep(0.01)
+    assert condition()
+
+
+def test_identical_requests_share_one_upstream_call():
+    calls = []
+    release = threading.Event()
+
+    def produce():
+        calls.append(1)
+        release.wait(timeout=5)  # Still generating while the other requests arrive
+        yield from TOKENS
+
+    single_flight = SingleFlight()
+    leader, coalesced = single_flight.stream('key', produce)
+    assert not coalesced
+    leader_text = []
+    reader = threading.Thread(target=lambda: leader_text.append(''.join(leader)))
+    reader.start()
+    _wait_for(lambda: calls)  # The leader is generating
+
+    followers = [single_flight.stream('key', produce) for _ in range(REQUESTS - 1)]
+    assert all(coalesced for _, coalesced in followers)
+    release.set()
+    texts, errors = _consume([tokens for tokens, _ in followers])
+    reader.join(timeout=5)
+    assert len(calls) == 1
+    assert leader_text + texts == [''.join(TOKENS)] * REQUESTS
+    assert errors == [None] * (REQUESTS - 1)
+
+
+def test_leader_that_is_never_read_does_not_block_followers():
+    single_flight = SingleFlight()
+    unread, _ = single_flight.stream('key', lambda: iter(TOKENS))
+    closed, _ = single_flight.stream('key', lambda: iter(TOKENS))
+    closed.close()
+
+    tokens, coalesced = single_flight.stream('key', lambda: iter(TOKENS))
+    assert not coalesced
+    texts, errors = _consume([tokens])
+    assert texts == [''.join(TOKENS)] and errors == [None]
+    assert not single_flight._flights
+
+
+def test_error_is_passed_to_followers():
+    release = threading.Event()
+
+    def produce():
+        release.wait(timeout=5)
+        yield TOKENS[0]
+        raise RuntimeError('model crashed')
+
+    single_flight = SingleFlight()
+    streams = [single_flight.stream('key', produce)[0] for _ in range(REQUESTS)]
+    release.set()
+    _, errors = _consume(streams)
+    assert all(isinstance(error, RuntimeError) and str(error) == 'model crashed' for error in errors)
+
+    # The failed flight is gone, so the next identical request starts a new generation
+    _, coalesced = single_flight.stream('key', lambda: iter(TOKENS))
+    assert not coalesced
+
+
+def test_async_identical_requests_share_one_upstream_call():
+    calls = []
+
+    async def produce(flight):
+        calls.append(1)
+        for token in TOKENS:
+            await asyncio.sleep(0.01)
+            flight.push(token)
+
+    async def run():
+        single_flight = AsyncSingleFlight()
+        joined = [single_flight.join('key', produce) for _ in range(REQUESTS)]
+        assert [coalesced for _, coalesced in joined] == [False] + [True] * (REQUESTS - 1)
+        return await asyncio.gather(*(flight.wait() for flight, _ in joined))
+
+    assert asyncio.run(run()) == [''.join(TOKENS)] * REQUESTS
+    assert len(calls) == 1
+
+
+def test_async_error_is_passed_to_followers():
+    async def produce(flight):
+        flight.push(TOKENS[0])
+        await asyncio.sleep(0.01)
+        raise RuntimeError('model crashed')
+
+    async def run():
+        single_flight = AsyncSingleFlight()
+        leader, _ = single_flight.join('key', produce)
+        follower, coalesced = single_flight.join('key', produce)
+        assert coalesced and follower is leader
+        with pytest.raises(RuntimeError, match='model crashed'):
+            await follower.wait()
+        assert len(single_flight) == 0
+
+    asyncio.run(run())
@@ -0,0 +1,62 @@
+# Tests for the conversation memory: the token budget holds whether or not Ollama returns a context
+# Run with: python -m pytest test_conversation_memory.py
+
+# Import statements
+from types import SimpleNamespace
+from conversation_memory import ConversationMemory, CHARS_PER_TOKEN
+
+# Constants
+TOKEN_BUDGET = 50
+TURNS = 30
+
+
+def _final(context, prompt_eval_count=10, eval_count=10):
+    """A stand-in for the final (done) part of an Ollama response."""
+    return SimpleNamespace(context=context, prompt_eval_count=prompt_eval_count, eval_count=eval_count)
+
+
+def test_turns_without_context_stay_within_budget():
+    memory = ConversationMemory('stub-model:latest', 'Teacher', 'Normal', token_budget=TOKEN_BUDGET, summarize=False)
+    for i in range(TURNS):
+        memory.record(f'Question number {i} about something?', f'Answer number {i}, with a few more words.')
+        assert memory.history_tokens <= TOKEN_BUDGET
+
+    prompt = memory.build_prompt('And another question?')
+    # The preamble can hold at most the budget's worth of text, plus the role line and the new question
+    assert len(prompt) < TOKEN_BUDGET * CHARS_PER_TOKEN + 400
+    assert 'Question number 29' in prompt
+    assert 'Question number 0 ' not in prompt
+
+
+def test_turns_without_context_are_summarized():
+    memory = ConversationMemory('stub-model:latest', None, 'Normal', token_budget=TOKEN_BUDGET)
+    memory._summarize = lambda turns, client=None: 'Short summary.'
+    for i in range(TURNS):
+        memory.record(f'Question number {i}?', f'Answer number {i}.')
+    assert memory.summary == 'Short summary.'
+    assert memory.history_tokens <= TOKEN_BUDGET
+
+
+def test_context_budget_uses_context_length():
+    memory = ConversationMemory('stub-model:latest', None, 'Normal', token_budget=TOKEN_BUDGET, summarize=False)
+    memory.record('First question?', 'First answer.', _final(list(range(20))))
+    assert memory.context == list(range(20))
+    assert len(memory.turns) == 1
+
+    memory.record('Second question?', 'Second answer.', _final(list(range(TOKEN_BUDGET + 1))))
+    assert memory.context is None  # Compacted: the next request rebuilds the context from text
+    assert memory.history_tokens <= TOKEN_BUDGET
+
+
+def test_prefix_cache_sends_role_and_style_as_system(monkeypatch):
+    import llm_pool
+    monkeypatch.setattr(llm_pool, 'PREFIX_CACHE', True)
+    memory = ConversationMemory('stub-model:latest', 'Teacher', 'Concise', token_budget=TOKEN_BUDGET, summarize=False)
+    memory.record('First question?', 'First answer.')
+    system, prompt = memory.build_request('Second question?')
+    assert system == 'You are a Teacher.\nPlease provide a Concise answer.'
+    assert prompt.startswith('Recent conversation:') and prompt.endswith('Question: Second question?')
+
+    # With a context the history is already on the server; the system prompt is sent on every turn
+    memory.record('Second question?', 'Second answer.', _final(list(range(20))))
+    assert memory.build_request('Third question?') == (system, 'Question: Third question?')
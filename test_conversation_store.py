@@ -0,0 +1,41 @@
+# Tests for the conversation store: buffered turns reach the database without another append
+# Run with: python -m pytest test_conversation_store.py
+
+# Import statements
+import sqlite3
+import time
+from conversation_store import ConversationStore
+
+
+def _committed(path):
+    """Number of turns another connection can see, i.e. turns that were committed."""
+    with sqlite3.connect(path) as db:
+        return db.execute('SELECT COUNT(*) FROM turns').fetchone()[0]
+
+
+def test_flush_commits_buffered_turn(tmp_path):
+    store = ConversationStore(str(tmp_path / 'turns.sqlite3'), flush_interval=60)
+    store.append('stub-model:latest', None, 'Normal', 'Question?', 'Answer.')
+    assert _committed(store.path) == 0
+    store.flush()
+    assert _committed(store.path) == 1
+    store.close()
+
+
+def test_buffered_turn_is_written_after_flush_interval(tmp_path):
+    store = ConversationStore(str(tmp_path / 'turns.sqlite3'), flush_interval=0.2)
+    store.append('stub-model:latest', None, 'Normal', 'Question?', 'Answer.')
+    deadline = time.time() + 2
+    while _committed(store.path) == 0 and time.time() < deadline:
+        time.sleep(0.05)
+    assert _committed(store.path) == 1
+    store.close()
+
+
+def test_full_buffer_is_written_at_once(tmp_path):
+    store = ConversationStore(str(tmp_path / 'turns.sqlite3'), buffer_size=3, flush_interval=60)
+    for i in range(3):
+        store.append('stub-model:latest', None, 'Normal', f'Question {i}?', f'Answer {i}.')
+    assert _committed(store.path) == 3
+    assert store._timer is None
+    store.close()
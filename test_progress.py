@@ -0,0 +1,82 @@
+# Tests for the progress reporter: its thread is joined on stop, and repeated queries leave no threads behind
+# Run with: python -m pytest test_progress.py
+
+# Import statements
+import io
+import threading
+import time
+import pytest
+from fake_ollama_server import start_server, DEFAULT_MODELS
+from progress import ProgressReporter
+
+# Constants
+QUERIES = 100
+
+
+@pytest.fixture
+def stub_server(monkeypatch):
+    """A fake Ollama server answering instantly, used as the only backend of the shared client."""
+    import llm_pool
+    server = start_server(token_delay=0, response_tokens=3)
+    try:
+        monkeypatch.setenv('OLLAMA_HOST', server.url)
+        # Pooled chains call the client directly, so the test does not depend on langchain being installed
+        monkeypatch.setattr(llm_pool, 'USE_LANGCHAIN', False)
+        llm_pool.clear_pool()  # The shared client reads OLLAMA_HOST when it is created
+        yield server
+    finally:
+        llm_pool.clear_pool()
+        server.shutdown()
+        server.server_close()
+
+
+def test_stop_joins_thread():
+    reporter = ProgressReporter(output=io.StringIO()).start()
+    thread = reporter._thread
+    assert thread.is_alive()
+    reporter.stop()
+    assert not thread.is_alive()
+    assert reporter._thread is None
+
+
+def test_stop_is_idempotent_and_clears_line():
+    output = io.StringIO()
+    reporter = ProgressReporter(output=output).start()
+    time.sleep(0.05)
+    reporter.stop()
+    reporter.stop()
+    assert output.getvalue().endswith('\r')
+
+
+def test_stop_on_first_token_joins_thread():
+    reporter = ProgressReporter(output=io.StringIO(), stop_on_first_token=True).start()
+    thread = reporter._thread
+    reporter.on_token('Hello')
+    assert not thread.is_alive()
+    assert reporter.tokens == 1
+
+
+def test_context_manager_stops_thread():
+    with ProgressReporter(output=io.StringIO()) as reporter:
+        thread = reporter._thread
+        assert thread.is_alive()
+    assert not thread.is_alive()
+
+
+def test_thread_count_flat_after_queries(stub_server, capsys):
+    import advanced_ollama
+    model_name = DEFAULT_MODELS[0]
+    # The first query starts the long-lived helpers (model catalog refresh, HTTP connection pool)
+    advanced_ollama.send_query(model_name, None, 'Normal', 'warm-up question', use_cache=False)
+    time.sleep(0.2)
+    baseline = threading.active_count()
+
+    for i in range(QUERIES):
+        response = advanced_ollama.send_query(model_name, None, 'Normal', f'question {i}', use_cache=False)
+        assert not response.startswith('Error')
+
+    # Background catalog refreshes may still be finishing; they exit on their own
+    deadline = time.time() + 2
+    while threading.active_count() > baseline and time.time() < deadline:
+        time.sleep(0.05)
+    assert threading.active_count() == baseline
@@ -0,0 +1,66 @@
+# Tests for the on-disk response cache: hits, misses, expiry and unreadable entries
+# Run with: python -m pytest test_response_cache.py
+
+# Import statements
+import os
+import time
+import pytest
+from response_cache import ResponseCache
+
+# Constants
+MODEL = 'stub-model:latest'
+PROMPT = 'Question: Why is the sky blue?'
+
+
+@pytest.fixture
+def cache(tmp_path):
+    """A cache in a temporary directory, with a fixed model digest instead of asking Ollama for it."""
+    cache = ResponseCache(cache_dir=str(tmp_path / 'responses'), bypass=False)
+    cache.model_digest = lambda model_name: 'sha256:stub'
+    return cache
+
+
+def test_miss_then_hit(cache):
+    assert cache.get(MODEL, PROMPT) is None
+    cache.put(MODEL, PROMPT, 'Rayleigh scattering.')
+    assert cache.get(MODEL, PROMPT) == 'Rayleigh scattering.'
+    assert cache.get(MODEL, PROMPT, options={'temperature': 0}) is None  # Other options, other entry
+    assert cache.get(MODEL, 'Question: Why is grass green?') is None
+    assert cache.stats['hits'] == 1 and cache.stats['misses'] == 3
+
+
+def test_bypass_skips_lookup_and_store(cache):
+    cache.put(MODEL, PROMPT, 'Rayleigh scattering.', bypass=True)
+    assert cache.get(MODEL, PROMPT) is None
+    cache.put(MODEL, PROMPT, 'Rayleigh scattering.')
+    assert cache.get(MODEL, PROMPT, bypass=True) is None
+    assert cache.stats['bypassed'] == 1
+
+
+def test_expired_entry_is_a_miss_and_removed(cache):
+    cache.ttl = 0.05
+    cache.put(MODEL, PROMPT, 'Rayleigh scattering.')
+    path = cache._path(cache.make_key(MODEL, PROMPT))
+    assert os.path.exists(path)
+    time.sleep(0.1)
+    assert cache.get(MODEL, PROMPT) is None
+    assert not os.path.exists(path)
+
+
+@pytest.mark.parametrize('contents', [b'{"created": 1, "resp', b'\x00\xff garbage', b'[]', b'{"created": 1}'])
+def test_corrupt_entry_is_a_miss(cache, contents):
+    cache.put(MODEL, PROMPT, 'Rayleigh scattering.')
+    path = cache._path(cache.make_key(MODEL, PROMPT))
+    with open(path, 'wb') as f:
+        f.write(contents)
+    assert cache.get(MODEL, PROMPT) is None
+
+    # The entry can be written again afterwards
+    cache.put(MODEL, PROMPT, 'Rayleigh scattering.')
+    assert cache.get(MODEL, PROMPT) == 'Rayleigh scattering.'
+
+
+def test_unknown_digest_is_not_cached(cache):
+    cache.model_digest = lambda model_name: None
+    cache.put(MODEL, PROMPT, 'Rayleigh scattering.')
+    assert cache.get(MODEL, PROMPT) is None
@@ -0,0 +1,96 @@
+# Tests for the request scheduler: results in input order, bounded parallelism and bounded read-ahead
+# Run with: python -m pytest test_scheduler.py
+
+# Import statements
+import asyncio
+import pytest
+from fake_ollama_server import start_server, DEFAULT_MODELS
+from scheduler import RequestScheduler, run_all
+
+# Constants
+ITEMS = 20
+CONCURRENCY = 4
+
+
+def _run(scheduler, items, handler):
+    async def collect():
+        return [result async for result in scheduler.run(items, handler=handler)]
+    return asyncio.run(collect())
+
+
+def test_results_in_input_order_with_bounded_parallelism():
+    running = 0
+    peak = 0
+
+    async def handle(item):
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.001 * (ITEMS - item % 7))  # Later items often finish first
+        running -= 1
+        return item * 10
+
+    results = _run(RequestScheduler(concurrency=CONCURRENCY), range(ITEMS), handle)
+    assert results == [item * 10 for item in range(ITEMS)]
+    assert peak == CONCURRENCY
+
+
+def test_reading_stops_at_the_queue_bound():
+    queue_size = 6
+    read = []
+
+    def items():
+        for item in range(100):
+            read.append(item)
+            yield item
+
+    async def handle(item):
+        # The first item is slow, so every other result has to wait for it to be yielded
+        await asyncio.sleep(0.3 if item == 0 else 0)
+        return item
+
+    async def collect():
+        scheduler = RequestScheduler(concurrency=2, queue_size=queue_size)
+        results = []
+        async for result in scheduler.run(items(), handler=handle):
+            if not results:
+                # While item 0 ran, reading stopped at the bound: the queued futures, the one being
+                # awaited and the item read but not yet queued
+                assert queue_size <= len(read) <= queue_size + 2
+            results.append(result)
+        return results
+
+    assert asyncio.run(collect()) == list(range(100))
+
+
+def test_input_error_is_raised_after_the_results_before_it():
+    def items():
+        yield from range(3)
+        raise ValueError('bad line')
+
+    async def handle(item):
+        return item
+
+    async def collect():
+        results = []
+        with pytest.raises(ValueError, match='bad line'):
+            async for result in RequestScheduler(concurrency=2).run(items(), handler=handle):
+                results.append(result)
+        return results
+
+    assert asyncio.run(collect()) == [0, 1, 2]
+
+
+def test_records_against_fake_server(monkeypatch):
+    server = start_server(token_delay=0.01, response_tokens=3)
+    try:
+        monkeypatch.setenv('OLLAMA_HOSTS', server.url)
+        records = [{'model': DEFAULT_MODELS[0], 'prompt': f'Question {index}', 'id': index} for index in range(ITEMS)]
+        results = run_all(records, concurrency=CONCURRENCY)
+    finally:
+        server.shutdown()
+        server.server_close()
+    assert [result['id'] for result in results] == list(range(ITEMS))
+    assert all(result['error'] is None and result['tokens'] == 3 for result in results)
+    assert server.stats['requests'] == ITEMS
+    assert 1 < server.stats['max_active'] <= CONCURRENCY
@@ -0,0 +1,80 @@
+# Tests for the semantic response cache: similar questions hit, others miss, old and damaged entries do not
+# Run with: python -m pytest test_semantic_cache.py
+
+# Import statements
+import os
+import time
+from types import SimpleNamespace
+import numpy as np
+import pytest
+import model_catalog
+from semantic_cache import SemanticCache
+
+# Constants
+MODEL = 'stub-model:latest'
+# Stand-in embeddings: the paraphrase is close to the question, the other question is not
+VECTORS = {
+    'Why is the sky blue?': [1.0, 0.0, 0.0],
+    'What makes the sky look blue?': [0.98, 0.2, 0.0],
+    'How do magnets work?': [0.0, 0.0, 1.0],
+}
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    """An enabled cache in a temporary directory, with fixed embeddings and a fixed model digest."""
+    monkeypatch.setattr(model_catalog, 'get_catalog', lambda: SimpleNamespace(digest=lambda model_name: 'sha256:stub'))
+    cache = SemanticCache(cache_dir=str(tmp_path / 'semantic'), threshold=0.9, enabled=True)
+
+    def embed(text):
+        vector = np.asarray(VECTORS[text], dtype=np.float32)
+        return vector / np.linalg.norm(vector)
+    cache.embed = embed
+    return cache
+
+
+def test_similar_question_hits(cache):
+    assert cache.lookup(MODEL, 'Teacher', 'Normal', 'Why is the sky blue?').response is None
+    cache.put(MODEL, 'Teacher', 'Normal', 'Why is the sky blue?', 'Rayleigh scattering.')
+
+    match = cache.lookup(MODEL, 'Teacher', 'Normal', 'What makes the sky look blue?')
+    assert match.response == 'Rayleigh scattering.'
+    assert match.similarity > 0.9
+    assert cache.lookup(MODEL, 'Teacher', 'Normal', 'How do magnets work?').response is None
+    # Another role has its own index
+    assert cache.lookup(MODEL, 'Historian', 'Normal', 'Why is the sky blue?').response is None
+    assert cache.stats['hits'] == 1
+
+
+def test_entries_survive_a_new_cache_instance(cache):
+    cache.put(MODEL, 'Teacher', 'Normal', 'Why is the sky blue?', 'Rayleigh scattering.')
+    reopened = SemanticCache(cache_dir=cache.cache_dir, threshold=0.9, enabled=True)
+    reopened.embed = cache.embed
+    assert reopened.lookup(MODEL, 'Teacher', 'Normal', 'Why is the sky blue?').response == 'Rayleigh scattering.'
+
+
+def test_expired_entry_misses(cache):
+    cache.ttl = 0.05
+    cache.put(MODEL, 'Teacher', 'Normal', 'Why is the sky blue?', 'Rayleigh scattering.')
+    time.sleep(0.1)
+    assert cache.lookup(MODEL, 'Teacher', 'Normal', 'Why is the sky blue?').response is None
+
+
+def test_corrupt_index_file_is_treated_as_empty(cache):
+    cache.put(MODEL, 'Teacher', 'Normal', 'Why is the sky blue?', 'Rayleigh scattering.')
+    path = cache._path(MODEL, 'Teacher', 'Normal')
+    assert os.path.exists(path)
+    with open(path, 'wb') as f:
+        f.write(b'not a zip file')
+    cache._indexes.clear()  # Read it from disk again
+
+    assert cache.lookup(MODEL, 'Teacher', 'Normal', 'Why is the sky blue?').response is None
+    cache.put(MODEL, 'Teacher', 'Normal', 'Why is the sky blue?', 'Rayleigh scattering.')
+    assert cache.lookup(MODEL, 'Teacher', 'Normal', 'Why is the sky blue?').response == 'Rayleigh scattering.'
+
+
+def test_disabled_cache_is_bypassed(cache):
+    cache.enabled = False
+    cache.put(MODEL, 'Teacher', 'Normal', 'Why is the sky blue?', 'Rayleigh scattering.')
+    assert cache.lookup(MODEL, 'Teacher', 'Normal', 'Why is the sky blue?').response is None
+    assert cache.stats['bypassed'] == 1
@@ -0,0 +1,86 @@
+# Tests for document chunking and the map-reduce summarizer: chunk bounds, and the final request's size
+# Run with: python -m pytest test_summarizer.py
+
+# Import statements
+import summarizer
+from text_chunking import CHARS_PER_TOKEN, CHUNK_TOKENS, iter_chunks, split_into_chunks
+
+# Constants
+MAX_TOKENS = 50
+OVERLAP_TOKENS = 10
+MAX_CHARS = CHUNK_TOKENS * CHARS_PER_TOKEN
+WORDS = ' '.join(f'word{index}' for index in range(2000))
+
+
+def test_chunks_are_bounded_overlapping_and_cover_the_text():
+    chunks = split_into_chunks(WORDS, MAX_TOKENS, OVERLAP_TOKENS)
+    assert len(chunks) > 1
+    assert all(len(chunk) <= MAX_TOKENS * CHARS_PER_TOKEN for chunk in chunks)
+    # Chunks start at a word and the next one repeats the end of the previous one
+    words = set(WORDS.split())
+    assert all(chunk.split()[0] in words for chunk in chunks)
+    for previous, chunk in zip(chunks, chunks[1:]):
+        assert chunk.split()[0] in previous.split()
+    assert chunks[0].split()[0] == 'word0' and chunks[-1].split()[-1] == 'word1999'
+    assert set(' '.join(chunks).split()) == words
+
+
+def test_chunks_do_not_depend_on_how_the_text_is_read():
+    blocks = [WORDS[start:start + 333] for start in range(0, len(WORDS), 333)]
+    assert list(iter_chunks(blocks, MAX_TOKENS, OVERLAP_TOKENS)) == split_into_chunks(WORDS, MAX_TOKENS, OVERLAP_TOKENS)
+
+
+def test_short_text_is_one_chunk():
+    assert split_into_chunks('Just one sentence.', MAX_TOKENS, OVERLAP_TOKENS) == ['Just one sentence.']
+    assert split_into_chunks('   ', MAX_TOKENS, OVERLAP_TOKENS) == []
+
+
+def _summarize(monkeypatch, partial_chars):
+    """
+    Summarizes a document of several chunks with the LLM replaced by partial summaries of partial_chars
+    characters. Returns (requests, timings), with the (template, text) of every request in order.
+    """
+    requests = []
+
+    def run_prompt(template, text, on_token=None, cancel_event=None, queued_at=None):
+        requests.append((template, text))
+        return 'x ' * (partial_chars // 2) if template == summarizer.CHUNK_PROMPT else 'Summary'
+    monkeypatch.setattr(summarizer, '_run_prompt', run_prompt)
+
+    timings = {}
+    text = ' '.join(f'word{index}' for index in range(MAX_CHARS // 2))
+    assert summarizer._summarize_blocks([text], timings, None, None, None) == 'Summary'
+    return requests, timings
+
+
+def _rounds(requests):
+    """The chunk requests of each map round: a round starts with the document's (or the sections') start."""
+    rounds = []
+    for template, text in requests:
+        if template == summarizer.CHUNK_PROMPT:
+            if text.startswith(('word0 ', 'Section 1:')):
+                rounds.append([])
+            rounds[-1].append(text)
+    return rounds
+
+
+def test_partial_summaries_are_reduced_in_rounds(monkeypatch):
+    requests, timings = _summarize(monkeypatch, MAX_CHARS // 3)  # Shorter than their chunks
+    *_, (reduce_template, reduce_text) = requests
+    assert reduce_template == summarizer.REDUCE_PROMPT
+    assert len(reduce_text) <= MAX_CHARS
+    assert 1 < len(_rounds(requests)) <= summarizer.MAX_MAP_ROUNDS
+    assert not timings.get('trimmed')
+
+
+def test_round_cap_shortens_the_final_request_to_fit(monkeypatch):
+    # Partial summaries as long as half a chunk never shrink below one chunk, so the rounds run out
+    requests, timings = _summarize(monkeypatch, MAX_CHARS // 2)
+    *_, (reduce_template, reduce_text) = requests
+    rounds = _rounds(requests)
+    assert reduce_template == summarizer.REDUCE_PROMPT
+    assert len(rounds) == summarizer.MAX_MAP_ROUNDS
+    assert timings['trimmed']
+    assert len(reduce_text) <= MAX_CHARS
+    # Every partial summary of the last round is kept, shortened, rather than dropping the last ones
+    assert reduce_text.count('Section ') == len(rounds[-1])
@@ -0,0 +1,104 @@
+# Splitting of text files into overlapping, token-bounded chunks
+# Shared by the summarizer (which summarizes each chunk) and the document index (which embeds each
+# chunk). Kept free of GUI code so neither the document index nor the API server imports tkinter.
+
+# Chunking settings (token counts are estimated from character counts)
+CHARS_PER_TOKEN = 4  # Rough average for English text
+CHUNK_TOKENS = 3000  # Maximum estimated tokens per chunk, well inside the model's context window
+CHUNK_OVERLAP_TOKENS = 200  # Tokens repeated between neighbouring chunks so no point is cut in half
+READ_BLOCK_CHARS = 64 * 1024  # Characters read from a file at a time
+
+
+# Function to estimate the number of tokens in a piece of text
+def estimate_tokens(text):
+    """Estimates the token count of text from its length (about CHARS_PER_TOKEN characters per token)"""
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+# Function to read a text file in blocks without loading all of it
+def iter_file_blocks(file_path, block_chars=READ_BLOCK_CHARS):
+    """Yields the text of a file in blocks of at most block_chars characters
+    
+    Args:
+        file_path (str): Path of the UTF-8 text file (undecodable bytes are replaced)
+        block_chars (int): Maximum characters per block
+        
+    Yields:
+        str: Consecutive blocks of the file's text
+    """
+    with open(file_path, "r", encoding="utf-8", errors="replace") as file:
+        while True:
+            block = file.read(block_chars)
+            if not block:
+                return
+            yield block
+
+
+# Function to split a stream of text blocks into overlapping, token-bounded chunks
+def iter_chunks(blocks, max_tokens=CHUNK_TOKENS, overlap_tokens=CHUNK_OVERLAP_TOKENS):
+    """Yields chunks of at most max_tokens (estimated), overlapping by overlap_tokens
+    
+    Only about one chunk plus one input block is held in memory at a time, so the input
+    can be a file read block by block (see iter_file_blocks). Chunk boundaries are moved
+    back to the nearest paragraph break, sentence end or space where possible, so chunks
+    do not start or end in the middle of a word.
+    
+    Args:
+        blocks (iterable): Consecutive pieces of the document text
+        max_tokens (int): Maximum estimated tokens per chunk
+        overlap_tokens (int): Estimated tokens shared by neighbouring chunks
+        
+    Yields:
+        str: The chunk strings, in document order
+    """
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    overlap_chars = min(overlap_tokens * CHARS_PER_TOKEN, max_chars // 2)
+    
+    blocks = iter(blocks)
+    buffer = ""
+    exhausted = False
+    while True:
+        # Read until the buffer holds more than one chunk or the input runs out
+        while not exhausted and len(buffer) <= max_chars:
+            block = next(blocks, None)
+            if block is None:
+                exhausted = True
+            else:
+                buffer += block
+        
+        # The rest fits in one chunk
+        if len(buffer) <= max_chars:
+            if buffer.strip():
+                yield buffer
+            return
+        
+        # Prefer to break at a natural boundary in the last quarter of the window
+        end = max_chars
+        window_start = max_chars * 3 // 4
+        for separator in ("\n\n", ". ", "\n", " "):
+            boundary = buffer.rfind(separator, window_start, end)
+            if boundary != -1:
+                end = boundary + len(separator)
+                break
+        if buffer[:end].strip():
+            yield buffer[:end]
+        
+        # Start the next chunk a little before this one ended, at the start of a word
+        next_start = end - overlap_chars
+        space = buffer.find(" ", next_start, end)
+        buffer = buffer[space + 1 if space != -1 else next_start:]
+
+
+# Function to split a long document into overlapping, token-bounded chunks
+def split_into_chunks(text, max_tokens=CHUNK_TOKENS, overlap_tokens=CHUNK_OVERLAP_TOKENS):
+    """Splits text into chunks of at most max_tokens (estimated), overlapping by overlap_tokens
+    
+    Args:
+        text (str): The document text
+        max_tokens (int): Maximum estimated tokens per chunk
+        overlap_tokens (int): Estimated tokens shared by neighbouring chunks
+        
+    Returns:
+        list: The chunk strings, in document order
+    """
+    return list(iter_chunks([text], max_tokens, overlap_tokens))
@@ -1,40 +1,46 @@
-# Import the tkinter, Ollama, and langchain libraries, along with anything else we might need
+# Import the tkinter library, the summarization pipeline, and anything else we might need
 import tkinter as tk
 from tkinter import filedialog, scrolledtext, messagebox  # Additional tkinter components
-from langchain_ollama import OllamaLLM  # New modern import for Ollama
-from langchain.prompts import PromptTemplate  # For structured prompt formatting
+import model_warmup  # Background model loading
+from summarizer import SUMMARY_MODEL, SummaryCancelled, SummaryCancel, summarize_file  # Map-reduce summarization
 
-# Set up LLM query function to process text with the local LLM
-def summarize_text(text):
-    """Summarizes text using the local gemma3:12b LLM via Ollama
+import time  # For the elapsed time shown while summarizing
+import os  # For file sizes
+import threading  # For handing streamed tokens to the UI thread
+from concurrent.futures import ThreadPoolExecutor  # For summarizing off the UI thread
+
+# Display settings
+PREVIEW_CHARS = 100_000  # Characters of a loaded file shown in the input area
+POLL_INTERVAL_MS = 50  # How often the GUI flushes streamed tokens and checks on a running summary
+
+
+# Function to load the beginning of a file for display
+def read_preview(file_path, max_chars=PREVIEW_CHARS):
+    """Reads at most max_chars characters from the start of a file
     
-    Args:
-        text (str): The input text to be summarized
-        
     Returns:
-        str: The generated summary from the LLM
+        tuple: (preview text, True if the file is longer than the preview)
     """
-    # Define a detailed prompt template that instructs the LLM how to format the summary
-    prompt = (
-        "Read the following text and create a summary.\n"
-        "First, list the five most important points in the text as bullet points.\n"
-        "Then, write a more detailed summary paragraph (~250 words).\n\n"
-        "Text:\n"
-        "{input_text}\n\n"
-        "Summary:\n"
-        "- "  # Starting with a bullet point to guide the format
-    )
-    # Create a LangChain prompt template with the input variable
-    template = PromptTemplate(input_variables=["input_text"], template=prompt)
-    
-    # Initialize the Ollama LLM with the specified model - using modern OllamaLLM
-    llm = OllamaLLM(model="gemma3:12b")
-    
-    # Generate the summary by sending the formatted prompt to the LLM
-    formatted_prompt = template.format(input_text=text)
-    summary = llm.invoke(formatted_prompt)
-    
-    return summary
+    with open(file_path, "r", encoding="utf-8", errors="replace") as file:
+        preview = file.read(max_chars)
+        truncated = bool(file.read(1))
+    return preview, truncated
+
+
+# Function to describe the per-stage timings for the status bar
+def format_timings(timings):
+    """Formats the timings filled in by summarize_text as a short status message"""
+    if timings.get("cached"):
+        return "Summary loaded from cache"
+    total = timings.get("split", 0) + timings.get("map", 0) + timings.get("reduce", 0)
+    if timings.get("chunks", 0) <= 1:
+        return f"Summary complete in {total:.1f}s"
+    message = (f"Summary complete in {total:.1f}s - {timings['chunks']} chunks "
+               f"(split {timings['split']:.2f}s, map {timings['map']:.1f}s, reduce {timings['reduce']:.1f}s)")
+    if timings.get("trimmed"):
+        message += " - section summaries shortened to fit"
+    return message
+
 
 # Main function to build and manage the GUI application
 def create_gui():
@@ -44,55 +50,138 @@ def create_gui():
     window.title("Text Summarizer")
     window.geometry("800x600")  # Set initial window size
     
-    # Variable to store the content of the loaded file
-    file_content = ""
+    # Load the summary model in the background while the user picks a file
+    model_warmup.start_warmup(SUMMARY_MODEL)
+    
+    # Path of the loaded file - the file itself is read in blocks only when it is summarized
+    file_path = ""
     
     # Function to handle file upload via dialog
     def upload_file():
-        """Opens file dialog and loads selected text file into the input area"""
+        """Opens file dialog and shows a preview of the selected text file in the input area"""
+        nonlocal file_path  # Use the outer function's variable
+        
         # Open file dialog with filter for text files
-        file_path = filedialog.askopenfilename(filetypes=[("Text files", "*.txt"), ("All files", "*.*")])
-        if not file_path:
+        selected_path = filedialog.askopenfilename(filetypes=[("Text files", "*.txt"), ("All files", "*.*")])
+        if not selected_path:
             return  # User canceled the dialog
-            
-        # Read the selected file's content
-        with open(file_path, "r", encoding="utf-8") as file:
-            nonlocal file_content  # Use the outer function's variable
-            file_content = file.read()
-            
-        # Display the file content in the input text area
+        
+        # Read only the start of the file; large files are never loaded into the widget in full
+        try:
+            preview, truncated = read_preview(selected_path)
+        except OSError as e:
+            messagebox.showerror("Error", f"Failed to open file: {e}")
+            return
+        file_path = selected_path
+        
+        # Display the preview in the input text area
         input_text.delete(1.0, tk.END)  # Clear existing content
-        input_text.insert(tk.END, file_content)  # Insert new content
-        status_label.config(text=f"Loaded: {file_path}")  # Update status bar
-        summarize_btn.config(state=tk.NORMAL)  # Enable the summarize button now that we have content
+        input_text.insert(tk.END, preview)  # Insert new content
+        if truncated:
+            size_mb = os.path.getsize(file_path) / (1024 * 1024)
+            status_label.config(text=f"Loaded: {file_path} ({size_mb:.1f} MB, showing the first {PREVIEW_CHARS:,} characters)")
+        else:
+            status_label.config(text=f"Loaded: {file_path}")  # Update status bar
+        summarize_btn.config(state=tk.NORMAL if preview.strip() else tk.DISABLED)  # Enable the summarize button if we have content
+    
+    # State of the summary currently running on the worker thread (if any)
+    executor = ThreadPoolExecutor(max_workers=1)  # Runs summaries off the UI thread
+    job = {"future": None, "cancel": None, "tokens": 0, "start": 0.0, "timings": {}, "pending": []}
+    token_lock = threading.Lock()
+    
+    # Function to count generated tokens (called from worker threads)
+    def count_token(token):
+        """Counts a generated token for the live progress display"""
+        with token_lock:
+            job["tokens"] += 1
+    
+    # Function to buffer summary tokens for display (called from the worker thread)
+    def buffer_output(token):
+        """Queues a summary token; the UI thread inserts buffered tokens in batches"""
+        with token_lock:
+            job["pending"].append(token)
+    
+    # Function to write buffered summary tokens into the output area (UI thread only)
+    def flush_output():
+        """Inserts all buffered tokens with a single widget insert"""
+        with token_lock:
+            pending, job["pending"] = job["pending"], []
+        if pending:
+            output_text.insert(tk.END, "".join(pending))
+            output_text.see(tk.END)  # Keep the newest text in view
     
     # Function to process the text and generate a summary
     def process_text():
-        """Sends the loaded text to the LLM for summarization"""
+        """Starts summarizing the loaded file on a worker thread so the window stays responsive"""
         # Check if there's any text to process
-        if not file_content.strip():
+        if not file_path:
             messagebox.showwarning("Warning", "No text to summarize")
             return
-            
-        # Update status to show processing is happening
+        
+        # Reset the job state and start the summary in the background
+        job.update(cancel=SummaryCancel(), tokens=0, start=time.time(), timings={}, pending=[])
+        job["future"] = executor.submit(
+            summarize_file, file_path, timings=job["timings"], on_token=count_token,
+            cancel_event=job["cancel"], on_output=buffer_output
+        )
+        
+        # The summary is streamed into the output area as it is generated
+        output_text.delete(1.0, tk.END)
+        save_btn.config(state=tk.DISABLED)
+        
+        # Only one summary at a time; the Cancel button is active while it runs
+        summarize_btn.config(state=tk.DISABLED)
+        upload_btn.config(state=tk.DISABLED)
+        cancel_btn.config(state=tk.NORMAL)
         status_label.config(text="Generating summary - please wait...")
-        window.update()  # Force UI update to show the status change
+        window.after(POLL_INTERVAL_MS, check_summary)
+    
+    # Function to poll the running summary from the Tk event loop
+    def check_summary():
+        """Flushes streamed tokens, updates the live progress display and handles the finished result"""
+        future = job["future"]
+        flush_output()  # Coalesces all tokens received since the last tick into one insert
+        if not future.done():
+            elapsed = time.time() - job["start"]
+            status = "Cancelling" if job["cancel"].is_set() else "Generating summary"
+            status_label.config(text=f"{status} - {elapsed:.0f}s elapsed, {job['tokens']} tokens received")
+            window.after(POLL_INTERVAL_MS, check_summary)
+            return
         
-        # Try to generate the summary, handling any errors
+        # The worker has finished - back on the UI thread, so it is safe to touch the widgets
+        job["cancel"].close()
+        summarize_btn.config(state=tk.NORMAL)
+        upload_btn.config(state=tk.NORMAL)
+        cancel_btn.config(state=tk.DISABLED)
         try:
-            # Call the LLM function to summarize the text
-            summary = summarize_text(file_content)
+            future.result()
             
-            # Display the generated summary in the output area
-            output_text.delete(1.0, tk.END)  # Clear existing output
-            output_text.insert(tk.END, summary)  # Insert the summary
+            # The summary is already in the output area; just make sure the last tokens are shown
+            flush_output()
             save_btn.config(state=tk.NORMAL)  # Enable the save button
-            status_label.config(text="Summary complete")  # Update status
+            status_label.config(text=format_timings(job["timings"]))  # Update status with per-stage timing
+        except SummaryCancelled:
+            status_label.config(text="Summary cancelled")
         except Exception as e:
             # Handle any errors during summarization
             messagebox.showerror("Error", f"Failed to generate summary: {e}")
             status_label.config(text="Error occurred")
     
+    # Function to cancel the running summary
+    def cancel_summary():
+        """Aborts the in-flight Ollama requests, even ones still waiting for their first token"""
+        if job["cancel"] is not None:
+            job["cancel"].set()
+            cancel_btn.config(state=tk.DISABLED)
+            status_label.config(text="Cancelling...")
+    
+    # Function to close the window, aborting any running summary first
+    def close_window():
+        """Cancels any running summary and closes the application"""
+        cancel_summary()
+        executor.shutdown(wait=False, cancel_futures=True)
+        window.destroy()
+    
     # Function to save the generated summary to a file
     def save_summary():
         """Saves the generated summary to a user-specified text file"""
@@ -141,6 +230,10 @@ def create_gui():
     summarize_btn = tk.Button(btn_frame, text="Generate Summary", command=process_text, state=tk.DISABLED)
     summarize_btn.pack(side=tk.LEFT, padx=5)
     
+    # Button to abort a running summary (only enabled while one is running)
+    cancel_btn = tk.Button(btn_frame, text="Cancel", command=cancel_summary, state=tk.DISABLED)
+    cancel_btn.pack(side=tk.LEFT, padx=5)
+    
     # Frame for the summary output area with a label
     output_frame = tk.LabelFrame(frame, text="Summary")
     output_frame.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
@@ -157,6 +250,9 @@ def create_gui():
     status_label = tk.Label(window, text="Ready", bd=1, relief=tk.SUNKEN, anchor=tk.W)
     status_label.pack(side=tk.BOTTOM, fill=tk.X)  # Placed at bottom, full width
     
+    # Abort any running summary when the window is closed
+    window.protocol("WM_DELETE_WINDOW", close_window)
+    
     return window
 
 # Entry point for the application